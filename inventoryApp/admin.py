@@ -1,14 +1,27 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Store, Product, Material, MaterialQuantity, MaterialStock, SalesHistory, SalesHistoryProduct
+from .models import User, Store, Product, Material, MaterialQuantity, MaterialStock, SalesHistory, SalesHistoryProduct, StockMovement
 # Register your models here.
 
 admin.site.register(User, UserAdmin)
 admin.site.register(Store)
 admin.site.register(Product)
 admin.site.register(Material)
-admin.site.register(MaterialQuantity)
 admin.site.register(MaterialStock)
 admin.site.register(SalesHistory)
 admin.site.register(SalesHistoryProduct)
+admin.site.register(StockMovement)
 
+
+@admin.register(MaterialQuantity)
+class MaterialQuantityAdmin(admin.ModelAdmin):
+    """
+    Recipe lines are shared by every product using the same quantity of a
+    material, so editing or deleting one would change all those recipes.
+    Recipes are edited through Product.material_quantity instead.
+    """
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,137 @@
+"""
+Daily sales rollups: units sold and their material cost per (store, product, day).
+
+Products have no selling price, so the money column is the material cost of
+the units sold, priced from the recipes and material prices at the time of
+the sale. The sales view adds every basket to its day's rows in the sale's own
+transaction (record_sales); rebuild() recomputes rows from the sales history,
+at current prices, for backfills and repairs.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from inventoryApp import models
+
+GROUP_BY = ('day', 'week', 'month', 'product')
+PERIODS = {'week': TruncWeek, 'month': TruncMonth}
+
+
+def unit_costs():
+    """Material cost of one unit of each product, at current material prices."""
+    lines = models.Product.material_quantity.through.objects.values_list(
+        'product_id', 'materialquantity__quantity', 'materialquantity__ingredient__price')
+    costs = {}
+    for product_id, quantity, price in lines:
+        costs[product_id] = costs.get(product_id, 0) + quantity * price
+    return costs
+
+
+def record_sales(store_id, sold_at, quantities, costs):
+    """
+    Add the product quantities of a sale to the store's rollups of the sale's
+    day. costs maps products to their unit cost. Call it in the transaction
+    that records the sale.
+    """
+    day = timezone.localdate(sold_at)
+    # Make sure every row exists, then add to all of them in one UPDATE; a row
+    # inserted by a concurrent sale is simply added to as well
+    models.DailyProductSales.objects.bulk_create([
+        models.DailyProductSales(store_id=store_id, product_id=product_id, day=day)
+        for product_id in quantities
+    ], ignore_conflicts=True)
+    models.DailyProductSales.objects.filter(store_id=store_id, day=day, product_id__in=quantities).update(
+        quantity=F('quantity') + Case(
+            *[When(product_id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+            default=Value(0)),
+        material_cost=F('material_cost') + Case(
+            *[When(product_id=product_id, then=Value(quantity * costs.get(product_id, 0)))
+              for product_id, quantity in quantities.items()],
+            default=Value(0), output_field=DecimalField()),
+    )
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def rebuild(store_ids=None, since=None, until=None, batch_size=1000):
+    """
+    Replace the rollups of the given stores (all by default) and days, since
+    inclusive and until exclusive, with sums over the sales history. Returns
+    the number of rows written.
+    """
+    rollups = models.DailyProductSales.objects.all()
+    lines = models.SalesHistoryProduct.objects.all()
+    if store_ids is not None:
+        rollups = rollups.filter(store_id__in=store_ids)
+        lines = lines.filter(sales_history__store_id__in=store_ids)
+    if since:
+        rollups = rollups.filter(day__gte=since)
+        lines = lines.filter(sales_history__date__gte=day_start(since))
+    if until:
+        rollups = rollups.filter(day__lt=until)
+        lines = lines.filter(sales_history__date__lt=day_start(until))
+    sums = (lines.annotate(sale_day=TruncDate('sales_history__date'))
+            .values('sales_history__store_id', 'product_id', 'sale_day')
+            .annotate(total=Sum('quantity'))
+            .order_by())
+
+    costs = unit_costs()
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in sums.iterator(chunk_size=batch_size):
+            batch.append(models.DailyProductSales(
+                store_id=row['sales_history__store_id'], product_id=row['product_id'], day=row['sale_day'],
+                quantity=row['total'], material_cost=row['total'] * costs.get(row['product_id'], 0),
+            ))
+            if len(batch) >= batch_size:
+                models.DailyProductSales.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        models.DailyProductSales.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def sales_summary(store, since=None, until=None, group_by=('day',), product_ids=None):
+    """
+    Units sold and material cost of the store's sales between the days since
+    (inclusive) and until (exclusive), summed per combination of the group_by
+    keys (see GROUP_BY). Returns the rows ordered by their keys.
+    """
+    rollups = models.DailyProductSales.objects.filter(store=store)
+    if since:
+        rollups = rollups.filter(day__gte=since)
+    if until:
+        rollups = rollups.filter(day__lt=until)
+    if product_ids:
+        rollups = rollups.filter(product_id__in=product_ids)
+
+    keys = []
+    for key in group_by:
+        if key in PERIODS:
+            rollups = rollups.annotate(**{key: PERIODS[key]('day')})
+            keys.append(key)
+        elif key == 'product':
+            keys.extend(['product_id', 'product__name'])
+        else:
+            keys.append(key)
+    rows = rollups.values(*keys).annotate(total_quantity=Sum('quantity'), total_cost=Sum('material_cost')).order_by(*keys)
+
+    summary = []
+    for row in rows:
+        item = {key: row[key] for key in group_by if key != 'product'}
+        if 'product' in group_by:
+            item['product'] = row['product_id']
+            item['product_name'] = row['product__name']
+        item['quantity'] = row['total_quantity']
+        item['material_cost'] = row['total_cost'] or Decimal('0')
+        summary.append(item)
+    return summary
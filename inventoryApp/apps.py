@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class InventoryappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventoryApp'
+
+    def ready(self):
+        from inventoryApp import signals  # noqa: F401 connects the signal receivers
@@ -0,0 +1,232 @@
+"""
+Async versions of the read-heavy endpoints, for ASGI deployments.
+
+They return the same JSON as their sync counterparts in views.py but use the
+async ORM and cache, so a slow client holds a coroutine instead of a worker
+thread. DRF views are sync only, so authentication goes through a DRF Request
+built around the Django request and the JSON is rendered with DRF's renderer.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import exceptions, serializers, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from inventoryApp import cache, capacity, export, feed, instrumentation, models, stores
+from inventoryApp import serializers as serializersapp
+from inventoryApp.pagination import SalesHistoryCursorPagination
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def error_response(error, authenticate_header=None):
+    """
+    The response DRF's exception handler gives for an APIException. Like
+    APIView, failed authentication answers 403 when the first authenticator
+    has no WWW-Authenticate header to send.
+    """
+    data = error.detail if isinstance(error.detail, (list, dict)) else {'detail': error.detail}
+    response = json_response(data, status=error.status_code)
+    if authenticate_header:
+        response['WWW-Authenticate'] = authenticate_header
+    elif isinstance(error, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response.status_code = status.HTTP_403_FORBIDDEN
+    return response
+
+
+def drf_request_of(request):
+    return Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+
+
+@sync_to_async
+def authenticate(drf_request):
+    """Authenticate the DRF request. Raises NotAuthenticated if no user could be authenticated."""
+    if not drf_request.user or not drf_request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+
+
+def store_view(view):
+    """Authenticate the GET request and pass the user's store to the view."""
+    # require_GET only learns to wrap coroutines in Django 5.0
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+        drf_request = drf_request_of(request)
+        try:
+            await authenticate(drf_request)
+            current_store = await stores.aget_user_store(drf_request.user)
+            return await view(drf_request, current_store, *args, **kwargs)
+        except (exceptions.NotAuthenticated, exceptions.AuthenticationFailed) as error:
+            return error_response(error, drf_request.authenticators[0].authenticate_header(drf_request))
+        except exceptions.APIException as error:
+            return error_response(error)
+    return wrapper
+
+
+async def material_stocks_of(store):
+    return [
+        material_stock async for material_stock in
+        models.MaterialStock.objects.filter(store=store).select_related('material').order_by('pk')
+    ]
+
+
+#----------------------- inventory view -------------------------------
+@store_view
+async def inventory(request, current_store):
+    """Async inventory/."""
+    async def build():
+        material_stocks = await material_stocks_of(current_store)
+        with instrumentation.serializer_timing():
+            return {'materials': serializersapp.InventoryMaterialStockSerializer(material_stocks, many=True).data}
+    return json_response(await cache.acached_store_data(current_store, 'inventory', build))
+
+
+#----------------------- product_capacity view -------------------------------
+@store_view
+async def product_capacity(request, current_store):
+    """
+    Async product-capacity/, capacities computed from the stock vector and the
+    recipe lines of the store's products. Django 4.1 runs every async ORM query
+    on the one thread_sensitive thread, so they are awaited one after another:
+    gathering them would not run them at the same time.
+    """
+    async def build():
+        if current_store is None:
+            with instrumentation.serializer_timing():
+                return serializersapp.ProductCapacitySerializer(None).data
+        products = await store_products(current_store)
+        product_ids = [product_id for product_id, _ in products]
+        stock_vector = await capacity.aload_stock_vector(current_store)
+        lines = await capacity.aload_recipe_lines(product_ids)
+        material_names = await capacity.aload_material_names({material_id for _, material_id, _ in lines})
+        capacities = capacity.with_material_names(capacity.compute_capacities(product_ids, stock_vector, lines), material_names)
+        recipes = {}
+        for product_id, material_id, quantity in lines:
+            recipes.setdefault(product_id, []).append({
+                'quantity': quantity,
+                'ingredient': material_id,
+                'ingredient_name': material_names[material_id],
+            })
+
+        remaining_capacities = []
+        for product_id, name in products:
+            product_capacity = capacities.get(product_id)
+            remaining_capacities.append({
+                'product_name': name,
+                'product_material_with_lowest_stock': product_capacity and {
+                    'material_name': product_capacity.material_name,
+                    'stock_capacity': product_capacity.stock_capacity,
+                    'material_quantity_each': product_capacity.material_quantity_each,
+                    'product_quantity': product_capacity.product_quantity,
+                },
+            })
+        return {
+            'store_name': current_store.store_name,
+            'products': [
+                {'id': product_id, 'name': name, 'material_quantity': recipes.get(product_id, [])}
+                for product_id, name in products
+            ],
+            'remaining_capacities': remaining_capacities,
+        }
+    # Not shared with views.product_capacity, which lists products and recipe lines in another order
+    return json_response(await cache.acached_store_data(current_store, 'async-product-capacity', build))
+
+
+async def store_products(store):
+    return [
+        (product_id, name) async for product_id, name in
+        models.Store.products.through.objects.filter(store=store).order_by('pk').values_list('product_id', 'product__name')
+    ]
+
+
+#----------------------- restock view -------------------------------
+@store_view
+async def restock(request, current_store):
+    """Async GET restock/."""
+    async def build():
+        material_stocks = await material_stocks_of(current_store)
+        with instrumentation.serializer_timing():
+            data = serializersapp.GetRestockSerializer(material_stocks, many=True).data
+        return {
+            'materials': data,
+            'overall_price': sum([m['total_price'] for m in data])
+        }
+    response_data = await cache.acached_store_data(current_store, 'restock', build)
+
+    if response_data.get('overall_price') == 0:
+        return json_response("All material stocks for this store are already full.", status=status.HTTP_204_NO_CONTENT)
+    return json_response(response_data)
+
+
+#----------------------- sales_history view -------------------------------
+def time_filter(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        return export.parse_timestamp(value)
+    except ValueError:
+        raise serializers.ValidationError({name: 'Enter a valid ISO 8601 date or datetime.'})
+
+
+@store_view
+async def sales_history(request, current_store):
+    """Async sales-history/, with the same cursor pagination and filters."""
+    sold_products = models.SalesHistoryProduct.objects.select_related('product').only(
+        'sales_history_id', 'quantity', 'product__id', 'product__name').order_by('pk')
+    queryset = (models.SalesHistory.objects.filter(store_id=current_store)
+                .prefetch_related(Prefetch('saleshistoryproduct_set', queryset=sold_products)))
+    since = time_filter(request, 'since')
+    until = time_filter(request, 'until')
+    if since:
+        queryset = queryset.filter(date__gte=since)
+    if until:
+        queryset = queryset.filter(date__lt=until)
+
+    paginator = SalesHistoryCursorPagination()
+    page = paginator.set_page([sale async for sale in paginator.page_queryset(queryset, request)])
+    with instrumentation.serializer_timing():
+        data = serializersapp.SalesHistorySerializer(page, many=True).data
+    return json_response(paginator.get_paginated_response(data).data)
+
+
+#----------------------- stock feed long-poll -------------------------------
+LONG_POLL_MAX_TIMEOUT = 60
+
+
+def int_param(request, name, default, maximum=None):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise serializers.ValidationError({name: 'A valid integer is required.'})
+    if value < 0:
+        raise serializers.ValidationError({name: 'Ensure this value is greater than or equal to 0.'})
+    return min(value, maximum) if maximum is not None else value
+
+
+@store_view
+async def stock_feed_poll(request, current_store):
+    """
+    Long-poll fallback of the SSE stock feed. Answers with the store's events
+    after last_event_id as soon as there are any, or an empty list after
+    timeout seconds. Clients pass the last id they got back as last_event_id.
+    """
+    last_event_id = int_param(request, 'last_event_id', 0)
+    timeout = int_param(request, 'timeout', 25, LONG_POLL_MAX_TIMEOUT)
+    if current_store is None:
+        return json_response({'last_event_id': last_event_id, 'events': []})
+    events = await feed.get_broker().wait(current_store.pk, last_event_id, timeout)
+    return json_response({
+        'last_event_id': events[-1].id if events else last_event_id,
+        'events': [{'id': event.id, **event.data} for event in events],
+    })
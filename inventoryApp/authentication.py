@@ -1,5 +1,9 @@
+import copy
+import threading
+from collections import OrderedDict
 from datetime import timedelta
 from django.conf import settings
+from django.core.cache import caches
 from django.utils import timezone
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.models import Token
@@ -26,6 +30,98 @@ def token_expire_handler(token):
         token = Token.objects.create(user = token.user)
     return is_expired, token
 
+#________________________________________________
+#AUTHENTICATED TOKEN CACHE
+# token key -> (user, created) of tokens that already passed authentication,
+# so valid tokens skip the Token and User queries until they expire
+
+def token_expires_at(created):
+    return created + timedelta(seconds = settings.TOKEN_EXPIRED_AFTER_SECONDS)
+
+class LocalTokenCache:
+    """
+    Bounded in-process cache, evicting the least recently used token once
+    TOKEN_CACHE_MAX_ENTRIES is reached. Other workers cannot drop its entries
+    when a token is revoked, so they are trusted for at most ttl seconds
+    (TOKEN_CACHE_LOCAL_TTL), or until the token's expiry if sooner.
+    """
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = timedelta(seconds = ttl)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, created, trusted_until = entry
+            if trusted_until <= timezone.now():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        # Every request gets its own copy of the user
+        return copy.copy(user), created
+
+    def set(self, key, user, created):
+        trusted_until = min(token_expires_at(created), timezone.now() + self.ttl)
+        with self.lock:
+            self.entries[key] = (user, created, trusted_until)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last = False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+# Left in the shared cache by delete(), so an authentication that read the
+# token before it was revoked cannot put it back afterwards
+REVOKED = 'revoked'
+
+class SharedTokenCache:
+    """Token cache stored in a Django cache backend, so several workers can share it."""
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def cache_key(self, key):
+        return f'auth-token:{key}'
+
+    def get(self, key):
+        entry = self.cache.get(self.cache_key(key))
+        return None if entry == REVOKED else entry
+
+    def set(self, key, user, created):
+        timeout = (token_expires_at(created) - timezone.now()).total_seconds()
+        if timeout > 0:
+            self.cache.add(self.cache_key(key), (user, created), timeout = timeout)
+
+    def delete(self, key):
+        self.cache.set(self.cache_key(key), REVOKED, timeout = settings.TOKEN_EXPIRED_AFTER_SECONDS)
+
+    def clear(self):
+        self.cache.clear()
+
+_local_token_cache = LocalTokenCache(getattr(settings, 'TOKEN_CACHE_MAX_ENTRIES', 1024),
+                                     getattr(settings, 'TOKEN_CACHE_LOCAL_TTL', 30))
+
+# settings.TOKEN_CACHE names a cache alias to share entries, otherwise they stay in process
+def get_token_cache():
+    alias = getattr(settings, 'TOKEN_CACHE', None)
+    if alias:
+        return SharedTokenCache(alias)
+    return _local_token_cache
+
+def invalidate_user_tokens(user):
+    token_cache = get_token_cache()
+    for key in Token.objects.filter(user = user).values_list('key', flat = True):
+        token_cache.delete(key)
+
 #________________________________________________
 #DEFAULT_AUTHENTICATION_CLASSES
 class ExpiringTokenAuthentication(TokenAuthentication):
@@ -34,8 +130,14 @@ class ExpiringTokenAuthentication(TokenAuthentication):
     and new one with different key will be created
     """
     def authenticate_credentials(self, key):
+        token_cache = get_token_cache()
+        cached = token_cache.get(key)
+        if cached is not None:
+            user, created = cached
+            return (user, Token(key = key, user = user, created = created))
+
         try:
-            token = Token.objects.get(key = key)
+            token = Token.objects.select_related('user').get(key = key)
         except Token.DoesNotExist:
             raise AuthenticationFailed("Invalid Token")
 
@@ -45,5 +147,6 @@ class ExpiringTokenAuthentication(TokenAuthentication):
         is_expired, token = token_expire_handler(token)
         if is_expired:
             raise AuthenticationFailed("The Token is expired")
-        
+
+        token_cache.set(key, token.user, token.created)
         return (token.user, token)
\ No newline at end of file
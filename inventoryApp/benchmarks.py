@@ -0,0 +1,174 @@
+"""
+Query-count, latency and memory benchmarks of the API endpoints, run against
+stores built with the test factories.
+"""
+import math
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from inventoryApp import cache, factories, models
+
+# Most queries a single request to the endpoint may run, whatever the store size
+QUERY_BUDGETS = {
+    'inventory': 3,
+    'product-capacity': 6,
+    'sales': 17,
+    'restock-quote': 3,
+    'restock': 11,
+    'material-stocks': 4,
+    'sales-history': 4,
+}
+
+
+@dataclass
+class StoreSize:
+    products: int = 20
+    ingredients: int = 5
+    stocks: int = 30
+    history: int = 200
+
+
+@dataclass
+class EndpointResult:
+    name: str
+    method: str
+    path: str
+    status: int
+    iterations: int
+    queries: int
+    query_budget: int
+    p50_ms: float
+    p99_ms: float
+    peak_memory_kb: float
+
+    @property
+    def over_budget(self):
+        return self.queries > self.query_budget
+
+
+def build_store(size):
+    """
+    A store with size.stocks materials in stock, size.products products of
+    size.ingredients ingredients each, and size.history past sales.
+    """
+    user = factories.UserFactory()
+    materials = [factories.MaterialFactory() for _ in range(max(size.stocks, size.ingredients))]
+    products = []
+    for index in range(size.products):
+        product = factories.ProductFactory(material_quantity=None)
+        ingredients = [materials[(index + offset) % len(materials)] for offset in range(size.ingredients)]
+        product.material_quantity.set([
+            factories.MaterialQuantityFactory(ingredient=material, quantity=1) for material in ingredients
+        ])
+        products.append(product)
+    store = factories.StoreWithProductsFactory(user=user, products=products)
+    for material in materials[:size.stocks]:
+        factories.MaterialStockFactory(store=store, material=material, current_capacity=10 ** 6, max_capacity=10 ** 6)
+
+    start = timezone.now() - timedelta(days=size.history)
+    sales = models.SalesHistory.objects.bulk_create([
+        models.SalesHistory(store=store, date=start + timedelta(days=day)) for day in range(size.history)
+    ])
+    models.SalesHistoryProduct.objects.bulk_create([
+        models.SalesHistoryProduct(sales_history=sale, product=products[index % len(products)], quantity=1)
+        for index, sale in enumerate(sales)
+    ] if products else [])
+    return store
+
+
+def endpoints(store):
+    """(name, method, path, data, setup) of every benchmarked request."""
+    products = list(store.products.order_by('pk').values_list('pk', flat=True))
+    basket = [{'product_id': product_id, 'quantity': 1} for product_id in products[:5]]
+
+    def drain_stocks():
+        models.MaterialStock.objects.filter(store=store).update(current_capacity=F('max_capacity') - 10)
+
+    return [
+        ('inventory', 'get', reverse('inventory'), None, None),
+        ('product-capacity', 'get', reverse('product_capacity'), None, None),
+        ('sales', 'post', reverse('sales'), {'sales': basket}, None),
+        ('restock-quote', 'get', reverse('restock'), None, drain_stocks),
+        ('restock', 'post', reverse('restock'), {}, drain_stocks),
+        ('material-stocks', 'get', reverse('material_stocks'), None, None),
+        ('sales-history', 'get', reverse('sales_history'), None, None),
+    ]
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def measure(client, name, method, path, data, setup, iterations):
+    """
+    Run the request iterations times from a cold cache. Reports the most queries
+    any run made, latency percentiles and the peak memory allocated by one request.
+    """
+    def prepare():
+        if setup:
+            setup()
+        cache.get_cache().clear()
+
+    def request():
+        return getattr(client, method)(path, data, format='json')
+
+    prepare()
+    request()  # warm up imports and lazily built state
+    latencies, queries, status = [], 0, None
+    for _ in range(iterations):
+        prepare()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request()
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(captured))
+        status = response.status_code
+
+    prepare()
+    tracemalloc.start()
+    try:
+        request()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return EndpointResult(
+        name=name, method=method.upper(), path=path, status=status, iterations=iterations,
+        queries=queries, query_budget=QUERY_BUDGETS[name],
+        p50_ms=round(percentile(latencies, 50), 3), p99_ms=round(percentile(latencies, 99), 3),
+        peak_memory_kb=round(peak / 1024, 1),
+    )
+
+
+def run(size=None, iterations=20, only=None):
+    """
+    Build a store of the given size and benchmark every endpoint (or the ones
+    named in only). Returns a JSON-serializable report.
+    """
+    size = size or StoreSize()
+    store = build_store(size)
+    client = APIClient()
+    client.force_authenticate(store.user)
+
+    results = [
+        measure(client, *endpoint, iterations=iterations)
+        for endpoint in endpoints(store)
+        if not only or endpoint[0] in only
+    ]
+    return {
+        'database': connection.vendor,
+        'size': asdict(size),
+        'endpoints': {result.name: asdict(result) for result in results},
+        'over_budget': [result.name for result in results if result.over_budget],
+    }
@@ -0,0 +1,141 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from inventoryApp import models
+
+
+def get_cache():
+    """Cache holding per-store read results, configured by settings.INVENTORY_CACHE."""
+    return caches[getattr(settings, 'INVENTORY_CACHE', 'default')]
+
+
+def version_key(store_id):
+    return f'store-version:{store_id}'
+
+
+def modified_key(store_id):
+    return f'store-modified:{store_id}'
+
+
+def current_version(key):
+    """
+    Current value of the version stamp kept under key. A missing or evicted
+    version restarts from the clock, so it never matches anything stamped before.
+    """
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+async def acurrent_version(key):
+    """Async current_version."""
+    cache = get_cache()
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, timeout=None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def bump_version(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def store_version(store_id):
+    """Current version of the store's cached data."""
+    return current_version(version_key(store_id))
+
+
+async def astore_version(store_id):
+    """Async store_version."""
+    return await acurrent_version(version_key(store_id))
+
+
+def store_modified(store_id):
+    """
+    Time (seconds since the epoch) the store's cached data last changed. If
+    that was never recorded or the record was evicted, it is taken to be now,
+    so the store never looks older than it is.
+    """
+    cache = get_cache()
+    modified = cache.get(modified_key(store_id))
+    if modified is None:
+        modified = time.time()
+        if not cache.add(modified_key(store_id), modified, timeout=None):
+            modified = cache.get(modified_key(store_id), modified)
+    return modified
+
+
+def bump_store_version(store_id):
+    bump_version(version_key(store_id))
+    get_cache().set(modified_key(store_id), time.time(), timeout=None)
+
+
+def invalidate_store(store_id):
+    """
+    Make every cached read of the store stale. The version is bumped right away,
+    so the writing transaction never reads stale data, and again after commit,
+    so readers that cached the old data while the transaction was open are skipped.
+    """
+    bump_store_version(store_id)
+    transaction.on_commit(lambda: bump_store_version(store_id))
+
+
+def invalidate_stores_for_products(product_ids):
+    """Invalidate every store carrying any of the products, e.g. after a recipe change."""
+    store_ids = (models.Store.products.through.objects
+                 .filter(product_id__in=product_ids)
+                 .values_list('store_id', flat=True).distinct())
+    for store_id in store_ids:
+        invalidate_store(store_id)
+
+
+def invalidate_stores_for_material(material_id):
+    """Invalidate every store stocking the material or carrying a product made from it."""
+    store_ids = set(models.MaterialStock.objects.filter(material_id=material_id).values_list('store_id', flat=True))
+    store_ids.update(models.Store.products.through.objects
+                     .filter(product__material_quantity__ingredient_id=material_id)
+                     .values_list('store_id', flat=True))
+    for store_id in store_ids:
+        invalidate_store(store_id)
+
+
+def cached_store_data(store, name, build):
+    """
+    Return the cached result of build() for the store's current version,
+    computing and caching it on a miss. Without a store nothing is cached.
+    """
+    if store is None:
+        return build()
+    cache = get_cache()
+    key = f'{name}:{store.pk}:{store_version(store.pk)}'
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data)
+    return data
+
+
+async def acached_store_data(store, name, build):
+    """Async cached_store_data, for a build coroutine function."""
+    if store is None:
+        return await build()
+    cache = get_cache()
+    key = f'{name}:{store.pk}:{await astore_version(store.pk)}'
+    data = await cache.aget(key)
+    if data is None:
+        data = await build()
+        await cache.aset(key, data)
+    return data
@@ -0,0 +1,248 @@
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Sum
+
+from inventoryApp import models, recipe_cache
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, the pure Python path gives the same results
+    numpy = None
+
+
+# Material that limits how many units of a product the store can still make
+Capacity = namedtuple('Capacity', ['material_id', 'material_name', 'stock_capacity', 'material_quantity_each', 'product_quantity'])
+
+
+def stock_vector_queryset(store):
+    return (models.MaterialStock.objects.filter(store=store)
+            .values('material_id')
+            .annotate(capacity=Sum('current_capacity'))
+            .values_list('material_id', 'capacity'))
+
+
+def load_stock_vector(store):
+    """Current capacity of every material the store stocks, as {material_id: capacity}."""
+    return dict(stock_vector_queryset(store))
+
+
+def recipe_lines(recipes):
+    return [
+        (product_id, material_id, quantity)
+        for product_id in sorted(recipes) for material_id, quantity in recipes[product_id]
+    ]
+
+
+def load_recipe_lines(product_ids):
+    """
+    Recipe matrix of the given products in sparse form, read from the recipe
+    cache: one (product_id, material_id, quantity) row per recipe line,
+    grouped by product and in recipe order.
+    """
+    return recipe_lines(recipe_cache.get(product_ids))
+
+
+def material_names_queryset(material_ids):
+    return models.Material.objects.filter(material_id__in=material_ids).values_list('material_id', 'name')
+
+
+def load_material_names(material_ids):
+    """{material_id: name} of the given materials."""
+    return dict(material_names_queryset(material_ids)) if material_ids else {}
+
+
+async def aload_stock_vector(store):
+    """Async load_stock_vector."""
+    return {material_id: capacity async for material_id, capacity in stock_vector_queryset(store)}
+
+
+async def aload_recipe_lines(product_ids):
+    """Async load_recipe_lines."""
+    return recipe_lines(await recipe_cache.aget(product_ids))
+
+
+async def aload_material_names(material_ids):
+    """Async load_material_names."""
+    if not material_ids:
+        return {}
+    return {material_id: name async for material_id, name in material_names_queryset(material_ids)}
+
+
+def _limiting_lines_python(buildable, line_products):
+    """Index of the first recipe line with the lowest buildable quantity, per product."""
+    limiting = {}
+    for index, product_id in enumerate(line_products):
+        current = limiting.get(product_id)
+        if current is None or buildable[index] < buildable[current]:
+            limiting[product_id] = index
+    return limiting
+
+
+def _buildable_numpy(stock_capacities, quantities, line_products):
+    stock_capacities = numpy.asarray(stock_capacities, dtype=numpy.int64)
+    quantities = numpy.asarray(quantities, dtype=numpy.int64)
+    buildable = stock_capacities // quantities
+
+    # Lines are grouped by product, so each product is one contiguous segment
+    line_products = numpy.asarray(line_products)
+    starts = numpy.flatnonzero(numpy.r_[True, line_products[1:] != line_products[:-1]])
+    lowest = numpy.minimum.reduceat(buildable, starts)
+    segment = numpy.repeat(numpy.arange(len(starts)), numpy.diff(numpy.r_[starts, len(buildable)]))
+    is_lowest = buildable == lowest[segment]
+    # First line of every segment that reaches the segment minimum
+    _, first = numpy.unique(segment[is_lowest], return_index=True)
+    limiting_indexes = numpy.flatnonzero(is_lowest)[first]
+    limiting = {line_products[index].item(): index.item() for index in limiting_indexes}
+    return buildable.tolist(), limiting
+
+
+def product_capacities(store, product_ids=None):
+    """
+    Buildable quantity and limiting material of every product in the store,
+    computed in one pass over the stock vector and the recipe matrix.
+    Returns {product_id: Capacity}, with None for products without a recipe.
+    store may be a Store or its primary key.
+    """
+    return with_material_names(unnamed_capacities(store, product_ids))
+
+
+def unnamed_capacities(store, product_ids=None):
+    """product_capacities without the material names, which takes one query less."""
+    if product_ids is None:
+        product_ids = list(models.Product.objects.filter(product_stores=store).values_list('id', flat=True))
+    return compute_capacities(product_ids, load_stock_vector(store), load_recipe_lines(product_ids))
+
+
+def compute_capacities(product_ids, stock_vector, lines):
+    """
+    {product_id: Capacity} from an already loaded stock vector and recipe
+    lines (see load_stock_vector and load_recipe_lines). Material names are
+    left as None; see with_material_names.
+    """
+    line_products = [line[0] for line in lines]
+    stock_capacities = [stock_vector.get(line[1]) or 0 for line in lines]
+    quantities = [line[2] for line in lines]
+
+    if numpy is not None and lines:
+        buildable, limiting = _buildable_numpy(stock_capacities, quantities, line_products)
+    else:
+        buildable = [capacity // quantity for capacity, quantity in zip(stock_capacities, quantities)]
+        limiting = _limiting_lines_python(buildable, line_products)
+
+    capacities = dict.fromkeys(product_ids)
+    for product_id, index in limiting.items():
+        _, material_id, quantity = lines[index]
+        capacities[product_id] = Capacity(material_id, None, stock_capacities[index], quantity, buildable[index])
+    return capacities
+
+
+def with_material_names(capacities, material_names=None):
+    """
+    The capacities with the names of their limiting materials, taken from
+    material_names ({material_id: name}) or loaded in one query.
+    """
+    if material_names is None:
+        material_names = load_material_names({capacity.material_id for capacity in capacities.values() if capacity})
+    return {
+        product_id: capacity and capacity._replace(material_name=material_names[capacity.material_id])
+        for product_id, capacity in capacities.items()
+    }
+
+
+#---------------------------------------------------------------
+#              materialized ProductCapacity table
+#---------------------------------------------------------------
+
+def lock_capacity_rows(store_id, product_ids=None, material_ids=None):
+    """
+    Lock the store's ProductCapacity rows of the given products, or of the
+    products whose recipe uses any of the materials (every row of the store
+    when both are None), in primary key order. Returns their product ids.
+
+    Writers refreshing the same rows queue here. Each one reads the stocks
+    only after the previous one has committed, so the last upsert is computed
+    from every committed stock change and does not overwrite a newer row with
+    values from an older snapshot.
+    """
+    rows = models.ProductCapacity.objects.filter(store=store_id)
+    if product_ids is not None:
+        rows = rows.filter(product_id__in=product_ids)
+    if material_ids is not None:
+        rows = rows.filter(product__material_quantity__ingredient__in=material_ids)
+    locked = rows.select_for_update(of=('self',)).order_by('pk').values_list('product_id', flat=True)
+    return list(dict.fromkeys(locked))
+
+
+def refresh_capacity_table(store_id, product_ids=None):
+    """
+    Recompute the materialized ProductCapacity rows of the given products of
+    the store (every product of the store when None) and upsert them, with
+    their existing rows locked (see lock_capacity_rows).
+    Returns the recomputed {product_id: Capacity}, without material names.
+    """
+    with transaction.atomic(savepoint=False):
+        lock_capacity_rows(store_id, product_ids)
+        return _upsert_capacities(store_id, product_ids)
+
+
+def _upsert_capacities(store_id, product_ids):
+    capacities = unnamed_capacities(store_id, product_ids)
+    if not capacities:
+        return capacities
+    rows = []
+    for product_id, product_capacity in capacities.items():
+        product_capacity = product_capacity or Capacity(None, None, None, None, None)
+        rows.append(models.ProductCapacity(
+            store_id=store_id,
+            product_id=product_id,
+            material_id=product_capacity.material_id,
+            stock_capacity=product_capacity.stock_capacity,
+            material_quantity_each=product_capacity.material_quantity_each,
+            product_quantity=product_capacity.product_quantity,
+        ))
+    models.ProductCapacity.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['store', 'product'],
+        update_fields=['material', 'stock_capacity', 'material_quantity_each', 'product_quantity'],
+    )
+    return capacities
+
+
+def refresh_for_materials(store_id, material_ids):
+    """
+    Refresh the rows of the store's products whose recipe uses any of the
+    materials. Products without a row yet are left to materialized_capacities.
+    """
+    with transaction.atomic(savepoint=False):
+        product_ids = lock_capacity_rows(store_id, material_ids=material_ids)
+        if product_ids:
+            _upsert_capacities(store_id, product_ids)
+
+
+def refresh_for_products(product_ids):
+    """Refresh the rows of the products in every store that carries them, e.g. after a recipe change."""
+    store_products = defaultdict(list)
+    for store_id, product_id in (models.Store.products.through.objects
+                                 .filter(product_id__in=product_ids)
+                                 .values_list('store_id', 'product_id')):
+        store_products[store_id].append(product_id)
+    for store_id, store_product_ids in store_products.items():
+        refresh_capacity_table(store_id, store_product_ids)
+
+
+def materialized_capacities(store, product_ids):
+    """
+    {product_id: Capacity} read from the materialized table. Products without a
+    row yet (e.g. data created before the table existed) are computed and stored.
+    """
+    capacities = {}
+    for row in models.ProductCapacity.objects.filter(store=store, product_id__in=product_ids).select_related('material'):
+        capacities[row.product_id] = row.material_id and Capacity(
+            row.material_id, row.material.name, row.stock_capacity, row.material_quantity_each, row.product_quantity,
+        )
+    missing = [product_id for product_id in product_ids if product_id not in capacities]
+    if missing:
+        capacities.update(with_material_names(refresh_capacity_table(store.pk, missing)))
+    return capacities
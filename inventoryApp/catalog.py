@@ -0,0 +1,362 @@
+"""
+Bulk import of catalogs: materials, products, recipes, store stocks and the
+products stores carry, from CSV or NDJSON.
+
+Every row has a type and the columns of CATALOG_FIELDS that type uses:
+
+    material       name, price
+    product        name
+    recipe         product, material, quantity
+    stock          store, material, current_capacity, max_capacity
+    store_product  store, product
+
+Stores, products and materials are referred to by name. Names are resolved
+with dictionaries loaded once at the start and kept up to date as rows are
+created. Rows are read as a stream and imported chunk_size at a time, each
+chunk in its own transaction with one bulk INSERT per table. Rows of a chunk
+are imported in the order of the types above, so a row may refer to a name
+defined earlier in the file or anywhere in its own chunk. Invalid rows are
+reported with their line number and skipped; the rest of the file is still
+imported.
+"""
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.fields import empty
+
+from inventoryApp import cache, capacity, ledger, models, signals, stock
+
+CATALOG_FORMATS = ('csv', 'ndjson')
+CATALOG_FIELDS = ('type', 'name', 'price', 'product', 'material', 'quantity', 'store', 'current_capacity', 'max_capacity')
+ROW_TYPES = ('material', 'product', 'recipe', 'stock', 'store_product')
+MAX_REPORTED_ERRORS = 1000
+
+# Shares its name with another row, so the name cannot be resolved
+AMBIGUOUS = -1
+
+MATERIAL_NAME = serializers.CharField(max_length=300)
+PRODUCT_NAME = serializers.CharField(max_length=200)
+NAME = serializers.CharField()
+PRICE = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=0)
+# Largest value of the integer columns they are stored in
+MAX_INTEGER = 2147483647
+QUANTITY = serializers.IntegerField(min_value=1, max_value=MAX_INTEGER)
+MAX_CAPACITY = serializers.IntegerField(min_value=1, max_value=MAX_INTEGER)
+CURRENT_CAPACITY = serializers.IntegerField(min_value=0, max_value=MAX_INTEGER)
+
+
+def format_of(filename):
+    """Catalog format implied by a file name: ndjson for .ndjson/.jsonl, csv otherwise."""
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def read_rows(lines, catalog_format):
+    """
+    (line number, row) of each record of a catalog given as an iterable of
+    text lines. row is None for NDJSON lines that are not a JSON object.
+    """
+    if catalog_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def natural_keys(pairs):
+    keys = {}
+    for name, pk in pairs:
+        keys[name] = AMBIGUOUS if name in keys else pk
+    return keys
+
+
+class CatalogImport:
+    """Imports catalog rows; see the module docstring. Call run() with the rows of read_rows."""
+
+    def __init__(self, chunk_size=5000):
+        self.chunk_size = chunk_size
+        self.materials = {}
+        self.material_prices = {}
+        for name, material_id, price in models.Material.objects.values_list('name', 'material_id', 'price').iterator():
+            self.materials[name] = AMBIGUOUS if name in self.materials else material_id
+            self.material_prices[material_id] = price
+        self.products = natural_keys(models.Product.objects.values_list('name', 'id').iterator())
+        self.stores = natural_keys(models.Store.objects.values_list('store_name', 'store_id').iterator())
+        # Loaded for the products and stores of each chunk as they come up
+        self.recipes = {}                 # product_id -> {material_id: quantity}
+        self.material_quantities = {}     # (material_id, quantity) -> MaterialQuantity id
+        self.store_stocks = {}            # store_id -> {material_id}
+        self.store_products = {}          # store_id -> {product_id}
+        self.report = {
+            'rows': 0,
+            'created': dict.fromkeys(ROW_TYPES, 0),
+            'updated': {'material': 0},
+            'unchanged': 0,
+            'error_count': 0,
+            'errors': [],
+        }
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return self.report
+            self.import_chunk(chunk)
+
+    def error(self, line, errors):
+        self.report['error_count'] += 1
+        if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+            self.report['errors'].append({'line': line, 'errors': errors})
+
+    def validate(self, row, name, field, errors):
+        value = row.get(name)
+        if value is None or value == '':
+            value = empty
+        elif isinstance(value, str):
+            value = value.strip()
+            # Plain names and counts are by far the most common values; only
+            # anything else goes through the field (and its error messages)
+            if type(field) is serializers.CharField and value and len(value) <= (field.max_length or len(value)):
+                return value
+            if type(field) is serializers.IntegerField and value.isascii() and value.isdigit():
+                number = int(value)
+                if field.min_value <= number <= field.max_value:
+                    return number
+        try:
+            return field.run_validation(value)
+        except serializers.ValidationError as error:
+            errors[name] = error.detail
+            return None
+
+    def resolve(self, keys, row, name, label, errors):
+        value = self.validate(row, name, NAME, errors)
+        if value is None:
+            return None
+        pk = keys.get(value)
+        if pk is None:
+            errors[name] = [f'No {label} is named "{value}".']
+        elif pk == AMBIGUOUS:
+            errors[name] = [f'More than one {label} is named "{value}".']
+            pk = None
+        return pk
+
+    def import_chunk(self, chunk):
+        rows_by_type = defaultdict(list)
+        for line, row in chunk:
+            self.report['rows'] += 1
+            if row is None:
+                self.error(line, {'non_field_errors': ['Expected a JSON object.']})
+            elif row.get('type') not in ROW_TYPES:
+                self.error(line, {'type': [f"Choose one of: {', '.join(ROW_TYPES)}."]})
+            else:
+                rows_by_type[row['type']].append((line, row))
+
+        with transaction.atomic():
+            repriced_material_ids = self.import_materials(rows_by_type['material'])
+            self.import_products(rows_by_type['product'])
+            recipe_product_ids = self.import_recipes(rows_by_type['recipe'])
+            material_stocks = self.import_stocks(rows_by_type['stock'])
+            store_products = self.import_store_products(rows_by_type['store_product'])
+
+        # bulk_create sends no signals, so refresh what the model signals would have
+        for material_id in repriced_material_ids:
+            cache.invalidate_stores_for_material(material_id)
+        if recipe_product_ids:
+            signals.recipes_changed(list(recipe_product_ids))
+        for store_id, product_ids in store_products.items():
+            capacity.refresh_capacity_table(store_id, list(product_ids))
+            cache.invalidate_store(store_id)
+        stock.notify_stocks_changed(material_stocks)
+
+    def import_materials(self, rows):
+        new, repriced = {}, {}
+        for line, row in rows:
+            errors = {}
+            name = self.validate(row, 'name', MATERIAL_NAME, errors)
+            price = self.validate(row, 'price', PRICE, errors)
+            material_id = self.materials.get(name)
+            if material_id == AMBIGUOUS:
+                errors['name'] = [f'More than one material is named "{name}".']
+            if errors:
+                self.error(line, errors)
+            elif material_id is None:
+                new[name] = price
+            elif self.material_prices[material_id] != price:
+                repriced[material_id] = price
+            else:
+                self.report['unchanged'] += 1
+
+        for material in models.Material.objects.bulk_create([models.Material(name=name, price=price) for name, price in new.items()]):
+            self.materials[material.name] = material.pk
+            self.material_prices[material.pk] = material.price
+        models.Material.objects.bulk_update(
+            [models.Material(material_id=material_id, price=price) for material_id, price in repriced.items()], ['price'])
+        self.material_prices.update(repriced)
+        self.report['created']['material'] += len(new)
+        self.report['updated']['material'] += len(repriced)
+        return list(repriced)
+
+    def import_products(self, rows):
+        new = set()
+        for line, row in rows:
+            errors = {}
+            name = self.validate(row, 'name', PRODUCT_NAME, errors)
+            if errors:
+                self.error(line, errors)
+            elif name in self.products or name in new:
+                self.report['unchanged'] += 1
+            else:
+                new.add(name)
+
+        for product in models.Product.objects.bulk_create([models.Product(name=name) for name in sorted(new)]):
+            self.products[product.name] = product.pk
+            self.recipes[product.pk] = {}
+        self.report['created']['product'] += len(new)
+
+    def import_recipes(self, rows):
+        lines = []
+        for line, row in rows:
+            errors = {}
+            product_id = self.resolve(self.products, row, 'product', 'product', errors)
+            material_id = self.resolve(self.materials, row, 'material', 'material', errors)
+            quantity = self.validate(row, 'quantity', QUANTITY, errors)
+            if errors:
+                self.error(line, errors)
+            else:
+                lines.append((line, product_id, material_id, quantity))
+
+        self.load_recipes({product_id for _, product_id, _, _ in lines})
+        links = []
+        for line, product_id, material_id, quantity in lines:
+            recipe = self.recipes[product_id]
+            if material_id not in recipe:
+                recipe[material_id] = quantity
+                links.append((product_id, material_id, quantity))
+            elif recipe[material_id] == quantity:
+                self.report['unchanged'] += 1
+            else:
+                self.error(line, {'quantity': [f'The product already uses {recipe[material_id]} of this material.']})
+
+        # MaterialQuantity rows are unique per ingredient and quantity and shared by products
+        self.load_material_quantities({(material_id, quantity) for _, material_id, quantity in links})
+        missing = sorted({(material_id, quantity) for _, material_id, quantity in links} - self.material_quantities.keys())
+        created = models.MaterialQuantity.objects.bulk_create([
+            models.MaterialQuantity(ingredient_id=material_id, quantity=quantity) for material_id, quantity in missing
+        ])
+        for material_quantity in created:
+            self.material_quantities[(material_quantity.ingredient_id, material_quantity.quantity)] = material_quantity.pk
+        models.Product.material_quantity.through.objects.bulk_create([
+            models.Product.material_quantity.through(
+                product_id=product_id, materialquantity_id=self.material_quantities[(material_id, quantity)])
+            for product_id, material_id, quantity in links
+        ])
+        self.report['created']['recipe'] += len(links)
+        return {product_id for product_id, _, _ in links}
+
+    def import_stocks(self, rows):
+        new = []
+        for line, row in rows:
+            errors = {}
+            store_id = self.resolve(self.stores, row, 'store', 'store', errors)
+            material_id = self.resolve(self.materials, row, 'material', 'material', errors)
+            max_capacity = self.validate(row, 'max_capacity', MAX_CAPACITY, errors)
+            current_capacity = self.validate(row, 'current_capacity', CURRENT_CAPACITY, errors)
+            if max_capacity is not None and current_capacity is not None and current_capacity > max_capacity:
+                errors['current_capacity'] = ['Current capacity cannot be higher than max capacity']
+            if errors:
+                self.error(line, errors)
+            else:
+                new.append((line, models.MaterialStock(store_id=store_id, material_id=material_id,
+                                                       current_capacity=current_capacity, max_capacity=max_capacity)))
+
+        self.load_store_sets(self.store_stocks, models.MaterialStock.objects, 'material_id', {s.store_id for _, s in new})
+        material_stocks = []
+        for line, material_stock in new:
+            stocked = self.store_stocks[material_stock.store_id]
+            if material_stock.material_id in stocked:
+                self.error(line, {'material': ['The store already has a stock of this material.']})
+            else:
+                stocked.add(material_stock.material_id)
+                material_stocks.append(material_stock)
+
+        models.MaterialStock.objects.bulk_create(material_stocks)
+        ledger.record([(s.store_id, s.material_id, s.current_capacity) for s in material_stocks],
+                      models.StockMovement.ADJUST, 'catalog_import')
+        self.report['created']['stock'] += len(material_stocks)
+        return material_stocks
+
+    def import_store_products(self, rows):
+        pairs = []
+        for line, row in rows:
+            errors = {}
+            store_id = self.resolve(self.stores, row, 'store', 'store', errors)
+            product_id = self.resolve(self.products, row, 'product', 'product', errors)
+            if errors:
+                self.error(line, errors)
+            else:
+                pairs.append((store_id, product_id))
+
+        through = models.Store.products.through
+        self.load_store_sets(self.store_products, through.objects, 'product_id', {store_id for store_id, _ in pairs})
+        added = defaultdict(set)
+        for store_id, product_id in pairs:
+            if product_id in self.store_products[store_id]:
+                self.report['unchanged'] += 1
+            else:
+                self.store_products[store_id].add(product_id)
+                added[store_id].add(product_id)
+
+        through.objects.bulk_create([
+            through(store_id=store_id, product_id=product_id)
+            for store_id, product_ids in added.items() for product_id in sorted(product_ids)
+        ])
+        self.report['created']['store_product'] += sum(len(product_ids) for product_ids in added.values())
+        return added
+
+    def load_recipes(self, product_ids):
+        missing = product_ids - self.recipes.keys()
+        if not missing:
+            return
+        for product_id in missing:
+            self.recipes[product_id] = {}
+        lines = (models.Product.material_quantity.through.objects.filter(product_id__in=missing)
+                 .values_list('product_id', 'materialquantity__ingredient_id', 'materialquantity__quantity'))
+        for product_id, material_id, quantity in lines:
+            self.recipes[product_id][material_id] = quantity
+
+    def load_material_quantities(self, pairs):
+        missing = pairs - self.material_quantities.keys()
+        if not missing:
+            return
+        existing = (models.MaterialQuantity.objects
+                    .filter(ingredient_id__in={material_id for material_id, _ in missing},
+                            quantity__in={quantity for _, quantity in missing})
+                    .values_list('ingredient_id', 'quantity', 'pk'))
+        for material_id, quantity, pk in existing:
+            self.material_quantities[(material_id, quantity)] = pk
+
+    def load_store_sets(self, sets, manager, field, store_ids):
+        missing = store_ids - sets.keys()
+        if not missing:
+            return
+        for store_id in missing:
+            sets[store_id] = set()
+        for store_id, value in manager.filter(store_id__in=missing).values_list('store_id', field):
+            sets[store_id].add(value)
+
+
+def import_catalog(lines, catalog_format, chunk_size=5000):
+    """Import a catalog given as an iterable of text lines. Returns the import report."""
+    return CatalogImport(chunk_size).run(read_rows(lines, catalog_format))
@@ -0,0 +1,78 @@
+"""
+Conditional GET for the store read endpoints.
+
+Every change to a store's data bumps its version in the inventory cache
+(see cache.invalidate_store), so the version alone tells whether a response
+would differ from the one a client already has. The ETag and Last-Modified
+validators come from the version and the time it last changed, read from
+the cache before the response is built. A client sending them back in
+If-None-Match or If-Modified-Since gets a 304 without the payload being
+built or sent.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import status
+
+from inventoryApp import cache, stores
+
+
+def store_validators(request, name, store_id):
+    """
+    (ETag, Last-Modified timestamp or None) of the store's response of the
+    named endpoint. The ETag is strong: it also covers the representation
+    (accepted media type) and query string, which change the bytes sent.
+    """
+    modified = cache.store_modified(store_id)
+    version = cache.store_version(store_id)
+    media_type = getattr(request, 'accepted_media_type', '')
+    key = f'{name}:{store_id}:{version}:{media_type}:{request.META.get("QUERY_STRING", "")}'
+    etag = f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+    # HTTP dates have one second resolution: a change later within the same
+    # second would share the date, so it is only sent once that second is over
+    last_modified = int(modified) if int(modified) < int(time.time()) else None
+    return etag, last_modified
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Each user sees their own store under the same URL
+    patch_vary_headers(response, ('Authorization', 'Cookie'))
+    return response
+
+
+def conditional_response(request, name, respond):
+    """
+    respond()'s response to a GET or HEAD request on the user's store, or a
+    304 if the client's validators are still current. 200 responses carry
+    the validators.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return respond()
+    current_store = stores.current_store(request)
+    if current_store is None:
+        return respond()
+    etag, last_modified = store_validators(request, name, current_store.pk)
+    # A 304, or a 412 for a failed If-Match / If-Unmodified-Since
+    precondition_response = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+    if precondition_response is not None:
+        return set_validators(precondition_response, etag, last_modified)
+    response = respond()
+    if response.status_code == status.HTTP_200_OK:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def conditional_on_store(name):
+    """Decorator of DRF function views answering conditional GETs, see conditional_response."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return conditional_response(request, name, lambda: view(request, *args, **kwargs))
+        return wrapper
+    return decorator
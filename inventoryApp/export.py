@@ -0,0 +1,77 @@
+import csv
+import json
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from inventoryApp import models
+
+# One exported row per sold product line. 'id' is the line id, in increasing
+# order, so an interrupted export resumes with after=<last id seen>.
+EXPORT_FIELDS = ('id', 'sales_history', 'store', 'date', 'product', 'product_name', 'quantity')
+EXPORT_FORMATS = ('csv', 'ndjson')
+CONTENT_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 date or datetime into an aware datetime. A bare date
+    means midnight. Raises ValueError for anything else.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        parsed_date = parse_date(value)
+        if parsed_date is None:
+            raise ValueError(f"'{value}' is not a valid ISO 8601 date or datetime.")
+        parsed = datetime.combine(parsed_date, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def export_rows(store_ids=None, since=None, until=None, after=None, chunk_size=2000):
+    """
+    Stream sold product lines as tuples in EXPORT_FIELDS order. Rows are read
+    through a server-side cursor where the database supports it, chunk_size at
+    a time, so memory stays flat however many rows there are.
+    """
+    queryset = models.SalesHistoryProduct.objects.order_by('pk')
+    if store_ids is not None:
+        queryset = queryset.filter(sales_history__store_id__in=store_ids)
+    if since is not None:
+        queryset = queryset.filter(sales_history__date__gte=since)
+    if until is not None:
+        queryset = queryset.filter(sales_history__date__lt=until)
+    if after is not None:
+        queryset = queryset.filter(pk__gt=after)
+    return queryset.values_list(
+        'pk', 'sales_history_id', 'sales_history__store_id', 'sales_history__date',
+        'product_id', 'product__name', 'quantity',
+    ).iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    """File-like object handing back what csv.writer writes instead of buffering it."""
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row[:3] + (row[3].isoformat(),) + row[4:])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        record = dict(zip(EXPORT_FIELDS, row))
+        record['date'] = record['date'].isoformat()
+        yield json.dumps(record) + '\n'
+
+
+def export_lines(rows, export_format):
+    if export_format == 'csv':
+        return csv_lines(rows)
+    return ndjson_lines(rows)
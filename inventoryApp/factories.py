@@ -1,7 +1,7 @@
 from factory.django import DjangoModelFactory
 from inventoryApp import models
 from factory import Faker
-from factory import SubFactory, RelatedFactory, fuzzy, LazyAttribute
+from factory import SubFactory, RelatedFactory, fuzzy, LazyAttribute, Sequence
 from factory import post_generation
 
 class MaterialFactory(DjangoModelFactory):
@@ -13,6 +13,8 @@ class MaterialFactory(DjangoModelFactory):
 class MaterialQuantityFactory(DjangoModelFactory):
     class Meta:
         model = models.MaterialQuantity
+        # Recipe lines are shared; see MaterialQuantity's constraints
+        django_get_or_create = ('ingredient', 'quantity')
     quantity = fuzzy.FuzzyInteger(1,100)
     ingredient = SubFactory(MaterialFactory)
 
@@ -25,7 +27,8 @@ class ProductFactory(DjangoModelFactory):
 class UserFactory(DjangoModelFactory):
     class Meta:
         model = models.User
-    user_id = fuzzy.FuzzyInteger(1,100)
+    # Unique ids, above the ones tests pick for their own users
+    user_id = Sequence(lambda n: n + 101)
     username = Faker('name')
 
 class MaterialStockFactory(DjangoModelFactory):
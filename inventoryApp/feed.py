@@ -0,0 +1,204 @@
+"""
+Per-store change feed of material stocks.
+
+Writers publish the new state of the stocks they changed once their
+transaction commits (see signals.publish_stocks_changed). Dashboards follow the
+feed through Server-Sent Events (StockFeedApp, served by the ASGI app) or
+long-polling (async_views.stock_feed_poll) instead of polling the reads.
+
+The broker is set by settings.STOCK_FEED_BROKER. The default InProcessBroker
+only reaches subscribers of the same process; deployments with several
+processes plug in a shared backend implementing StockFeedBroker.
+"""
+import asyncio
+import io
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.module_loading import import_string
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from inventoryApp import stores
+
+logger = logging.getLogger(__name__)
+
+# id increases by one per event of a store; data is JSON-serializable
+FeedEvent = namedtuple('FeedEvent', ['id', 'data'])
+
+
+class StockFeedBroker(ABC):
+    """Interface of feed backends. publish() may be called from any thread."""
+
+    @abstractmethod
+    def publish(self, store_id, data):
+        """Append an event to the store's feed and wake its subscribers. Returns the FeedEvent."""
+
+    @abstractmethod
+    def events_after(self, store_id, last_event_id):
+        """Retained events of the store newer than last_event_id, oldest first."""
+
+    @abstractmethod
+    async def wait(self, store_id, last_event_id, timeout):
+        """Events newer than last_event_id, waiting up to timeout seconds for one."""
+
+
+class InProcessBroker(StockFeedBroker):
+    """Keeps the last settings.STOCK_FEED_HISTORY events of every store in memory."""
+
+    def __init__(self, history=None):
+        self.history = history or getattr(settings, 'STOCK_FEED_HISTORY', 100)
+        self.lock = threading.Lock()
+        self.events = defaultdict(lambda: deque(maxlen=self.history))
+        self.last_ids = defaultdict(int)
+        self.waiters = defaultdict(set)
+
+    def publish(self, store_id, data):
+        with self.lock:
+            self.last_ids[store_id] += 1
+            event = FeedEvent(self.last_ids[store_id], data)
+            self.events[store_id].append(event)
+            waiters = list(self.waiters[store_id])
+        for loop, woken in waiters:
+            loop.call_soon_threadsafe(woken.set)
+        return event
+
+    def events_after(self, store_id, last_event_id):
+        with self.lock:
+            if last_event_id > self.last_ids[store_id]:
+                # The client saw an earlier run of the process; start over
+                last_event_id = 0
+            return [event for event in self.events[store_id] if event.id > last_event_id]
+
+    async def wait(self, store_id, last_event_id, timeout):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            self.waiters[store_id].add(waiter)
+        try:
+            events = self.events_after(store_id, last_event_id)
+            if not events:
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout)
+                except asyncio.TimeoutError:
+                    return []
+                events = self.events_after(store_id, last_event_id)
+            return events
+        finally:
+            with self.lock:
+                self.waiters[store_id].discard(waiter)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'STOCK_FEED_BROKER', 'inventoryApp.feed.InProcessBroker'))()
+    return _broker
+
+
+def publish_stock_update(store_id, stocks):
+    """
+    Publish the capacities of the store's changed material stocks, given as
+    {material_id: (current_capacity, max_capacity), or None once deleted}.
+    """
+    materials = [
+        {'material': material_id, 'deleted': True} if stocks[material_id] is None else
+        {'material': material_id, 'current_capacity': stocks[material_id][0], 'max_capacity': stocks[material_id][1]}
+        for material_id in sorted(stocks)
+    ]
+    return get_broker().publish(store_id, {'store': store_id, 'materials': materials})
+
+
+def publish_stock_update_safely(store_id, stocks):
+    """
+    publish_stock_update for on_commit callbacks: the write already committed,
+    so a failure to publish is logged rather than failing the request.
+    """
+    try:
+        return publish_stock_update(store_id, stocks)
+    except Exception:
+        logger.exception('Could not publish the stock update of store %s', store_id)
+
+
+def format_event(event):
+    return f'id: {event.id}\nevent: stocks\ndata: {json.dumps(event.data)}\n\n'.encode()
+
+
+class StockFeedApp:
+    """
+    ASGI app streaming the feed of the authenticated user's store as
+    Server-Sent Events on path, and handing every other request to app.
+    Resumes after the Last-Event-ID header and sends a comment every
+    keepalive seconds so proxies keep the connection open.
+    """
+    def __init__(self, app, path='/inventoryapp/stock-feed/', keepalive=15):
+        self.app = app
+        self.path = path
+        self.keepalive = keepalive
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.path:
+            return await self.app(scope, receive, send)
+        request = ASGIRequest(scope, io.BytesIO())
+        store = await self.authenticated_store(request)
+        if store is None:
+            return await self.respond(send, 403, b'{"detail":"Authentication credentials were not provided."}')
+        try:
+            last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+        except ValueError:
+            last_event_id = 0
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        broker = get_broker()
+        try:
+            while True:
+                waiting = asyncio.ensure_future(broker.wait(store.pk, last_event_id, self.keepalive))
+                await asyncio.wait({waiting, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    waiting.cancel()
+                    break
+                events = waiting.result()
+                if not events:
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                for event in events:
+                    await send({'type': 'http.response.body', 'body': format_event(event), 'more_body': True})
+                    last_event_id = event.id
+        finally:
+            disconnected.cancel()
+
+    async def authenticated_store(self, request):
+        @sync_to_async
+        def authenticate():
+            # Only header based authenticators work here; there is no session middleware
+            drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+            try:
+                return drf_request.user
+            except exceptions.APIException:
+                return None
+        user = await authenticate()
+        return await stores.aget_user_store(user)
+
+    async def wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    async def respond(self, send, status, body):
+        await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': body})
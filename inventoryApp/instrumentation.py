@@ -0,0 +1,246 @@
+"""
+Optional per-request instrumentation, enabled with settings.REQUEST_METRICS.
+
+Every request records its DB query count and time, view time and serializer
+time, the time views spend in serializer_timing blocks. They are sent back as
+a Server-Timing header, except for streaming responses whose headers go out
+before their body runs its queries, and aggregated into
+per-route histograms served in the Prometheus text format by metrics_view,
+to staff users and to scrapers sending settings.METRICS_TOKEN as a bearer
+token. Histograms live in process memory, so each worker exposes its own.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def metrics_enabled():
+    return getattr(settings, 'REQUEST_METRICS', False)
+
+
+class RequestMetrics:
+    """Timings of one request, in seconds."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serializer = 0.0
+        self.serializer_depth = 0
+        self.view_started = None
+        self.view = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer * 1000:.1f}',
+            f'view;dur={self.view * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts, total = self.series.get(labels, (None, 0))
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+        counts[bisect_left(self.buckets, value)] += 1
+        self.series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(self.series.items()):
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Per-route histograms of every instrumented request."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.histograms = {
+            'duration': Histogram('inventory_request_duration_seconds', 'Time spent handling the request.', DURATION_BUCKETS),
+            'db': Histogram('inventory_request_db_duration_seconds', 'Time spent in database queries.', DURATION_BUCKETS),
+            'queries': Histogram('inventory_request_db_queries', 'Database queries run by the request.', QUERY_BUCKETS),
+            'view': Histogram('inventory_request_view_duration_seconds', 'Time spent in the view.', DURATION_BUCKETS),
+            'serializer': Histogram('inventory_request_serializer_duration_seconds', 'Time spent building serializer data.', DURATION_BUCKETS),
+        }
+
+    def observe(self, labels, metrics, total):
+        with self.lock:
+            self.histograms['duration'].observe(labels, total)
+            self.histograms['db'].observe(labels, metrics.db)
+            self.histograms['queries'].observe(labels, metrics.queries)
+            self.histograms['view'].observe(labels, metrics.view)
+            self.histograms['serializer'].observe(labels, metrics.serializer)
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for histogram in self.histograms.values():
+                lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+@contextmanager
+def serializer_timing():
+    """
+    Count the time spent in the block as serializer time of the current
+    request. Also works as a decorator. Nested blocks are only counted once.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_depth -= 1
+        if not metrics.serializer_depth:
+            metrics.serializer += time.perf_counter() - started
+
+
+def recording_queries(metrics):
+    """Execute wrappers counting the queries of every database connection into metrics."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(metrics.record_query))
+    return stack
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.route or match.view_name
+
+
+def labels_of(request):
+    return (('method', request.method), ('route', route_of(request)))
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the metrics of every request. Django drops the middleware at
+    startup unless settings.REQUEST_METRICS is on, so it costs nothing then.
+    Must come first in settings.MIDDLEWARE, with ViewMetricsMiddleware last.
+    """
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with recording_queries(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        if response.streaming:
+            response.streaming_content = self.stream(request, response.streaming_content, metrics)
+            return response
+        total = time.perf_counter() - metrics.started
+        response['Server-Timing'] = metrics.server_timing(total)
+        registry.observe(labels_of(request), metrics, total)
+        return response
+
+    def stream(self, request, content, metrics):
+        """
+        Yield the streamed body, recording its queries into the request's
+        metrics, which are observed once the body is exhausted. The execute
+        wrappers are only installed while a chunk is produced, so nothing else
+        the thread runs between chunks is counted.
+        """
+        content = iter(content)
+        while True:
+            token = _current.set(metrics)
+            try:
+                with recording_queries(metrics):
+                    chunk = next(content)
+            except StopIteration:
+                break
+            finally:
+                _current.reset(token)
+            yield chunk
+        registry.observe(labels_of(request), metrics, time.perf_counter() - metrics.started)
+
+
+class ViewMetricsMiddleware:
+    """
+    Times the view for RequestMetricsMiddleware. Last in settings.MIDDLEWARE,
+    so the response phase of the other middleware is not counted as view time.
+    """
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        metrics = _current.get()
+        if metrics is not None and metrics.view_started is not None:
+            metrics.view = time.perf_counter() - metrics.view_started
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view_started = time.perf_counter()
+
+
+def metrics_allowed(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.user.is_active and request.user.is_staff
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the request histograms."""
+    if not metrics_enabled():
+        raise Http404()
+    if not metrics_allowed(request):
+        raise PermissionDenied()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
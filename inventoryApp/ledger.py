@@ -0,0 +1,74 @@
+"""
+Append-only ledger of stock movements with snapshot checkpoints.
+
+Every change of a stock's current capacity is recorded as a StockMovement in
+the transaction that makes it: sales and restocks through stock.apply_deltas
+and stock.refill, manual edits through the MaterialStock signals. Snapshots
+taken periodically (the snapshot_stocks command) copy a store's capacities,
+so the stock at any time is the latest snapshot before it plus the movements
+since, however long the ledger grows.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from inventoryApp import models
+
+
+def record(movements, kind, reference=''):
+    """
+    Append (store_id, material_id, delta) movements of the given kind to the
+    ledger in one INSERT. Movements without a material or delta are skipped.
+    """
+    created_at = timezone.now()
+    models.StockMovement.objects.bulk_create([
+        models.StockMovement(store_id=store_id, material_id=material_id, kind=kind, delta=delta,
+                             reference=reference, created_at=created_at)
+        for store_id, material_id, delta in movements
+        if material_id is not None and delta
+    ])
+
+
+def take_snapshot(store_id):
+    """
+    Checkpoint the current capacities of the store's stocks. The stocks are
+    locked while they are read, so movements in flight are either part of the
+    snapshot or recorded after it. Returns the snapshot time.
+    """
+    with transaction.atomic():
+        stocks = models.MaterialStock.objects.filter(store_id=store_id).exclude(material=None)
+        list(stocks.select_for_update(of=('self',)).order_by('pk').values_list('pk'))
+        taken_at = timezone.now()
+        models.StockSnapshot.objects.bulk_create([
+            models.StockSnapshot(store_id=store_id, material_id=material_id, taken_at=taken_at,
+                                 current_capacity=current_capacity)
+            for material_id, current_capacity in stocks.values_list('material_id', 'current_capacity')
+        ])
+    return taken_at
+
+
+def stock_at(store_id, when):
+    """
+    Current capacity of each material of the store at the given time, as
+    {material_id: capacity}: one snapshot read and one sum over the
+    movements since that snapshot.
+    """
+    latest = (models.StockSnapshot.objects.filter(store_id=OuterRef('store_id'), taken_at__lte=when)
+              .order_by('-taken_at').values('taken_at')[:1])
+    snapshot = (models.StockSnapshot.objects.filter(store_id=store_id, taken_at=Subquery(latest))
+                .values_list('material_id', 'current_capacity', 'taken_at'))
+
+    capacities = defaultdict(int)
+    taken_at = None
+    for material_id, current_capacity, taken_at in snapshot:
+        capacities[material_id] = current_capacity
+
+    movements = models.StockMovement.objects.filter(store_id=store_id, created_at__lte=when)
+    if taken_at is not None:
+        movements = movements.filter(created_at__gt=taken_at)
+    sums = movements.values('material_id').annotate(total=Sum('delta')).values_list('material_id', 'total').order_by()
+    for material_id, total in sums:
+        capacities[material_id] += total
+    return dict(capacities)
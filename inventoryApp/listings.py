@@ -0,0 +1,89 @@
+"""
+Read-only fast path of the list endpoints: inventory/, material-stocks/,
+products/ and sales-history/.
+
+Their responses are built straight from .values_list() rows, a fixed number
+of queries per page, instead of running every field of their serializers
+on model instances. Each builder gives the output of the serializer named
+in its docstring, keys in the same order, and the views render it with
+renderers.FastJSONRenderer.
+"""
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from inventoryApp import models
+
+DATE_TIME = serializers.DateTimeField()
+
+
+def inventory_materials(material_stocks):
+    """InventoryMaterialStockSerializer(material_stocks, many=True).data of a MaterialStock queryset."""
+    percentage = models.MaterialStock.capacity_percentage
+    rows = material_stocks.values_list('material_id', 'material__name', 'max_capacity', 'current_capacity')
+    return [
+        {
+            'material': material_id,
+            'material_name': material_name,
+            'max_capacity': max_capacity,
+            'current_capacity': current_capacity,
+            'percentage_of_capacity': percentage(current_capacity, max_capacity),
+        }
+        for material_id, material_name, max_capacity, current_capacity in rows
+    ]
+
+
+def material_stock_rows(material_stocks):
+    """Rows to paginate and pass to material_stocks()."""
+    return material_stocks.values_list('id', 'material_id', 'material__name', 'max_capacity', 'current_capacity')
+
+
+def material_stocks(rows):
+    """The material-stocks/ serializer's data of a page of material_stock_rows()."""
+    results = []
+    for pk, material_id, material_name, max_capacity, current_capacity in rows:
+        row = {'id': pk}
+        # Like StringRelatedField, material_name is left out without a material
+        if material_id is not None:
+            row['material_name'] = material_name
+        row['max_capacity'] = max_capacity
+        row['current_capacity'] = current_capacity
+        row['material'] = material_id
+        results.append(row)
+    return results
+
+
+def product_rows(products):
+    """Rows to paginate and pass to products()."""
+    return products.values_list('id', 'name')
+
+
+def products(rows):
+    """ProductSerializer(many=True).data of a page of product_rows(), recipes read in one query."""
+    recipes = defaultdict(list)
+    lines = (models.Product.material_quantity.through.objects
+             .filter(product_id__in=[product_id for product_id, _ in rows])
+             .order_by('materialquantity_id')
+             .values_list('product_id', 'materialquantity__quantity',
+                          'materialquantity__ingredient_id', 'materialquantity__ingredient__name'))
+    for product_id, quantity, material_id, material_name in lines:
+        recipes[product_id].append({'quantity': quantity, 'ingredient': material_id, 'ingredient_name': material_name})
+    return [
+        {'id': product_id, 'name': name, 'material_quantity': recipes.get(product_id, [])}
+        for product_id, name in rows
+    ]
+
+
+def sales_history(sales):
+    """SalesHistorySerializer(many=True).data of a page of SalesHistory, sold products read in one query."""
+    products_sold = defaultdict(list)
+    lines = (models.SalesHistoryProduct.objects
+             .filter(sales_history_id__in=[sale.pk for sale in sales])
+             .order_by('pk')
+             .values_list('sales_history_id', 'product_id', 'product__name', 'quantity'))
+    for sales_history_id, product_id, product_name, quantity in lines:
+        products_sold[sales_history_id].append({'product': product_id, 'product_name': product_name, 'quantity': quantity})
+    return [
+        {'date': DATE_TIME.to_representation(sale.date), 'products_sold': products_sold.get(sale.pk, [])}
+        for sale in sales
+    ]
@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from inventoryApp import benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Benchmark query count, latency and memory of the API endpoints against a generated store "
+            "in a throwaway test database, and write a JSON report. Fails if a query budget is exceeded.")
+
+    def add_arguments(self, parser):
+        defaults = benchmarks.StoreSize()
+        parser.add_argument('--products', type=int, default=defaults.products)
+        parser.add_argument('--ingredients', type=int, default=defaults.ingredients,
+                            help="Ingredients in each product's recipe.")
+        parser.add_argument('--stocks', type=int, default=defaults.stocks)
+        parser.add_argument('--history', type=int, default=defaults.history, help="Past sales of the store.")
+        parser.add_argument('--iterations', type=int, default=20, help="Timed requests per endpoint.")
+        parser.add_argument('--endpoint', action='append', dest='endpoints', choices=sorted(benchmarks.QUERY_BUDGETS),
+                            help="Only benchmark the given endpoint (can be repeated).")
+        parser.add_argument('--output', help="File to write the JSON report to instead of stdout.")
+
+    def handle(self, *args, **options):
+        size = benchmarks.StoreSize(products=options['products'], ingredients=options['ingredients'],
+                                    stocks=options['stocks'], history=options['history'])
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            report = benchmarks.run(size, iterations=options['iterations'], only=options['endpoints'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as report_file:
+                report_file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        for name, result in report['endpoints'].items():
+            self.stderr.write(f"{name:<18} {result['queries']:>3}/{result['query_budget']:<3} queries  "
+                              f"p50 {result['p50_ms']:.1f} ms  p99 {result['p99_ms']:.1f} ms  "
+                              f"{result['peak_memory_kb']:.0f} KiB")
+        if report['over_budget']:
+            raise CommandError(f"Query budget exceeded by: {', '.join(report['over_budget'])}")
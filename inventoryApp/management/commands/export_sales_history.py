@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventoryApp import export
+
+
+class Command(BaseCommand):
+    help = "Stream sold product lines as CSV or NDJSON, one row per line, ordered by line id."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, action='append', dest='stores',
+                            help="Only export the given store id (can be repeated).")
+        parser.add_argument('--since', help="Only sales at or after this ISO 8601 date or datetime.")
+        parser.add_argument('--until', help="Only sales before this ISO 8601 date or datetime.")
+        parser.add_argument('--after', type=int,
+                            help="Resume after this line id (the last id of an interrupted export).")
+        parser.add_argument('--format', choices=export.EXPORT_FORMATS, default='csv', dest='export_format')
+        parser.add_argument('--output', help="File to write to instead of stdout.")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Rows fetched from the database at a time.")
+
+    def handle(self, *args, **options):
+        filters = {}
+        for name in ('since', 'until'):
+            if options[name]:
+                try:
+                    filters[name] = export.parse_timestamp(options[name])
+                except ValueError as error:
+                    raise CommandError(f"--{name}: {error}")
+
+        rows = export.export_rows(store_ids=options['stores'], after=options['after'],
+                                  chunk_size=options['chunk_size'], **filters)
+        lines = export.export_lines(rows, options['export_format'])
+        if options['output']:
+            # Resuming with --after appends to what the interrupted run already wrote
+            resuming = options['after'] is not None
+            with open(options['output'], 'a' if resuming else 'w', newline='', encoding='utf-8') as output:
+                if resuming and options['export_format'] == 'csv':
+                    next(lines)  # the header is already in the file
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventoryApp import catalog
+
+
+class Command(BaseCommand):
+    help = ("Import materials, products, recipes, store stocks and store products from a CSV or NDJSON "
+            "catalog, in bulk. Invalid rows are reported and skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Catalog file, or - to read standard input.")
+        parser.add_argument('--format', choices=catalog.CATALOG_FORMATS, dest='catalog_format',
+                            help="Catalog format (default: from the file name, csv for standard input).")
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help="Rows imported per transaction.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        catalog_format = options['catalog_format'] or catalog.format_of(path)
+        if path == '-':
+            report = catalog.import_catalog(sys.stdin, catalog_format, options['chunk_size'])
+        else:
+            try:
+                with open(path, newline='', encoding='utf-8-sig') as lines:
+                    report = catalog.import_catalog(lines, catalog_format, options['chunk_size'])
+            except OSError as error:
+                raise CommandError(error)
+
+        for row_type, created in report['created'].items():
+            self.stdout.write(f"{row_type}: {created} created")
+        self.stdout.write(f"material: {report['updated']['material']} repriced")
+        self.stdout.write(f"{report['unchanged']} row(s) already imported")
+        for error in report['errors']:
+            for field, messages in error['errors'].items():
+                self.stderr.write(f"line {error['line']}: {field}: {' '.join(messages)}")
+        if report['error_count']:
+            raise CommandError(f"{report['error_count']} of {report['rows']} row(s) could not be imported.")
+        self.stdout.write(self.style.SUCCESS(f"Imported {report['rows']} row(s)."))
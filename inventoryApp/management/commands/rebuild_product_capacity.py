@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventoryApp import capacity, models
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialized ProductCapacity table from stocks and recipes, then verify it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, action='append', dest='stores',
+                            help="Only rebuild the given store id (can be repeated).")
+        parser.add_argument('--verify-only', action='store_true',
+                            help="Report stale rows without rewriting the table.")
+
+    def handle(self, *args, **options):
+        store_ids = options['stores'] or list(models.Store.objects.order_by('pk').values_list('pk', flat=True))
+
+        if not options['verify_only']:
+            for store_id in store_ids:
+                with transaction.atomic():
+                    # Drop rows of products the store no longer carries, then recompute the rest
+                    models.ProductCapacity.objects.filter(store_id=store_id).exclude(product__product_stores=store_id).delete()
+                    capacity.refresh_capacity_table(store_id)
+            self.stdout.write(f"Rebuilt product capacities of {len(store_ids)} store(s).")
+
+        stale = 0
+        for store_id in store_ids:
+            stale += self.verify_store(store_id)
+        if stale:
+            raise CommandError(f"{stale} stale product capacity row(s) found.")
+        self.stdout.write(self.style.SUCCESS(f"Verified product capacities of {len(store_ids)} store(s)."))
+
+    def verify_store(self, store_id):
+        """Number of rows of the store that are missing, stale or left over."""
+        empty = capacity.Capacity(None, None, None, None, None)
+        expected = {
+            product_id: product_capacity or empty
+            for product_id, product_capacity in capacity.product_capacities(store_id).items()
+        }
+        actual = {
+            row.product_id: capacity.Capacity(row.material_id, row.material and row.material.name, row.stock_capacity,
+                                              row.material_quantity_each, row.product_quantity)
+            for row in models.ProductCapacity.objects.filter(store_id=store_id).select_related('material')
+        }
+        stale = 0
+        for product_id in sorted(expected.keys() | actual.keys()):
+            if expected.get(product_id) != actual.get(product_id):
+                stale += 1
+                self.stderr.write(f"Store {store_id}, product {product_id}: "
+                                  f"expected {expected.get(product_id)}, found {actual.get(product_id)}")
+        return stale
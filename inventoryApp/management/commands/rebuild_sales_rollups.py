@@ -0,0 +1,33 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventoryApp import analytics, models
+
+
+class Command(BaseCommand):
+    help = "Backfill or rebuild the daily sales rollups from the sales history, one store at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, action='append', dest='stores',
+                            help="Only rebuild the given store id (can be repeated).")
+        parser.add_argument('--since', help="Only rebuild days from this ISO 8601 date on.")
+        parser.add_argument('--until', help="Only rebuild days before this ISO 8601 date.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rollup rows read and written at a time.")
+
+    def handle(self, *args, **options):
+        days = {}
+        for name in ('since', 'until'):
+            if options[name]:
+                try:
+                    days[name] = date.fromisoformat(options[name])
+                except ValueError as error:
+                    raise CommandError(f"--{name}: {error}")
+
+        store_ids = options['stores'] or list(models.Store.objects.order_by('pk').values_list('pk', flat=True))
+        written = 0
+        for store_id in store_ids:
+            written += analytics.rebuild(store_ids=[store_id], batch_size=options['batch_size'], **days)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} daily sales rollup row(s) of {len(store_ids)} store(s)."))
@@ -0,0 +1,29 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventoryApp import models, stock
+
+
+class Command(BaseCommand):
+    help = "Fill every material stock up to its max capacity and report the price of the refill per store."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, action='append', dest='stores',
+                            help="Only refill the given store id (can be repeated).")
+
+    def handle(self, *args, **options):
+        queryset = models.MaterialStock.objects.all()
+        if options['stores']:
+            queryset = queryset.filter(store_id__in=options['stores'])
+        with transaction.atomic():
+            refills = stock.refill(queryset, 'refill_stocks')
+
+        store_prices = defaultdict(int)
+        for refill in refills:
+            store_prices[refill['store_id']] += refill['total_price']
+        for store_id, price in sorted(store_prices.items()):
+            self.stdout.write(f"Store {store_id}: {price}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Refilled {len(refills)} material stock(s) in {len(store_prices)} store(s)."))
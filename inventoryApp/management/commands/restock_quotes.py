@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from inventoryApp import purchasing
+
+
+class Command(BaseCommand):
+    help = "Print restock quotes of many stores and the purchase orders consolidating them per material, as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, action='append', dest='stores',
+                            help="Only quote the given store id (can be repeated).")
+        parser.add_argument('--purchase-orders-only', action='store_true',
+                            help="Leave the per-store quotes out of the output.")
+
+    def handle(self, *args, **options):
+        report = purchasing.restock_report(options['stores'])
+        if options['purchase_orders_only']:
+            report = {'purchase_orders': report['purchase_orders'], 'overall_price': report['overall_price']}
+        self.stdout.write(json.dumps(report, cls=DjangoJSONEncoder, indent=2))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from inventoryApp import ledger, models
+
+
+class Command(BaseCommand):
+    help = ("Checkpoint the current capacities of every store's stocks. Run it periodically "
+            "(e.g. nightly) so reconstructing past stock only replays the movements since.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, action='append', dest='stores',
+                            help="Only snapshot the given store id (can be repeated).")
+
+    def handle(self, *args, **options):
+        store_ids = options['stores'] or list(models.Store.objects.order_by('pk').values_list('pk', flat=True))
+        for store_id in store_ids:
+            ledger.take_snapshot(store_id)
+        self.stdout.write(self.style.SUCCESS(f"Took stock snapshots of {len(store_ids)} store(s)."))
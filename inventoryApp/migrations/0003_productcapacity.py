@@ -0,0 +1,29 @@
+# Generated by Django 4.1.6 on 2026-10-18 17:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventoryApp', '0002_saleshistory_saleshistoryproduct_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCapacity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_capacity', models.IntegerField(null=True)),
+                ('material_quantity_each', models.IntegerField(null=True)),
+                ('product_quantity', models.IntegerField(null=True)),
+                ('material', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='limited_products', to='inventoryApp.material')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capacities', to='inventoryApp.product')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_capacities', to='inventoryApp.store')),
+            ],
+            options={
+                'unique_together': {('store', 'product')},
+            },
+        ),
+    ]
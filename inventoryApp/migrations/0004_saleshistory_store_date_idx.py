@@ -0,0 +1,17 @@
+# Generated by Django 4.1.6 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventoryApp', '0003_productcapacity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='saleshistory',
+            index=models.Index(fields=['store', 'date', 'id'], name='saleshistory_store_date_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.6 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventoryApp', '0004_saleshistory_store_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='saleshistoryproduct',
+            index=models.Index(fields=['sales_history', 'product', 'quantity'], name='saleshistoryproduct_sale_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='materialquantity',
+            constraint=models.CheckConstraint(check=models.Q(('quantity__gt', 0)), name='materialquantity_quantity_gt_0'),
+        ),
+        migrations.AddConstraint(
+            model_name='materialstock',
+            constraint=models.CheckConstraint(check=models.Q(('current_capacity__gte', 0)), name='materialstock_current_capacity_gte_0', violation_error_message='Current capacity cannot be negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='materialstock',
+            constraint=models.CheckConstraint(check=models.Q(('current_capacity__lte', models.F('max_capacity'))), name='materialstock_current_capacity_lte_max', violation_error_message='Current capacity cannot be higher than max capacity'),
+        ),
+        migrations.AddConstraint(
+            model_name='saleshistoryproduct',
+            constraint=models.CheckConstraint(check=models.Q(('quantity__gt', 0)), name='saleshistoryproduct_quantity_gt_0'),
+        ),
+    ]
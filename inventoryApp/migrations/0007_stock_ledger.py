@@ -0,0 +1,58 @@
+# Generated by Django 4.1.6 on 2026-10-18 17:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def snapshot_existing_stocks(apps, schema_editor):
+    # The ledger starts now; existing capacities are its first checkpoint
+    MaterialStock = apps.get_model('inventoryApp', 'MaterialStock')
+    StockSnapshot = apps.get_model('inventoryApp', 'StockSnapshot')
+    taken_at = django.utils.timezone.now()
+    StockSnapshot.objects.bulk_create([
+        StockSnapshot(store_id=store_id, material_id=material_id, taken_at=taken_at, current_capacity=current_capacity)
+        for store_id, material_id, current_capacity in
+        MaterialStock.objects.exclude(material=None).values_list('store_id', 'material_id', 'current_capacity').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventoryApp', '0006_dailyproductsales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('current_capacity', models.IntegerField()),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventoryApp.material')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventoryApp.store')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Sale'), ('restock', 'Restock'), ('adjust', 'Manual adjustment')], max_length=10)),
+                ('delta', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventoryApp.material')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventoryApp.store')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['store', 'taken_at'], name='stocksnapshot_store_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['store', 'created_at'], name='stockmovement_store_time_idx'),
+        ),
+        migrations.RunPython(snapshot_existing_stocks, migrations.RunPython.noop),
+    ]
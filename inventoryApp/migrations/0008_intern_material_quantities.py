@@ -0,0 +1,69 @@
+# Generated by Django 4.1.6 on 2026-10-18 17:53
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def batches(values):
+    values = list(values)
+    for start in range(0, len(values), BATCH_SIZE):
+        yield values[start:start + BATCH_SIZE]
+
+
+def merge_duplicate_material_quantities(apps, schema_editor):
+    # Every (ingredient, quantity) pair keeps its oldest row; recipes that
+    # used a copy are pointed at it, once per product, and the copies go
+    MaterialQuantity = apps.get_model('inventoryApp', 'MaterialQuantity')
+    Recipe = apps.get_model('inventoryApp', 'Product').material_quantity.through
+
+    keep = {}
+    replaced = {}
+    rows = MaterialQuantity.objects.order_by('pk').values_list('pk', 'ingredient_id', 'quantity')
+    for pk, ingredient_id, quantity in rows.iterator():
+        kept = keep.setdefault((ingredient_id, quantity), pk)
+        if kept != pk:
+            replaced[pk] = kept
+    if not replaced:
+        return
+
+    links = defaultdict(list)
+    for batch in batches(set(replaced) | set(replaced.values())):
+        for pk, product_id, material_quantity_id in (Recipe.objects.filter(materialquantity_id__in=batch)
+                                                     .values_list('pk', 'product_id', 'materialquantity_id')):
+            kept = replaced.get(material_quantity_id, material_quantity_id)
+            # The line already using the kept row sorts first
+            links[(product_id, kept)].append((material_quantity_id != kept, pk))
+
+    repointed = defaultdict(list)
+    dropped = []
+    for (product_id, kept), lines in links.items():
+        lines.sort()
+        (is_copy, pk), rest = lines[0], lines[1:]
+        if is_copy:
+            repointed[kept].append(pk)
+        dropped.extend(pk for _, pk in rest)
+
+    for batch in batches(dropped):
+        Recipe.objects.filter(pk__in=batch).delete()
+    for kept, pks in repointed.items():
+        Recipe.objects.filter(pk__in=pks).update(materialquantity_id=kept)
+    for batch in batches(replaced):
+        MaterialQuantity.objects.filter(pk__in=batch).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventoryApp', '0007_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_material_quantities, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='materialquantity',
+            constraint=models.UniqueConstraint(fields=('ingredient', 'quantity'), name='materialquantity_ingredient_quantity_uniq'),
+        ),
+    ]
@@ -22,6 +22,15 @@ class MaterialQuantity(models.Model):
     @property
     def total_cost(self):
         return self.quantity * self.ingredient.price
+    class Meta:
+        constraints = [
+            models.CheckConstraint(check=models.Q(quantity__gt=0), name='materialquantity_quantity_gt_0'),
+            # Recipe lines are interned: products using the same quantity of a
+            # material share one row, so rows are never edited in place (the
+            # admin shows them read-only). Change a product's recipe by
+            # pointing Product.material_quantity at other rows.
+            models.UniqueConstraint(fields=['ingredient', 'quantity'], name='materialquantity_ingredient_quantity_uniq'),
+        ]
     
 class Product(models.Model):
     name = models.CharField(max_length=200)
@@ -44,8 +53,10 @@ class MaterialStock(models.Model):
     current_capacity =  models.IntegerField()
     @property
     def percentage_of_capacity(self):
-        current_capacity = self.current_capacity
-        max_capacity = self.max_capacity
+        return self.capacity_percentage(self.current_capacity, self.max_capacity)
+
+    @staticmethod
+    def capacity_percentage(current_capacity, max_capacity):
         percentage = (current_capacity / max_capacity) * 100
         return round(percentage, 2)
     
@@ -57,25 +68,103 @@ class MaterialStock(models.Model):
         return f"{store_name} ({material_name}) {current_capacity}/{max_capacity}"
     class Meta:
         unique_together = (('store', 'material'),)
+        constraints = [
+            models.CheckConstraint(check=models.Q(current_capacity__gte=0),
+                                   name='materialstock_current_capacity_gte_0',
+                                   violation_error_message="Current capacity cannot be negative"),
+            models.CheckConstraint(check=models.Q(current_capacity__lte=models.F('max_capacity')),
+                                   name='materialstock_current_capacity_lte_max',
+                                   violation_error_message="Current capacity cannot be higher than max capacity"),
+        ]
 
     def clean(self):
         if self.current_capacity > self.max_capacity:
             raise ValidationError("Current capacity cannot be higher than max capacity")
 
-    def save(self, *args, **kwargs):
-        self.clean()
-        super().save(*args, **kwargs)
-
 class SalesHistory(models.Model):
     store = models.ForeignKey(Store, on_delete=models.CASCADE)
     products = models.ManyToManyField(Product, through='SalesHistoryProduct')
     date = models.DateTimeField(default=timezone.now)
     def __str__(self):
         return f"{self.store} - {self.date}"
+    class Meta:
+        indexes = [
+            # sales-history/ pages through one store's sales by (date, id)
+            models.Index(fields=['store', 'date', 'id'], name='saleshistory_store_date_idx'),
+        ]
     
 class SalesHistoryProduct(models.Model):
     sales_history = models.ForeignKey(SalesHistory, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     def __str__(self):
-        return f"({self.sales_history} - {self.product})"
\ No newline at end of file
+        return f"({self.sales_history} - {self.product})"
+    class Meta:
+        indexes = [
+            # Sold lines are always read per sale; product and quantity come along from the index
+            models.Index(fields=['sales_history', 'product', 'quantity'], name='saleshistoryproduct_sale_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(quantity__gt=0), name='saleshistoryproduct_quantity_gt_0'),
+        ]
+
+class StockMovement(models.Model):
+    # Append-only ledger of every change to a stock's current capacity
+    SALE = 'sale'
+    RESTOCK = 'restock'
+    ADJUST = 'adjust'
+    KINDS = ((SALE, 'Sale'), (RESTOCK, 'Restock'), (ADJUST, 'Manual adjustment'))
+    store = models.ForeignKey(Store, related_name='stock_movements', on_delete=models.CASCADE)
+    material = models.ForeignKey(Material, related_name='stock_movements', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    delta = models.IntegerField()
+    reference = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    def __str__(self):
+        return f"{self.store} - {self.material} {self.delta:+d} ({self.kind})"
+    class Meta:
+        indexes = [
+            # Stock reconstruction scans one store's movements after a snapshot
+            models.Index(fields=['store', 'created_at'], name='stockmovement_store_time_idx'),
+        ]
+
+class StockSnapshot(models.Model):
+    # Current capacities of all of a store's stocks at taken_at; see ledger.stock_at
+    store = models.ForeignKey(Store, related_name='stock_snapshots', on_delete=models.CASCADE)
+    material = models.ForeignKey(Material, related_name='stock_snapshots', on_delete=models.CASCADE)
+    taken_at = models.DateTimeField()
+    current_capacity = models.IntegerField()
+    def __str__(self):
+        return f"{self.store} - {self.material} {self.current_capacity} at {self.taken_at}"
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'taken_at'], name='stocksnapshot_store_time_idx'),
+        ]
+
+class DailyProductSales(models.Model):
+    # Rolled up SalesHistoryProduct lines; kept current by the sales view, rebuilt by rebuild_sales_rollups
+    store = models.ForeignKey(Store, related_name='daily_sales', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='daily_sales', on_delete=models.CASCADE)
+    day = models.DateField()
+    quantity = models.BigIntegerField(default=0)
+    material_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    def __str__(self):
+        return f"{self.store} - {self.product} {self.day} ({self.quantity})"
+    class Meta:
+        unique_together = (('store', 'day', 'product'),)
+        indexes = [
+            # analytics/sales/?product= reads one product's days
+            models.Index(fields=['store', 'product', 'day'], name='dailyproductsales_product_idx'),
+        ]
+
+class ProductCapacity(models.Model):
+    store = models.ForeignKey(Store, related_name='product_capacities', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='capacities', on_delete=models.CASCADE)
+    material = models.ForeignKey(Material, related_name='limited_products', on_delete=models.CASCADE, null=True)
+    stock_capacity = models.IntegerField(null=True)
+    material_quantity_each = models.IntegerField(null=True)
+    product_quantity = models.IntegerField(null=True)
+    def __str__(self):
+        return f"{self.store} - {self.product} ({self.product_quantity})"
+    class Meta:
+        unique_together = (('store', 'product'),)
@@ -0,0 +1,82 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+
+
+class SalesHistoryCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (date, id). Every page is a range scan on the
+    (store, date) index that starts right after the previous page, so page N
+    costs the same as page 1 and no total COUNT is needed.
+    """
+    ordering = ('date', 'id')
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def encode_position(self, instance):
+        return f'{instance.date.isoformat()}|{instance.pk}'
+
+    def decode_position(self, position):
+        try:
+            date, pk = position.rsplit('|', 1)
+            date, pk = parse_datetime(date), int(pk)
+        except (AttributeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    def page_queryset(self, queryset, request):
+        """
+        The queryset of the requested page, one row longer than the page to tell
+        whether there is anything beyond it. Pass its rows to set_page().
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        self.display_page_controls = self.template is not None
+        self.position = self.cursor and self.cursor.position
+        self.reverse = bool(self.cursor and self.cursor.reverse)
+
+        if self.reverse:
+            queryset = queryset.order_by('-date', '-id')
+            if self.position:
+                date, pk = self.decode_position(self.position)
+                queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+        else:
+            queryset = queryset.order_by('date', 'id')
+            if self.position:
+                date, pk = self.decode_position(self.position)
+                queryset = queryset.filter(Q(date__gt=date) | Q(date=date, id__gt=pk))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = bool(self.position), has_more
+        else:
+            self.has_next, self.has_previous = has_more, bool(self.position)
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.encode_position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.encode_position(self.page[0])))
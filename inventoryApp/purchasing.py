@@ -0,0 +1,90 @@
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+from inventoryApp import models
+
+
+def restock_quotes(store_ids=None):
+    """
+    Restock quote of every material stock that is not full, for the given
+    stores or all of them, in one query grouped by store and material. Each
+    row holds store, store_name, material, material_name, price, quantity and
+    total_price, with quantity = max - current as in GetRestockSerializer.
+    """
+    queryset = models.MaterialStock.objects.filter(current_capacity__lt=F('max_capacity'), material__isnull=False)
+    if store_ids is not None:
+        queryset = queryset.filter(store_id__in=store_ids)
+    rows = (
+        queryset
+        .values('store_id', 'store__store_name', 'material_id', 'material__name', 'material__price')
+        .annotate(
+            quantity=Sum(F('max_capacity') - F('current_capacity')),
+            total_price=Sum(ExpressionWrapper(
+                (F('max_capacity') - F('current_capacity')) * F('material__price'),
+                output_field=DecimalField(max_digits=20, decimal_places=2),
+            )),
+        )
+        .order_by('store_id', 'material_id')
+    )
+    return [
+        {
+            'store': row['store_id'],
+            'store_name': row['store__store_name'],
+            'material': row['material_id'],
+            'material_name': row['material__name'],
+            'price': row['material__price'],
+            'quantity': row['quantity'],
+            'total_price': row['total_price'],
+        }
+        for row in rows
+    ]
+
+
+def store_quotes(quotes):
+    """Group quote rows into one restock quote per store."""
+    stores = {}
+    for quote in quotes:
+        store = stores.setdefault(quote['store'], {
+            'store': quote['store'],
+            'store_name': quote['store_name'],
+            'materials': [],
+            'overall_price': 0,
+        })
+        store['materials'].append({
+            'material': quote['material'],
+            'material_name': quote['material_name'],
+            'quantity': quote['quantity'],
+            'total_price': quote['total_price'],
+        })
+        store['overall_price'] += quote['total_price']
+    return list(stores.values())
+
+
+def purchase_orders(quotes):
+    """
+    Consolidate quote rows into one purchase order per material, with the
+    quantity each store needs delivered.
+    """
+    orders = {}
+    for quote in quotes:
+        order = orders.setdefault(quote['material'], {
+            'material': quote['material'],
+            'material_name': quote['material_name'],
+            'price': quote['price'],
+            'quantity': 0,
+            'total_price': 0,
+            'deliveries': [],
+        })
+        order['quantity'] += quote['quantity']
+        order['total_price'] += quote['total_price']
+        order['deliveries'].append({'store': quote['store'], 'quantity': quote['quantity']})
+    return [orders[material_id] for material_id in sorted(orders)]
+
+
+def restock_report(store_ids=None):
+    """Per-store restock quotes and consolidated purchase orders, from a single query."""
+    quotes = restock_quotes(store_ids)
+    return {
+        'stores': store_quotes(quotes),
+        'purchase_orders': purchase_orders(quotes),
+        'overall_price': sum(quote['total_price'] for quote in quotes),
+    }
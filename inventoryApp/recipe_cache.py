@@ -0,0 +1,106 @@
+"""
+Process-wide cache of compiled product recipes.
+
+Every sale and capacity computation needs the recipes of its products, but
+recipes almost never change. Each process keeps them in memory as
+{product_id: Recipe}, loading the products it has not seen yet with one
+query. Recipe changes (see signals.recipes_changed) bump a version stamp
+kept in the inventory cache, right away and again after commit like
+cache.invalidate_store. A process whose recipes were loaded under another
+version drops them all on its next read, so workers sharing the cache
+backend never serve a recipe older than the last change. Recipes read
+inside a transaction are not kept: it may have changed them and still roll
+back.
+"""
+from array import array
+
+from django.db import connection, transaction
+
+from inventoryApp import cache, models
+
+VERSION_KEY = 'recipes-version'
+
+
+class Recipe:
+    """(material_id, quantity) lines of a product in recipe order, stored as two integer arrays."""
+    __slots__ = ('material_ids', 'quantities')
+
+    def __init__(self):
+        self.material_ids = array('q')
+        self.quantities = array('q')
+
+    def add(self, material_id, quantity):
+        self.material_ids.append(material_id)
+        self.quantities.append(quantity)
+
+    def __iter__(self):
+        return zip(self.material_ids, self.quantities)
+
+    def __len__(self):
+        return len(self.material_ids)
+
+    def __repr__(self):
+        return f'Recipe({list(self)!r})'
+
+
+# Recipes loaded by this process and the version they were loaded under
+_recipes = {}
+_version = None
+
+
+def recipe_rows_queryset(product_ids):
+    return (models.Product.material_quantity.through.objects
+            .filter(product_id__in=product_ids)
+            .order_by('pk')
+            .values_list('product_id', 'materialquantity__ingredient_id', 'materialquantity__quantity'))
+
+
+def _current(version):
+    global _recipes, _version
+    if version != _version:
+        _recipes, _version = {}, version
+    return _recipes
+
+
+def _compile(product_ids, rows):
+    recipes = {product_id: Recipe() for product_id in product_ids}
+    for product_id, material_id, quantity in rows:
+        recipes[product_id].add(material_id, quantity)
+    return recipes
+
+
+def get(product_ids):
+    """
+    {product_id: Recipe} of the given products; products without a recipe
+    get an empty one. Only products not loaded yet are read, in one query.
+    """
+    recipes = _current(cache.current_version(VERSION_KEY))
+    missing = set(product_ids) - recipes.keys()
+    if missing:
+        recipes = _keep(recipes, _compile(missing, recipe_rows_queryset(missing)))
+    return {product_id: recipes[product_id] for product_id in product_ids}
+
+
+async def aget(product_ids):
+    """Async get."""
+    recipes = _current(await cache.acurrent_version(VERSION_KEY))
+    missing = set(product_ids) - recipes.keys()
+    if missing:
+        rows = [row async for row in recipe_rows_queryset(missing)]
+        recipes = _keep(recipes, _compile(missing, rows))
+    return {product_id: recipes[product_id] for product_id in product_ids}
+
+
+def _keep(recipes, loaded):
+    """Add the loaded recipes to the process cache, unless they were read inside a transaction."""
+    if connection.in_atomic_block:
+        return {**recipes, **loaded}
+    recipes.update(loaded)
+    return recipes
+
+
+def invalidate():
+    """Make every process reload recipes on its next read."""
+    _current(None)
+    cache.bump_version(VERSION_KEY)
+    transaction.on_commit(lambda: cache.bump_version(VERSION_KEY))
@@ -0,0 +1,31 @@
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, JSONRenderer gives the same bytes
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson when it is installed. With DRF's default
+    compact, unescaped-Unicode output both write the same bytes for strings,
+    integers, booleans, None, lists, dicts with string keys and floats between
+    1e-4 and 1e16 (outside that range the exponents are spelled differently),
+    which is all the list endpoints return. Anything orjson cannot encode, and
+    indented or ASCII-only output, goes through JSONRenderer.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped by JSONRenderer for JavaScript embedding
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+# Renderers of the fast list endpoints, in place of the default JSONRenderer
+FAST_RENDERER_CLASSES = (FastJSONRenderer, BrowsableAPIRenderer)
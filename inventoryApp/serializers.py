@@ -1,4 +1,5 @@
-from inventoryApp import models
+from inventoryApp import capacity, models
+from inventoryApp.stock import SalesPlan
 from rest_framework import serializers
 
 class UserSigninSerializer(serializers.Serializer):
@@ -38,8 +39,13 @@ class InventorySerializer(serializers.Serializer):
         fields = ('materials', )
         
     def get_materials(self, instance):
-        user = self.context["request"]
-        return InventoryMaterialStockSerializer(models.MaterialStock.objects.filter(store__user__username= user),many=True).data
+        store = self.context.get("store")
+        if store is not None:
+            material_stocks = models.MaterialStock.objects.filter(store=store)
+        else:
+            user = self.context["request"]
+            material_stocks = models.MaterialStock.objects.filter(store__user__username= user)
+        return InventoryMaterialStockSerializer(material_stocks.select_related('material'),many=True).data
 
 class MaterialQuantitySerializer(serializers.ModelSerializer):
     ingredient_name = serializers.StringRelatedField(source='ingredient.name')
@@ -64,71 +70,102 @@ class ProductCapacitySerializer(serializers.ModelSerializer):
         fields = ['store_name', 'products', 'remaining_capacities']
 
     def get_remaining_capacities(self, store):
-        material_stocks = models.MaterialStock.objects.filter(store=store)
+        products = store.products.all()
+        capacities = capacity.materialized_capacities(store, [product.id for product in products])
         product_data = []
 
-        for product in store.products.all():
-            product_material_data = []
-
-            for mq in product.material_quantity.all():
-                material = mq.ingredient
-                material_stocks_for_material = material_stocks.filter(material=material)
-                total_quantity = mq.quantity
-                current_capacity = sum(ms.current_capacity for ms in material_stocks_for_material)
-                product_quantity = int(current_capacity/total_quantity)
-
-                product_material_data.append({
-                    'material_name': material.name,
-                    'stock_capacity': current_capacity,
-                    'material_quantity_each': total_quantity,
-                    'product_quantity': product_quantity
-                })
-                
-            product_material_data_lowest = min(product_material_data, key=lambda x:x['product_quantity'])
+        for product in products:
+            product_capacity = capacities.get(product.id)
             product_data.append({
                 'product_name': product.name,
-                'product_material_with_lowest_stock': product_material_data_lowest
+                'product_material_with_lowest_stock': product_capacity and {
+                    'material_name': product_capacity.material_name,
+                    'stock_capacity': product_capacity.stock_capacity,
+                    'material_quantity_each': product_capacity.material_quantity_each,
+                    'product_quantity': product_capacity.product_quantity
+                }
             })
 
         return product_data
     
+class SalesListSerializer(serializers.ListSerializer):
+    """
+    Loads every product, recipe and stock the basket needs once, so each sale
+    validates against the shared SalesPlan instead of querying on its own.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list) and 'plan' not in self._context:
+            product_ids = []
+            for item in data:
+                try:
+                    product_ids.append(int(item['product_id']))
+                except (TypeError, KeyError, ValueError):
+                    continue
+            self._context['plan'] = SalesPlan(self.context['store'], product_ids)
+        return super().to_internal_value(data)
+
 class SalesSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
     quantity = serializers.IntegerField(min_value=1)
 
+    class Meta:
+        list_serializer_class = SalesListSerializer
+
     def validate(self, data):
         product_id = data.get('product_id')
-        try:
-            product = models.Product.objects.get(id=product_id)
-        except (models.Product.DoesNotExist):
+        plan = self.context.get('plan') or SalesPlan(self.context['store'], [product_id])
+        if product_id not in plan.product_ids:
             raise serializers.ValidationError({'product_id': product_id, 
                                                'non_field_errors': 'Invalid product id'})
 
-        for material_quantity in product.material_quantity.all():
-            material = material_quantity.ingredient
-            try:
-                stock = models.MaterialStock.objects.get(store=self.context['store'], material=material)
-            except models.MaterialStock.DoesNotExist:
+        for material_id, quantity in plan.recipes.get(product_id, ()):
+            stock = plan.stocks.get(material_id)
+            if stock is None:
                 raise serializers.ValidationError({'product_id': product_id, 
                                                    'non_field_errors': 'Store does not have the required material in stock'})
             
-            if stock.current_capacity < material_quantity.quantity * data['quantity']:
+            if stock.current_capacity < quantity * data['quantity']:
                 raise serializers.ValidationError({'product_id': product_id, 
                                                    'non_field_errors': 'Insufficient material stock'})
         return data
 
 
+class PostRestockListSerializer(serializers.ListSerializer):
+    """
+    Loads the stocks of every material in the request with one query, so each
+    item validates against the shared map instead of querying on its own.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list) and 'material_stocks' not in self._context:
+            material_ids = []
+            for item in data:
+                try:
+                    material_ids.append(int(item['material']))
+                except (TypeError, KeyError, ValueError):
+                    continue
+            self._context['material_stocks'] = {
+                material_stock.material_id: material_stock
+                for material_stock in models.MaterialStock.objects.filter(store=self.context['store'], material_id__in=material_ids)
+            }
+        return super().to_internal_value(data)
+
 class PostRestockSerializer(serializers.Serializer):
     material = serializers.IntegerField()
     quantity = serializers.IntegerField()
 
+    class Meta:
+        list_serializer_class = PostRestockListSerializer
+
     def validate(self, data):
         material = data.get('material')
         quantity = data.get('quantity')
         
-        try:
-            material_stock = models.MaterialStock.objects.get(store=self.context['store'], material=material)
-        except models.MaterialStock.DoesNotExist:
+        material_stocks = self.context.get('material_stocks')
+        if material_stocks is not None:
+            material_stock = material_stocks.get(material)
+        else:
+            material_stock = models.MaterialStock.objects.filter(store=self.context['store'], material=material).first()
+        if material_stock is None:
             raise serializers.ValidationError({'material': material,
                                                'quantity': quantity,
                                                'non_field_errors': 'Invalid product id'})
@@ -0,0 +1,189 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from rest_framework.authtoken.models import Token
+
+from inventoryApp import cache, capacity, feed, ledger, models, recipe_cache, stores
+from inventoryApp.authentication import get_token_cache, invalidate_user_tokens
+
+# Sent whenever the current or max capacity of material stocks changes, including
+# bulk UPDATEs that bypass post_save. Arguments: store_id, material_ids and
+# stocks, {material_id: (current_capacity, max_capacity)} after the change;
+# materials missing from stocks no longer have a stock in the store.
+stocks_changed = Signal()
+
+
+#----------------------- material stocks -------------------------------
+@receiver(stocks_changed)
+def refresh_capacities_for_stocks(sender, store_id, material_ids, **kwargs):
+    capacity.refresh_for_materials(store_id, material_ids)
+    cache.invalidate_store(store_id)
+
+@receiver(stocks_changed)
+def publish_stocks_changed(sender, store_id, material_ids, stocks, **kwargs):
+    # Subscribers must not see stocks a rolled back transaction wrote
+    stocks = {material_id: stocks.get(material_id) for material_id in material_ids}
+    transaction.on_commit(lambda: feed.publish_stock_update_safely(store_id, stocks))
+
+@receiver(pre_save, sender=models.MaterialStock)
+def remember_stock_material(sender, instance, raw=False, **kwargs):
+    # A stock moved to another material changes the capacity of both materials' products
+    if instance.pk and not raw:
+        previous = sender.objects.filter(pk=instance.pk)
+        if transaction.get_connection().in_atomic_block:
+            # Locked until the save commits, so no sale or refill lands between
+            # this read and the save and the ledger adjustment adds up
+            previous = previous.select_for_update()
+        instance._previous_material_id, instance._previous_capacity = (
+            previous.values_list('material_id', 'current_capacity').first() or (None, 0)
+        )
+
+@receiver(post_save, sender=models.MaterialStock)
+def material_stock_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous_material_id = getattr(instance, '_previous_material_id', None)
+    previous_capacity = getattr(instance, '_previous_capacity', 0)
+    # Edits made outside sales and restocks are manual adjustments in the ledger
+    if previous_material_id == instance.material_id:
+        movements = [(instance.store_id, instance.material_id, instance.current_capacity - previous_capacity)]
+    else:
+        movements = [(instance.store_id, previous_material_id, -previous_capacity),
+                     (instance.store_id, instance.material_id, instance.current_capacity)]
+    ledger.record(movements, models.StockMovement.ADJUST, f'material_stock:{instance.pk}')
+
+    material_ids = {instance.material_id, previous_material_id} - {None}
+    stocks = {instance.material_id: (instance.current_capacity, instance.max_capacity)}
+    stocks_changed.send(sender=sender, store_id=instance.store_id, material_ids=material_ids, stocks=stocks)
+
+@receiver(post_delete, sender=models.MaterialStock)
+def material_stock_deleted(sender, instance, origin=None, **kwargs):
+    # Stocks deleted along with their store or material are handled by those deletions
+    if isinstance(origin, (models.Store, models.Material)):
+        return
+    ledger.record([(instance.store_id, instance.material_id, -instance.current_capacity)],
+                  models.StockMovement.ADJUST, f'material_stock:{instance.pk}')
+    stocks_changed.send(sender=sender, store_id=instance.store_id, material_ids={instance.material_id}, stocks={})
+
+
+#----------------------- materials and recipes -------------------------------
+@receiver(post_save, sender=models.Material)
+@receiver(pre_delete, sender=models.Material)
+def material_changed(sender, instance, created=False, raw=False, **kwargs):
+    # Names and prices show up in the inventory, restock and capacity reads
+    if created or raw:
+        return
+    cache.invalidate_stores_for_material(instance.pk)
+
+def recipes_changed(product_ids):
+    recipe_cache.invalidate()
+    capacity.refresh_for_products(product_ids)
+    cache.invalidate_stores_for_products(product_ids)
+
+@receiver(post_save, sender=models.Product)
+def product_saved(sender, instance, created=False, raw=False, **kwargs):
+    # A new product has no cached recipe and is in no store yet
+    if created or raw:
+        return
+    # Product names show up in the products and capacity reads
+    cache.invalidate_stores_for_products([instance.pk])
+
+@receiver(pre_delete, sender=models.Product)
+def remember_product_stores(sender, instance, **kwargs):
+    instance._store_ids = list(instance.product_stores.values_list('pk', flat=True))
+
+@receiver(post_delete, sender=models.Product)
+def product_deleted(sender, instance, **kwargs):
+    # Deleting a product drops its recipe lines and store links without m2m_changed
+    recipe_cache.invalidate()
+    for store_id in getattr(instance, '_store_ids', []):
+        cache.invalidate_store(store_id)
+
+@receiver(post_save, sender=models.MaterialQuantity)
+def material_quantity_saved(sender, instance, created=False, raw=False, **kwargs):
+    if created or raw:
+        return
+    recipes_changed(list(instance.material_products.values_list('id', flat=True)))
+
+@receiver(pre_delete, sender=models.MaterialQuantity)
+def remember_material_quantity_products(sender, instance, **kwargs):
+    instance._product_ids = list(instance.material_products.values_list('id', flat=True))
+
+@receiver(post_delete, sender=models.MaterialQuantity)
+def material_quantity_deleted(sender, instance, **kwargs):
+    recipes_changed(getattr(instance, '_product_ids', []))
+
+@receiver(m2m_changed, sender=models.Product.material_quantity.through)
+def recipe_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        instance._product_ids = list(instance.material_products.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        product_ids = [instance.pk]
+    elif action == 'post_clear':
+        product_ids = getattr(instance, '_product_ids', [])
+    else:
+        product_ids = list(pk_set)
+    recipes_changed(product_ids)
+
+
+#----------------------- stores -------------------------------
+@receiver(pre_save, sender=models.Store)
+def remember_store_user(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._previous_user_id = sender.objects.filter(pk=instance.pk).values_list('user_id', flat=True).first()
+
+@receiver(post_save, sender=models.Store)
+def store_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cache.invalidate_store(instance.pk)
+    for user_id in {instance.user_id, getattr(instance, '_previous_user_id', None)} - {None}:
+        stores.forget_user_store(user_id)
+
+@receiver(post_delete, sender=models.Store)
+def store_deleted(sender, instance, **kwargs):
+    stores.forget_user_store(instance.user_id)
+
+@receiver(m2m_changed, sender=models.Store.products.through)
+def store_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._store_ids = list(instance.product_stores.values_list('pk', flat=True))
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            cache.invalidate_store(instance.pk)
+        else:
+            for store_id in (getattr(instance, '_store_ids', []) if action == 'post_clear' else pk_set):
+                cache.invalidate_store(store_id)
+
+    if action == 'post_add':
+        if reverse:
+            for store_id in pk_set:
+                capacity.refresh_capacity_table(store_id, [instance.pk])
+        else:
+            capacity.refresh_capacity_table(instance.pk, list(pk_set))
+    elif action in ('post_remove', 'post_clear'):
+        rows = models.ProductCapacity.objects.filter(**{'product' if reverse else 'store': instance})
+        if action == 'post_remove':
+            rows = rows.filter(**{'store__in' if reverse else 'product__in': pk_set})
+        rows.delete()
+
+
+#----------------------- tokens -------------------------------
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    get_token_cache().delete(instance.key)
+
+@receiver(post_save, sender=models.User)
+def user_saved(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    # Cached users must not outlive deactivation or other account changes
+    if created or raw or update_fields == frozenset(['last_login']):
+        return
+    invalidate_user_tokens(instance)
+
+@receiver(user_logged_out)
+def user_logged_out_handler(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user_tokens(user)
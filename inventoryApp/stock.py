@@ -0,0 +1,183 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, IntegerField, Value, When
+from django.utils import timezone
+
+from inventoryApp import analytics, ledger, models, recipe_cache, signals
+
+
+class StockConflict(Exception):
+    """
+    Raised when a stock mutation would take a material stock below zero or above
+    its max capacity. The transaction it was raised in leaves every stock untouched.
+    """
+
+
+def delta_case(deltas):
+    """CASE expression mapping each MaterialStock to the quantity it changes by."""
+    return Case(
+        *[When(pk=material_stock.pk, then=Value(delta)) for material_stock, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def lock_stocks(queryset):
+    """
+    Lock the material stocks of the queryset for the rest of the transaction.
+    Rows are always locked in primary key order, so writers touching overlapping
+    stocks queue behind each other instead of deadlocking.
+    """
+    return list(queryset.select_for_update(of=('self',)).order_by('pk'))
+
+
+def apply_deltas(deltas, kind, reference=''):
+    """
+    Add deltas ({MaterialStock: delta}) to current_capacity with a single
+    conditional UPDATE evaluated by the database, so concurrent writers can never
+    lose an update, and record them in the ledger as movements of the given
+    kind. The MaterialStocks must have been read with lock_stocks; their
+    current_capacity is brought up to date. Must run inside a transaction.
+    Raises StockConflict if any stock would end up outside 0..max_capacity.
+    """
+    if not deltas:
+        return
+    case = delta_case(deltas)
+    updated = (
+        models.MaterialStock.objects
+        .filter(pk__in=[material_stock.pk for material_stock in deltas])
+        .alias(new_capacity=F('current_capacity') + case)
+        .filter(new_capacity__gte=0, new_capacity__lte=F('max_capacity'))
+        .update(current_capacity=F('current_capacity') + case)
+    )
+    if updated != len(deltas):
+        raise StockConflict()
+    for material_stock, delta in deltas.items():
+        material_stock.current_capacity += delta
+    ledger.record([(material_stock.store_id, material_stock.material_id, delta)
+                   for material_stock, delta in deltas.items()], kind, reference)
+    notify_stocks_changed(deltas)
+
+
+def refill(queryset, reference=''):
+    """
+    Fill every material stock of the queryset that is not full up to its max
+    capacity with a single UPDATE and record the refills in the ledger. Returns one dict per refilled stock, in pk
+    order, with the price of the refill computed by the database: pk, store_id,
+    material_id, material__name, max_capacity, quantity and total_price.
+    Must run inside a transaction.
+    """
+    queryset = queryset.exclude(current_capacity=F('max_capacity'))
+    refills = list(
+        queryset.select_for_update(of=('self',)).order_by('pk')
+        .annotate(
+            quantity=F('max_capacity') - F('current_capacity'),
+            total_price=ExpressionWrapper(
+                (F('max_capacity') - F('current_capacity')) * F('material__price'),
+                output_field=DecimalField(max_digits=20, decimal_places=2),
+            ),
+        )
+        .values('pk', 'store_id', 'material_id', 'material__name', 'max_capacity', 'quantity', 'total_price')
+    )
+    if refills:
+        # Only the rows read and locked above: a full row another transaction
+        # drew from since then would be refilled without ledger or price
+        (models.MaterialStock.objects
+         .filter(pk__in=[row['pk'] for row in refills])
+         .update(current_capacity=F('max_capacity')))
+        ledger.record([(row['store_id'], row['material_id'], row['quantity']) for row in refills],
+                      models.StockMovement.RESTOCK, reference)
+        notify_stocks_changed(
+            models.MaterialStock(pk=row['pk'], store_id=row['store_id'], material_id=row['material_id'],
+                                 current_capacity=row['max_capacity'], max_capacity=row['max_capacity'])
+            for row in refills
+        )
+    return refills
+
+
+def notify_stocks_changed(material_stocks):
+    """Send stocks_changed once per store for the given MaterialStock objects, holding their new capacities."""
+    store_stocks = defaultdict(dict)
+    for material_stock in material_stocks:
+        store_stocks[material_stock.store_id][material_stock.material_id] = (
+            material_stock.current_capacity, material_stock.max_capacity)
+    for store_id, stocks in store_stocks.items():
+        signals.stocks_changed.send(sender=models.MaterialStock, store_id=store_id, material_ids=set(stocks), stocks=stocks)
+
+
+class SalesPlan:
+    """
+    Products, recipes and stocks needed to validate and apply a basket of sales,
+    loaded in a fixed number of queries no matter how many lines or ingredients
+    the basket has.
+    """
+    def __init__(self, store, product_ids):
+        self.store = store
+        product_ids = set(product_ids)
+        self.product_ids = set(
+            models.Product.objects.filter(id__in=product_ids).values_list('id', flat=True)
+        )
+
+        # product_id -> Recipe of (material_id, quantity) lines in recipe order
+        self.recipes = recipe_cache.get(self.product_ids)
+
+        material_ids = {material_id for recipe in self.recipes.values() for material_id, _ in recipe}
+        self.stocks = {
+            stock.material_id: stock
+            for stock in models.MaterialStock.objects
+            .filter(store=store, material_id__in=material_ids)
+            .select_related('material')
+        }
+
+    def demand(self, sales):
+        """Total quantity of each material the basket consumes, in order of first use."""
+        demand = {}
+        for sale in sales:
+            for material_id, quantity in self.recipes.get(sale['product_id'], ()):
+                demand[material_id] = demand.get(material_id, 0) + quantity * sale['quantity']
+        return demand
+
+    def unit_costs(self):
+        """Material cost of one unit of each planned product, at the prices of the loaded stocks."""
+        return {
+            product_id: sum(quantity * self.stocks[material_id].material.price
+                            for material_id, quantity in recipe if material_id in self.stocks)
+            for product_id, recipe in self.recipes.items()
+        }
+
+    def apply(self, sales, date=None):
+        """
+        Subtract the basket from the store's stocks and record it in the sales
+        history and daily rollups, all or nothing. Returns the SalesHistory and a list of
+        (stock, subtracted capacity) pairs. Raises StockConflict, leaving every
+        stock untouched, if any stock cannot cover the whole basket.
+        """
+        demand = self.demand(sales)
+        if any(material_id not in self.stocks for material_id in demand):
+            raise StockConflict()
+        stock_demand = {self.stocks[material_id]: quantity for material_id, quantity in demand.items()}
+
+        with transaction.atomic():
+            locked_stocks = {
+                material_stock.pk: material_stock
+                for material_stock in lock_stocks(models.MaterialStock.objects.filter(pk__in=[material_stock.pk for material_stock in stock_demand]))
+            }
+            sales_history = models.SalesHistory.objects.create(store=self.store, date=date or timezone.now())
+            apply_deltas({locked_stocks[material_stock.pk]: -quantity for material_stock, quantity in stock_demand.items()},
+                         models.StockMovement.SALE, f'sales_history:{sales_history.pk}')
+            models.SalesHistoryProduct.objects.bulk_create([
+                models.SalesHistoryProduct(sales_history=sales_history, product_id=sale['product_id'], quantity=sale['quantity'])
+                for sale in sales
+            ])
+            quantities = {}
+            for sale in sales:
+                quantities[sale['product_id']] = quantities.get(sale['product_id'], 0) + sale['quantity']
+            analytics.record_sales(self.store.pk, sales_history.date, quantities, self.unit_costs())
+
+        updated_stocks = []
+        for material_id, quantity in demand.items():
+            material_stock = self.stocks[material_id]
+            material_stock.current_capacity = locked_stocks[material_stock.pk].current_capacity
+            updated_stocks.append((material_stock, quantity))
+        return sales_history, updated_stocks
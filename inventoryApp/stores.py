@@ -0,0 +1,56 @@
+from django.conf import settings
+
+from inventoryApp import cache, models
+
+
+def store_cache_key(user_id):
+    return f'user-store:{user_id}'
+
+
+def get_user_store(user):
+    """
+    Store of the user, looked up by user id. Found stores are kept in the
+    inventory cache for STORE_CACHE_TIMEOUT seconds (0 disables it).
+    """
+    if user is None or not user.is_authenticated:
+        return None
+    timeout = getattr(settings, 'STORE_CACHE_TIMEOUT', 0)
+    if timeout:
+        store = cache.get_cache().get(store_cache_key(user.pk))
+        if store is not None:
+            return store
+    store = models.Store.objects.filter(user_id=user.pk).first()
+    if timeout and store is not None:
+        cache.get_cache().set(store_cache_key(user.pk), store, timeout)
+    return store
+
+
+async def aget_user_store(user):
+    """Async get_user_store."""
+    if user is None or not user.is_authenticated:
+        return None
+    timeout = getattr(settings, 'STORE_CACHE_TIMEOUT', 0)
+    if timeout:
+        store = await cache.get_cache().aget(store_cache_key(user.pk))
+        if store is not None:
+            return store
+    store = await models.Store.objects.filter(user_id=user.pk).afirst()
+    if timeout and store is not None:
+        await cache.get_cache().aset(store_cache_key(user.pk), store, timeout)
+    return store
+
+
+def forget_user_store(user_id):
+    cache.get_cache().delete(store_cache_key(user_id))
+
+
+def current_store(request):
+    """
+    Store of the request's user, resolved once per request and kept on the
+    underlying HttpRequest as request.store.
+    """
+    # DRF wraps the HttpRequest; memoize on the wrapped one so both share it
+    http_request = getattr(request, '_request', request)
+    if not hasattr(http_request, 'store'):
+        http_request.store = get_user_store(request.user)
+    return http_request.store
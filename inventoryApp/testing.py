@@ -0,0 +1,153 @@
+"""
+Test runner that fails tests whose requests repeat the same SQL statement.
+
+Every SELECT against an inventoryApp table issued while a test request is
+handled is recorded with its parameters stripped. A statement run more than
+QUERY_PATTERN_THRESHOLD times in one request is the N+1 signature of a per-row
+lookup and fails the test. Queries slower than SLOW_QUERY_MS anywhere in a
+test are listed after the run.
+"""
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from unittest import TextTestResult
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.test.runner import DiscoverRunner
+
+PLACEHOLDER_LIST = re.compile(r'%s(?:\s*,\s*%s)+')
+NUMBER = re.compile(r'\b\d+\b')
+
+
+def normalize(sql):
+    """The statement with parameter lists and inlined numbers collapsed."""
+    return NUMBER.sub('N', PLACEHOLDER_LIST.sub('%s', sql))
+
+
+def allow_repeated_queries(threshold):
+    """
+    Raise the threshold for a test or test case whose requests repeat a
+    statement on purpose.
+    """
+    def decorator(test):
+        test.repeated_queries_threshold = threshold
+        return test
+    return decorator
+
+
+class QueryRecorder:
+    """
+    Counts the statements of each request made from the test's thread and
+    keeps the highest count every statement reached in a single request.
+    """
+    def __init__(self, slow_query_ms):
+        self.slow_query_ms = slow_query_ms
+        self.thread = threading.get_ident()
+        self.request_patterns = None
+        self.patterns = Counter()
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if (self.request_patterns is not None and '"inventoryApp_' in sql
+                    and sql.lstrip().upper().startswith('SELECT')):
+                self.request_patterns[normalize(sql)] += 1
+            if self.slow_query_ms and duration_ms > self.slow_query_ms:
+                self.slow_queries.append((duration_ms, sql))
+
+    def request_started(self, **kwargs):
+        if threading.get_ident() == self.thread:
+            self.request_patterns = Counter()
+
+    def request_finished(self, **kwargs):
+        if threading.get_ident() == self.thread and self.request_patterns is not None:
+            self.patterns |= self.request_patterns
+            self.request_patterns = None
+
+    def start(self):
+        connection.execute_wrappers.append(self)
+        request_started.connect(self.request_started)
+        request_finished.connect(self.request_finished)
+
+    def stop(self):
+        request_finished.disconnect(self.request_finished)
+        request_started.disconnect(self.request_started)
+        connection.execute_wrappers.remove(self)
+
+
+class QueryPatternTextTestResult(TextTestResult):
+    threshold = 3
+    slow_query_ms = 100
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recorder = None
+        self.slow_queries = []
+
+    def test_threshold(self, test):
+        method = getattr(test, getattr(test, '_testMethodName', ''), None)
+        return getattr(method, 'repeated_queries_threshold', getattr(test, 'repeated_queries_threshold', self.threshold))
+
+    def startTest(self, test):
+        self.recorder = QueryRecorder(self.slow_query_ms)
+        self.recorder.start()
+        super().startTest(test)
+
+    def stopTest(self, test):
+        self.recorder.stop()
+        threshold = self.test_threshold(test)
+        repeated = [(count, sql) for sql, count in self.recorder.patterns.most_common() if count > threshold]
+        if repeated:
+            try:
+                raise AssertionError('\n\n'.join(
+                    [f'Statement repeated more than {threshold} times in one request (N+1 query?):']
+                    + [f'{count}x {sql}' for count, sql in repeated]
+                ))
+            except AssertionError:
+                self.addFailure(test, sys.exc_info())
+        self.slow_queries.extend((duration, str(test), sql) for duration, sql in self.recorder.slow_queries)
+        self.recorder = None
+        super().stopTest(test)
+
+    def printErrors(self):
+        super().printErrors()
+        if self.slow_queries:
+            self.stream.writeln(self.separator1)
+            self.stream.writeln(f'Queries slower than {self.slow_query_ms} ms:')
+            for duration, test, sql in sorted(self.slow_queries, reverse=True):
+                self.stream.writeln(f'{duration:.1f} ms  {test}\n    {sql}')
+
+
+class QueryCheckingDiscoverRunner(DiscoverRunner):
+    """DiscoverRunner failing tests over the repeated statement threshold."""
+
+    def __init__(self, query_threshold=None, no_query_check=False, **kwargs):
+        super().__init__(**kwargs)
+        self.query_threshold = query_threshold or getattr(settings, 'QUERY_PATTERN_THRESHOLD', 3)
+        self.query_check = not no_query_check
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--query-threshold', type=int,
+                            help='Fail tests whose requests run the same SELECT more often than this (default QUERY_PATTERN_THRESHOLD).')
+        parser.add_argument('--no-query-check', action='store_true',
+                            help='Do not record queries or flag repeated statements.')
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass()
+        # --debug-sql, --pdb and --parallel bring their own result handling
+        if resultclass is not None or not self.query_check or self.parallel > 1:
+            return resultclass
+        return type('QueryPatternTextTestResult', (QueryPatternTextTestResult,), {
+            'threshold': self.query_threshold,
+            'slow_query_ms': getattr(settings, 'SLOW_QUERY_MS', 100),
+        })
@@ -0,0 +1,119 @@
+import io
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from django.core.management import call_command
+from django.urls import reverse
+from inventoryApp import analytics, factories, stock
+from inventoryApp.models import DailyProductSales, SalesHistory, SalesHistoryProduct, User
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+class SalesAnalyticsTestCase(APITestCase):
+    url = reverse('analytics_sales')
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreWithProductsFactory(user=self.user, products=[])
+        self.flour = factories.MaterialFactory(price=2)
+        self.sugar = factories.MaterialFactory(price=3)
+        self.cake = factories.ProductFactory(material_quantity=None)
+        self.cake.material_quantity.set([
+            factories.MaterialQuantityFactory(ingredient=self.flour, quantity=5),
+            factories.MaterialQuantityFactory(ingredient=self.sugar, quantity=2),
+        ])
+        self.bread = factories.ProductFactory(material_quantity=None)
+        self.bread.material_quantity.set([factories.MaterialQuantityFactory(ingredient=self.flour, quantity=10)])
+        self.store.products.set([self.cake, self.bread])
+        factories.MaterialStockFactory(store=self.store, material=self.flour, current_capacity=10000, max_capacity=10000)
+        factories.MaterialStockFactory(store=self.store, material=self.sugar, current_capacity=10000, max_capacity=10000)
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def sell(self, when, **quantities):
+        sales = [{'product_id': getattr(self, name).pk, 'quantity': quantity} for name, quantity in quantities.items()]
+        stock.SalesPlan(self.store, [sale['product_id'] for sale in sales]).apply(sales, date=when)
+
+    def rollups(self):
+        return {
+            (row.day, row.product_id): (row.quantity, row.material_cost)
+            for row in DailyProductSales.objects.filter(store=self.store)
+        }
+
+    def test_sales_update_the_rollup_of_their_day(self):
+        self.sell(datetime(2023, 1, 1, 9, tzinfo=timezone.utc), cake=1, bread=2)
+        self.sell(datetime(2023, 1, 1, 17, tzinfo=timezone.utc), cake=3)
+        self.sell(datetime(2023, 1, 2, 9, tzinfo=timezone.utc), cake=1)
+        self.assertEqual(self.rollups(), {
+            (date(2023, 1, 1), self.cake.pk): (4, Decimal('64')),
+            (date(2023, 1, 1), self.bread.pk): (2, Decimal('40')),
+            (date(2023, 1, 2), self.cake.pk): (1, Decimal('16')),
+        })
+
+    def test_sales_view_updates_rollups(self):
+        self.authenticate()
+        response = self.client.post(reverse('sales'), {'sales': [
+            {'product_id': self.bread.pk, 'quantity': 1},
+            {'product_id': self.bread.pk, 'quantity': 2},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(self.rollups().values()), [(3, Decimal('60'))])
+
+    def test_failed_sales_leave_rollups_untouched(self):
+        with self.assertRaises(stock.StockConflict):
+            self.sell(datetime(2023, 1, 1, tzinfo=timezone.utc), bread=10000)
+        self.assertEqual(self.rollups(), {})
+
+    def test_rebuild_matches_incremental_rollups(self):
+        for day in range(1, 4):
+            self.sell(datetime(2023, 1, day, tzinfo=timezone.utc), cake=day, bread=1)
+        incremental = self.rollups()
+        DailyProductSales.objects.filter(day=date(2023, 1, 2)).update(quantity=0)
+        self.assertEqual(analytics.rebuild(store_ids=[self.store.pk], since=date(2023, 1, 2), until=date(2023, 1, 3)), 2)
+        self.assertEqual(self.rollups(), incremental)
+        DailyProductSales.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_rebuild_backfills_history_written_directly(self):
+        sale = SalesHistory.objects.create(store=self.store, date=datetime(2023, 2, 1, tzinfo=timezone.utc))
+        SalesHistoryProduct.objects.create(sales_history=sale, product=self.cake, quantity=2)
+        self.assertEqual(self.rollups(), {})
+        analytics.rebuild()
+        self.assertEqual(self.rollups(), {(date(2023, 2, 1), self.cake.pk): (2, Decimal('32'))})
+
+    def test_analytics_endpoint_groups_and_filters(self):
+        self.sell(datetime(2023, 1, 1, tzinfo=timezone.utc), cake=1, bread=2)
+        self.sell(datetime(2023, 1, 2, tzinfo=timezone.utc), cake=3)
+        self.sell(datetime(2023, 2, 1, tzinfo=timezone.utc), bread=1)
+        self.authenticate()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['quantity'], 7)
+        self.assertEqual(response.data['material_cost'], Decimal('124'))
+        self.assertEqual([(str(row['day']), row['quantity']) for row in response.data['results']],
+                         [('2023-01-01', 3), ('2023-01-02', 3), ('2023-02-01', 1)])
+
+        response = self.client.get(self.url, {'group_by': 'month,product', 'since': '2023-01-02'})
+        self.assertEqual([(str(row['month']), row['product_name'], row['quantity']) for row in response.data['results']],
+                         [('2023-01-01', self.cake.name, 3), ('2023-02-01', self.bread.name, 1)])
+
+        response = self.client.get(self.url, {'group_by': 'product', 'product': self.bread.pk, 'until': '2023-02-01'})
+        self.assertEqual(response.data['results'], [
+            {'product': self.bread.pk, 'product_name': self.bread.name, 'quantity': 2, 'material_cost': Decimal('40')},
+        ])
+
+    def test_analytics_endpoint_only_shows_the_users_store(self):
+        other_store = factories.StoreFactory(user__user_id=2)
+        DailyProductSales.objects.create(store=other_store, product=self.cake, day=date(2023, 1, 1), quantity=5)
+        self.authenticate()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'], [])
+
+    def test_analytics_endpoint_rejects_bad_parameters(self):
+        self.authenticate()
+        for params in ({'since': 'yesterday'}, {'group_by': 'year'}, {'group_by': 'day,day'}, {'product': 'cake'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
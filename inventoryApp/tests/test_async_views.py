@@ -0,0 +1,83 @@
+import json
+from datetime import datetime, timedelta, timezone
+from django.test import AsyncClient
+from django.urls import reverse
+from inventoryApp import cache, factories
+from inventoryApp.models import SalesHistory, SalesHistoryProduct, User
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+class AsyncReadViewsTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreWithProductsFactory(user=self.user, products=[])
+        self.flour = factories.MaterialFactory(price=2)
+        self.sugar = factories.MaterialFactory(price=3)
+        self.cake = factories.ProductFactory(material_quantity=None)
+        self.cake.material_quantity.set([
+            factories.MaterialQuantityFactory(ingredient=self.flour, quantity=5),
+            factories.MaterialQuantityFactory(ingredient=self.sugar, quantity=2),
+        ])
+        self.bread = factories.ProductFactory(material_quantity=None)
+        self.bread.material_quantity.set([factories.MaterialQuantityFactory(ingredient=self.flour, quantity=10)])
+        self.store.products.set([self.cake, self.bread])
+        factories.MaterialStockFactory(store=self.store, material=self.flour, current_capacity=42, max_capacity=100)
+        factories.MaterialStockFactory(store=self.store, material=self.sugar, current_capacity=7, max_capacity=10)
+        start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        for day in range(15):
+            sale = SalesHistory.objects.create(store=self.store, date=start + timedelta(days=day))
+            SalesHistoryProduct.objects.create(sales_history=sale, product=self.cake, quantity=day + 1)
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def get_both(self, name, params=None):
+        cache.get_cache().clear()
+        sync = self.client.get(reverse(name), params, format='json')
+        cache.get_cache().clear()
+        asynchronous = self.client.get(reverse('async_' + name), params)
+        self.assertEqual(asynchronous['Content-Type'], 'application/json')
+        return sync, asynchronous
+
+    def assertSameResponse(self, name, params=None):
+        sync, asynchronous = self.get_both(name, params)
+        self.assertEqual(asynchronous.status_code, sync.status_code)
+        # Pagination links point at the endpoint that was called
+        content = asynchronous.content.decode().replace(reverse('async_' + name), reverse(name))
+        self.assertEqual(json.loads(content), json.loads(sync.content))
+        return json.loads(asynchronous.content)
+
+    def test_async_views_match_sync_views(self):
+        self.authenticate()
+        self.assertSameResponse('inventory')
+        self.assertSameResponse('restock')
+        data = self.assertSameResponse('product_capacity')
+        self.assertEqual(data['remaining_capacities'][0]['product_material_with_lowest_stock']['product_quantity'], 3)
+        self.assertEqual(data['remaining_capacities'][1]['product_material_with_lowest_stock']['product_quantity'], 4)
+
+    def test_async_sales_history_pages_and_filters(self):
+        self.authenticate()
+        first = self.assertSameResponse('sales_history')
+        self.assertEqual(len(first['results']), 10)
+        url = first['next'].replace(reverse('sales_history'), reverse('async_sales_history'))
+        second = json.loads(self.client.get(url).content)
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        self.assertSameResponse('sales_history', {'since': '2023-01-05', 'until': '2023-01-07'})
+        self.assertSameResponse('sales_history', {'since': 'yesterday'})
+        self.assertSameResponse('sales_history', {'cursor': 'bogus'})
+
+    def test_unauthenticated_and_wrong_method(self):
+        self.assertSameResponse('inventory')
+        self.authenticate()
+        response = self.client.post(reverse('async_inventory'))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_token_authentication_with_async_client(self):
+        token = await Token.objects.acreate(user_id=1)
+        response = await AsyncClient().get(reverse('async_inventory'), AUTHORIZATION='Token ' + token.key)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(len(json.loads(response.content)['materials']), 2)
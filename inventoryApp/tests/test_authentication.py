@@ -0,0 +1,93 @@
+from datetime import timedelta
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from inventoryApp import factories
+from inventoryApp.authentication import LocalTokenCache, SharedTokenCache, get_token_cache
+from inventoryApp.models import User
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+class ExpiringTokenAuthenticationTestCase(APITestCase):
+    url = reverse('inventory')
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1, username='store_user')
+        self.store = factories.StoreFactory(user=self.user)
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, [query['sql'] for query in queries]
+
+    def token_queries(self, queries):
+        return [sql for sql in queries if 'authtoken_token' in sql]
+
+    def test_valid_token_is_served_from_cache(self):
+        response, queries = self.get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.token_queries(queries)), 1)
+        response, queries = self.get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.token_queries(queries), [])
+
+    def test_deleted_token_is_rejected(self):
+        self.get()
+        self.token.delete()
+        response, _ = self.get()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deactivated_user_is_rejected(self):
+        self.get()
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.get()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_expired_token_is_not_served_from_cache(self):
+        self.get()
+        Token.objects.filter(pk=self.token.pk).update(created=timezone.now() - timedelta(days=2))
+        get_token_cache().set(self.token.key, self.user, timezone.now() - timedelta(days=2))
+        response, _ = self.get()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+
+    @override_settings(TOKEN_CACHE='inventory')
+    def test_shared_cache_backend(self):
+        self.get()
+        response, queries = self.get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.token_queries(queries), [])
+        self.token.delete()
+        response, _ = self.get()
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_local_cache_evicts_least_recently_used(self):
+        token_cache = LocalTokenCache(max_entries=2, ttl=60)
+        now = timezone.now()
+        token_cache.set('a', self.user, now)
+        token_cache.set('b', self.user, now)
+        token_cache.get('a')
+        token_cache.set('c', self.user, now)
+        self.assertIsNotNone(token_cache.get('a'))
+        self.assertIsNone(token_cache.get('b'))
+        self.assertIsNotNone(token_cache.get('c'))
+
+    def test_local_cache_trusts_entries_for_its_ttl_only(self):
+        now = timezone.now()
+        for ttl, trusted in [(60, True), (0, False)]:
+            token_cache = LocalTokenCache(max_entries=2, ttl=ttl)
+            token_cache.set('a', self.user, now)
+            self.assertEqual(token_cache.get('a') is not None, trusted)
+
+    def test_shared_cache_is_not_refilled_after_a_revocation(self):
+        token_cache = SharedTokenCache('inventory')
+        token_cache.delete(self.token.key)
+        # An authentication that read the token before it was deleted
+        token_cache.set(self.token.key, self.user, self.token.created)
+        self.assertIsNone(token_cache.get(self.token.key))
@@ -0,0 +1,26 @@
+from unittest import mock
+from django.test import TestCase
+from inventoryApp import benchmarks
+
+class BenchmarkSuiteTestCase(TestCase):
+
+    def test_every_endpoint_stays_within_its_query_budget(self):
+        report = benchmarks.run(benchmarks.StoreSize(products=6, ingredients=3, stocks=8, history=30), iterations=2)
+        self.assertEqual(set(report['endpoints']), set(benchmarks.QUERY_BUDGETS))
+        for name, result in report['endpoints'].items():
+            self.assertEqual(result['status'], 200, name)
+            self.assertLessEqual(result['queries'], result['query_budget'], name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['peak_memory_kb'], 0)
+        self.assertEqual(report['over_budget'], [])
+
+    def test_exceeded_budget_is_reported(self):
+        with mock.patch.dict(benchmarks.QUERY_BUDGETS, {'inventory': 0}):
+            report = benchmarks.run(benchmarks.StoreSize(products=2, ingredients=1, stocks=2, history=2), iterations=1, only=['inventory'])
+        self.assertEqual(list(report['endpoints']), ['inventory'])
+        self.assertEqual(report['over_budget'], ['inventory'])
+
+    def test_percentile(self):
+        self.assertEqual(benchmarks.percentile([5, 1, 3, 2, 4], 50), 3)
+        self.assertEqual(benchmarks.percentile(list(range(1, 101)), 99), 99)
+        self.assertEqual(benchmarks.percentile([7], 99), 7)
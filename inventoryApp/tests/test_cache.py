@@ -0,0 +1,76 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from inventoryApp import cache, factories
+from inventoryApp.models import User
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+class StoreReadCacheTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        self.material = factories.MaterialFactory(price=2)
+        self.material_quantity = factories.MaterialQuantityFactory(ingredient=self.material, quantity=5)
+        self.product = factories.ProductFactory()
+        self.product.material_quantity.add(self.material_quantity)
+        self.store.products.add(self.product)
+        self.material_stock = factories.MaterialStockFactory(store=self.store, material=self.material, current_capacity=50, max_capacity=100)
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def get(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        self.authenticate()
+        for name in ('inventory', 'restock', 'product_capacity'):
+            first, first_queries = self.get(name)
+            second, second_queries = self.get(name)
+            self.assertEqual(first.data, second.data)
+            # The current store is cached as well
+            self.assertEqual(second_queries, 0)
+            self.assertLess(second_queries, first_queries)
+
+    def test_sales_invalidate_cached_reads(self):
+        self.authenticate()
+        self.get('inventory')
+        self.get('product_capacity')
+        self.client.post(reverse('sales'), {'sales': [{'product_id': self.product.id, 'quantity': 2}]}, format='json')
+        inventory, _ = self.get('inventory')
+        self.assertEqual(inventory.data['materials'][0]['current_capacity'], 40)
+        capacity, _ = self.get('product_capacity')
+        self.assertEqual(capacity.data['remaining_capacities'][0]['product_material_with_lowest_stock']['product_quantity'], 8)
+
+    def test_restock_invalidates_cached_quote(self):
+        self.authenticate()
+        quote, _ = self.get('restock')
+        self.assertEqual(quote.data['materials'][0]['quantity'], 50)
+        self.client.post(reverse('restock'), {'materials': [{'material': self.material.pk, 'quantity': 30}]}, format='json')
+        quote, _ = self.get('restock')
+        self.assertEqual(quote.data['materials'][0]['quantity'], 20)
+
+    def test_model_changes_invalidate_cached_reads(self):
+        self.authenticate()
+        self.get('inventory')
+        self.material.name = 'Renamed material'
+        self.material.save()
+        inventory, _ = self.get('inventory')
+        self.assertEqual(inventory.data['materials'][0]['material_name'], 'Renamed material')
+
+        self.get('product_capacity')
+        self.material_quantity.quantity = 25
+        self.material_quantity.save()
+        capacity, _ = self.get('product_capacity')
+        self.assertEqual(capacity.data['remaining_capacities'][0]['product_material_with_lowest_stock']['product_quantity'], 2)
+
+    def test_evicted_version_does_not_revive_old_entries(self):
+        version = cache.store_version(self.store.pk)
+        cache.get_cache().delete(cache.version_key(self.store.pk))
+        self.assertNotEqual(cache.store_version(self.store.pk), version)
@@ -0,0 +1,166 @@
+import io
+import json
+import os
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+from inventoryApp import catalog, factories
+from inventoryApp.models import Material, MaterialQuantity, MaterialStock, Product, ProductCapacity, StockMovement, User
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+CATALOG_CSV = """type,name,price,product,material,quantity,store,current_capacity,max_capacity
+recipe,,,Cake,Flour,5,,,
+recipe,,,Cake,Sugar,2,,,
+material,Flour,2.50,,,,,,
+material,Sugar,3,,,,,,
+product,Cake,,,,,,,
+product,Bread,,,,,,,
+recipe,,,Bread,Flour,5,,,
+stock,,,,Flour,,North,40,100
+stock,,,,Sugar,,North,10,20
+store_product,,,Cake,,,North,,
+store_product,,,Bread,,,North,,
+"""
+
+class CatalogImportTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreWithProductsFactory(user=self.user, store_name='North', products=[])
+        self.admin = User.objects.create(user_id=2, username='admin', is_staff=True)
+
+    def import_csv(self, text, chunk_size=5000):
+        return catalog.import_catalog(io.StringIO(text), 'csv', chunk_size)
+
+    def test_import_creates_the_whole_catalog(self):
+        report = self.import_csv(CATALOG_CSV)
+        self.assertEqual(report['error_count'], 0, report['errors'])
+        self.assertEqual(report['created'], {'material': 2, 'product': 2, 'recipe': 3, 'stock': 2, 'store_product': 2})
+
+        cake = Product.objects.get(name='Cake')
+        bread = Product.objects.get(name='Bread')
+        self.assertEqual(sorted(cake.material_quantity.values_list('ingredient__name', 'quantity')), [('Flour', 5), ('Sugar', 2)])
+        # Equal ingredient lines are shared between products
+        self.assertEqual(set(bread.material_quantity.all()) & set(cake.material_quantity.all()), set(bread.material_quantity.all()))
+        self.assertEqual(MaterialQuantity.objects.filter(ingredient__name__in=['Flour', 'Sugar']).count(), 2)
+        self.assertEqual(sorted(self.store.stocks.values_list('material__name', 'current_capacity', 'max_capacity')),
+                         [('Flour', 40, 100), ('Sugar', 10, 20)])
+        self.assertEqual(set(self.store.products.filter(name__in=['Cake', 'Bread'])), {cake, bread})
+
+        # Model signals do not fire for bulk inserts; their effects are applied by the import
+        self.assertEqual(dict(ProductCapacity.objects.filter(store=self.store, product__in=[cake, bread]).values_list('product__name', 'product_quantity')),
+                         {'Cake': 5, 'Bread': 8})
+        self.assertEqual(sorted(StockMovement.objects.values_list('delta', 'reference')), [(10, 'catalog_import'), (40, 'catalog_import')])
+
+    def test_reimport_changes_nothing(self):
+        self.import_csv(CATALOG_CSV)
+        report = self.import_csv(CATALOG_CSV)
+        self.assertEqual(report['created'], {'material': 0, 'product': 0, 'recipe': 0, 'stock': 0, 'store_product': 0})
+        self.assertEqual(report['unchanged'], 9)
+        self.assertEqual([error['errors'] for error in report['errors']], [
+            {'material': ['The store already has a stock of this material.']},
+        ] * 2)
+
+    def test_rows_may_refer_to_earlier_chunks(self):
+        report = self.import_csv(CATALOG_CSV, chunk_size=2)
+        # The first two recipes come before their materials and products in their own chunk
+        self.assertEqual([error['line'] for error in report['errors']], [2, 3])
+        self.assertEqual(report['created']['recipe'], 1)
+        self.assertEqual(report['created']['stock'], 2)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        factories.MaterialFactory(name='Salt')
+        factories.MaterialFactory(name='Salt')
+        report = self.import_csv("""type,name,price,product,material,quantity,store,current_capacity,max_capacity
+material,Flour,-1,,,,,,
+material,Yeast,1.999,,,,,,
+material,Water,0,,,,,,
+product,,,,,,,,
+stock,,,,Water,,North,30,20
+stock,,,,Salt,,South,1,2
+recipe,,,Soup,Water,0,,,
+shelf,,,,,,,,
+""")
+        self.assertEqual(report['rows'], 8)
+        self.assertEqual(report['error_count'], 7)
+        self.assertEqual({error['line']: error['errors'] for error in report['errors']}, {
+            2: {'price': ['Ensure this value is greater than or equal to 0.']},
+            3: {'price': ['Ensure that there are no more than 2 decimal places.']},
+            5: {'name': ['This field is required.']},
+            6: {'current_capacity': ['Current capacity cannot be higher than max capacity']},
+            7: {'store': ['No store is named "South".'], 'material': ['More than one material is named "Salt".']},
+            8: {'product': ['No product is named "Soup".'], 'quantity': ['Ensure this value is greater than or equal to 1.']},
+            9: {'type': ['Choose one of: material, product, recipe, stock, store_product.']},
+        })
+        self.assertTrue(Material.objects.filter(name='Water').exists())
+        self.assertFalse(MaterialStock.objects.exists())
+
+    def test_out_of_range_integers_are_reported(self):
+        report = self.import_csv("""type,name,price,product,material,quantity,store,current_capacity,max_capacity
+material,Flour,2,,,,,,
+product,Cake,,,,,,,
+recipe,,,Cake,Flour,2147483648,,,
+stock,,,,Flour,,North,1,99999999999
+""")
+        self.assertEqual({error['line']: error['errors'] for error in report['errors']}, {
+            4: {'quantity': ['Ensure this value is less than or equal to 2147483647.']},
+            5: {'max_capacity': ['Ensure this value is less than or equal to 2147483647.']},
+        })
+        self.assertFalse(Product.objects.get(name='Cake').material_quantity.exists())
+        self.assertFalse(MaterialStock.objects.exists())
+
+    def test_material_prices_are_updated(self):
+        self.import_csv(CATALOG_CSV)
+        report = self.import_csv("type,name,price\nmaterial,Flour,4\nmaterial,Sugar,3.00\n")
+        self.assertEqual(report['updated'], {'material': 1})
+        self.assertEqual(report['unchanged'], 1)
+        self.assertEqual(str(Material.objects.get(name='Flour').price), '4.00')
+
+    def test_conflicting_recipe_quantity(self):
+        self.import_csv(CATALOG_CSV)
+        report = self.import_csv("type,product,material,quantity\nrecipe,Cake,Flour,6\n")
+        self.assertEqual(report['errors'], [{'line': 2, 'errors': {'quantity': ['The product already uses 5 of this material.']}}])
+
+    def test_ndjson_catalog(self):
+        lines = [
+            json.dumps({'type': 'material', 'name': 'Flour', 'price': 2.5}),
+            'not json',
+            json.dumps({'type': 'stock', 'store': 'North', 'material': 'Flour', 'current_capacity': 1, 'max_capacity': 2}),
+        ]
+        report = catalog.import_catalog(io.StringIO('\n'.join(lines)), 'ndjson')
+        self.assertEqual(report['created']['stock'], 1)
+        self.assertEqual(report['errors'], [{'line': 2, 'errors': {'non_field_errors': ['Expected a JSON object.']}}])
+
+    def test_import_command(self):
+        path = self.write_catalog(CATALOG_CSV + 'stock,,,,Flour,,North,1,2\n')
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 of 12 row(s) could not be imported.'):
+            call_command('import_catalog', path, stdout=stdout, stderr=stderr)
+        self.assertIn('stock: 2 created', stdout.getvalue())
+        self.assertIn('line 13: material: The store already has a stock of this material.', stderr.getvalue())
+
+    def write_catalog(self, text):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as file:
+            file.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_import_endpoint(self):
+        self.client.force_authenticate(self.admin)
+        upload = SimpleUploadedFile('catalog.csv', CATALOG_CSV.encode(), content_type='text/csv')
+        response = self.client.post(reverse('catalog_import'), encode_multipart(BOUNDARY, {'file': upload}),
+                                    content_type=MULTIPART_CONTENT)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created']['recipe'], 3)
+
+    def test_import_endpoint_is_for_admins(self):
+        self.client.force_authenticate(User.objects.get(user_id=1))
+        upload = SimpleUploadedFile('catalog.csv', CATALOG_CSV.encode(), content_type='text/csv')
+        response = self.client.post(reverse('catalog_import'), encode_multipart(BOUNDARY, {'file': upload}),
+                                    content_type=MULTIPART_CONTENT)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Product.objects.filter(name='Cake').exists())
@@ -0,0 +1,150 @@
+import threading
+import time
+
+from django.db import connection, transaction
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from inventoryApp import capacity, factories, stock
+from inventoryApp.models import MaterialStock, ProductCapacity, SalesHistoryProduct, StockMovement, User
+from rest_framework import status
+from rest_framework.test import APIClient
+
+def is_stock_conflict(response):
+    """Whether the response is the documented refusal of a sale or restock the stocks cannot take."""
+    content = str(getattr(response, 'data', '')).lower()
+    return response.status_code == status.HTTP_400_BAD_REQUEST and (
+        'insufficient material stock' in content or 'more than the maximum capacity' in content
+    )
+
+# Locks make concurrent writers wait for each other; SQLite fails them with server errors instead
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentStockMutationTestCase(TransactionTestCase):
+    threads = 8
+    requests_per_thread = 15
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1, username='store_user')
+        self.store = factories.StoreFactory(user=self.user)
+
+        self.material1 = factories.MaterialFactory()
+        self.material2 = factories.MaterialFactory()
+        self.stock1 = factories.MaterialStockFactory(store=self.store, material=self.material1, current_capacity=300, max_capacity=400)
+        self.stock2 = factories.MaterialStockFactory(store=self.store, material=self.material2, current_capacity=300, max_capacity=400)
+
+        # Recipes that use the same materials in opposite order
+        self.product1 = factories.ProductFactory()
+        self.product1.material_quantity.add(
+            factories.MaterialQuantityFactory(ingredient=self.material1, quantity=3),
+            factories.MaterialQuantityFactory(ingredient=self.material2, quantity=2),
+        )
+        self.product2 = factories.ProductFactory()
+        self.product2.material_quantity.add(
+            factories.MaterialQuantityFactory(ingredient=self.material2, quantity=1),
+            factories.MaterialQuantityFactory(ingredient=self.material1, quantity=4),
+        )
+        self.store.products.add(self.product1, self.product2)
+
+        self.results_lock = threading.Lock()
+        self.consumed = {self.material1.pk: 0, self.material2.pk: 0}
+        self.sold = 0
+        self.unexpected = []
+
+    def record(self, material_id, quantity):
+        with self.results_lock:
+            self.consumed[material_id] += quantity
+
+    def worker(self, thread_index):
+        # The test client's exception hook is process-wide, so let errors surface as 500 responses instead
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(self.user)
+        try:
+            for request_index in range(self.requests_per_thread):
+                if (thread_index + request_index) % 4 == 0:
+                    # Restock a little of the first material
+                    data = {'materials': [{'material': self.material1.pk, 'quantity': 5}]}
+                    url = reverse('restock')
+                else:
+                    data = {'sales': [
+                        {'product_id': self.product1.id, 'quantity': 1},
+                        {'product_id': self.product2.id, 'quantity': 2},
+                    ]}
+                    url = reverse('sales')
+                response = client.post(url, data, format='json')
+                if response.status_code != status.HTTP_200_OK:
+                    # Only running out of stock or room may fail a request, and it changes nothing
+                    if not is_stock_conflict(response):
+                        with self.results_lock:
+                            self.unexpected.append((url, response.status_code, getattr(response, 'data', None)))
+                    continue
+                if url == reverse('restock'):
+                    self.record(self.material1.pk, -5)
+                else:
+                    self.record(self.material1.pk, 3 * 1 + 4 * 2)
+                    self.record(self.material2.pk, 2 * 1 + 1 * 2)
+                    with self.results_lock:
+                        self.sold += 1
+        finally:
+            connection.close()
+
+    def test_concurrent_sales_and_restocks_keep_exact_totals(self):
+        workers = [threading.Thread(target=self.worker, args=(i,)) for i in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.stock1.refresh_from_db()
+        self.stock2.refresh_from_db()
+        self.assertEqual(self.unexpected, [])
+        self.assertGreater(self.sold, 0)
+        self.assertEqual(self.stock1.current_capacity, 300 - self.consumed[self.material1.pk])
+        self.assertEqual(self.stock2.current_capacity, 300 - self.consumed[self.material2.pk])
+        self.assertGreaterEqual(self.stock1.current_capacity, 0)
+        self.assertGreaterEqual(self.stock2.current_capacity, 0)
+        self.assertLessEqual(self.stock1.current_capacity, self.stock1.max_capacity)
+        self.assertEqual(SalesHistoryProduct.objects.filter(sales_history__store=self.store).count(), 2 * self.sold)
+        self.assertFalse(MaterialStock.objects.filter(current_capacity__lt=0).exists())
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCapacityRefreshTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.store = factories.StoreWithProductsFactory(products=[])
+        self.flour = factories.MaterialStockFactory(store=self.store, current_capacity=100, max_capacity=100)
+        self.sugar = factories.MaterialStockFactory(store=self.store, current_capacity=100, max_capacity=100)
+        self.cake = factories.ProductFactory(material_quantity=None)
+        self.cake.material_quantity.add(
+            factories.MaterialQuantityFactory(ingredient=self.flour.material, quantity=2),
+            factories.MaterialQuantityFactory(ingredient=self.sugar.material, quantity=2),
+        )
+        self.store.products.add(self.cake)
+
+    def take(self, material_stock, quantity, wait_for=None, then=None):
+        try:
+            if wait_for is not None:
+                wait_for.wait(5)
+            with transaction.atomic():
+                stock.apply_deltas({MaterialStock.objects.get(pk=material_stock.pk): -quantity}, StockMovement.SALE)
+                if then is not None:
+                    # Hold the transaction open while the other writer refreshes
+                    then.set()
+                    time.sleep(0.5)
+        finally:
+            connection.close()
+
+    def test_writers_of_different_materials_do_not_overwrite_each_other(self):
+        flour_taken = threading.Event()
+        writers = [
+            threading.Thread(target=self.take, args=(self.flour, 80), kwargs={'then': flour_taken}),
+            threading.Thread(target=self.take, args=(self.sugar, 60), kwargs={'wait_for': flour_taken}),
+        ]
+        for thread in writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+
+        row = ProductCapacity.objects.get(store=self.store, product=self.cake)
+        expected = capacity.unnamed_capacities(self.store.pk, [self.cake.pk])[self.cake.pk]
+        self.assertEqual((row.material_id, row.product_quantity), (self.flour.material_id, 10))
+        self.assertEqual(row.product_quantity, expected.product_quantity)
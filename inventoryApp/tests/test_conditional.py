@@ -0,0 +1,91 @@
+import time
+from unittest import mock
+from django.urls import reverse
+from django.utils.http import http_date
+from inventoryApp import cache, factories
+from inventoryApp.models import MaterialStock, User
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+class ConditionalGetTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreWithProductsFactory(user=self.user, products=[])
+        self.flour = factories.MaterialFactory(name='Flour')
+        self.cake = factories.ProductFactory(material_quantity=None, name='Cake')
+        self.cake.material_quantity.set([factories.MaterialQuantityFactory(ingredient=self.flour, quantity=2)])
+        self.store.products.add(self.cake)
+        self.flour_stock = factories.MaterialStockFactory(store=self.store, material=self.flour, current_capacity=10, max_capacity=20)
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_store_answers_304(self):
+        for name in ['inventory', 'product_capacity', 'products', 'restock']:
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                etag = response['ETag']
+                self.assertTrue(etag.startswith('"'))
+                self.assertIn('Authorization', response['Vary'])
+
+                response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+
+    def test_payload_is_not_built_for_304(self):
+        with mock.patch.object(cache, 'cached_store_data', wraps=cache.cached_store_data) as cached_store_data:
+            etag = self.client.get(reverse('inventory'))['ETag']
+            cached_store_data.assert_called_once()
+            cached_store_data.reset_mock()
+            response = self.client.get(reverse('inventory'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        cached_store_data.assert_not_called()
+
+    def test_changes_give_new_etags(self):
+        inventory = self.client.get(reverse('inventory'))['ETag']
+        products = self.client.get(reverse('products'))['ETag']
+        self.assertNotEqual(inventory, products)
+        self.assertNotEqual(self.client.get(reverse('products'), {'page': 1})['ETag'], products)
+
+        self.client.post(reverse('sales'), {'sales': [{'product_id': self.cake.pk, 'quantity': 1}]}, format='json')
+        response = self.client.get(reverse('inventory'), HTTP_IF_NONE_MATCH=inventory)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['materials'][0]['current_capacity'], 8)
+
+        self.cake.name = 'Cheesecake'
+        self.cake.save()
+        response = self.client.get(reverse('products'), HTTP_IF_NONE_MATCH=products)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = {product['id']: product['name'] for product in response.data['results']}
+        self.assertEqual(names[self.cake.pk], 'Cheesecake')
+
+    def test_stores_do_not_share_etags(self):
+        etag = self.client.get(reverse('inventory'))['ETag']
+        factories.StoreWithProductsFactory(user__user_id=2, products=[])
+        self.client.force_authenticate(User.objects.get(user_id=2))
+        response = self.client.get(reverse('inventory'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_last_modified(self):
+        # A change within the current second could still share its HTTP date
+        self.assertNotIn('Last-Modified', self.client.get(reverse('restock')))
+
+        modified = int(time.time()) - 60
+        cache.get_cache().set(cache.modified_key(self.store.pk), modified + 0.5)
+        response = self.client.get(reverse('restock'))
+        self.assertEqual(response['Last-Modified'], http_date(modified))
+        response = self.client.get(reverse('restock'), HTTP_IF_MODIFIED_SINCE=http_date(modified))
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        MaterialStock.objects.filter(pk=self.flour_stock.pk).get().save()
+        response = self.client.get(reverse('restock'), HTTP_IF_MODIFIED_SINCE=http_date(modified))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_writes_are_not_conditional(self):
+        etag = self.client.get(reverse('restock'))['ETag']
+        response = self.client.post(reverse('restock'), {}, format='json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from django.core.management import call_command
+from django.urls import reverse
+from inventoryApp import factories
+from inventoryApp.models import SalesHistory, SalesHistoryProduct, User
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+class SalesHistoryExportTestCase(APITestCase):
+    url = reverse('sales_history_export')
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        self.other_store = factories.StoreFactory()
+        self.product = factories.ProductFactory(name='Cake, "large"')
+        self.start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        self.lines = []
+        for day in range(5):
+            sale = SalesHistory.objects.create(store=self.store, date=self.start + timedelta(days=day))
+            self.lines.append(SalesHistoryProduct.objects.create(sales_history=sale, product=self.product, quantity=day + 1))
+        other_sale = SalesHistory.objects.create(store=self.other_store, date=self.start)
+        SalesHistoryProduct.objects.create(sales_history=other_sale, product=self.product, quantity=9)
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def get(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_of_the_store_sales(self):
+        self.authenticate()
+        rows = list(csv.reader(io.StringIO(self.get({}))))
+        self.assertEqual(rows[0], ['id', 'sales_history', 'store', 'date', 'product', 'product_name', 'quantity'])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1][5], 'Cake, "large"')
+        self.assertEqual([row[6] for row in rows[1:]], ['1', '2', '3', '4', '5'])
+        self.assertEqual(rows[1][3], self.start.isoformat())
+
+    def test_ndjson_export_with_filters_and_resume(self):
+        self.authenticate()
+        records = [json.loads(line) for line in self.get({'output': 'ndjson', 'since': '2023-01-02', 'until': '2023-01-05'}).splitlines()]
+        self.assertEqual([record['quantity'] for record in records], [2, 3, 4])
+        self.assertEqual(records[0]['store'], self.store.pk)
+
+        records = [json.loads(line) for line in self.get({'output': 'ndjson', 'after': self.lines[2].pk}).splitlines()]
+        self.assertEqual([record['id'] for record in records], [self.lines[3].pk, self.lines[4].pk])
+
+    def test_invalid_parameters(self):
+        self.authenticate()
+        for params in ({'output': 'xml'}, {'since': 'yesterday'}, {'after': 'last'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_command(self):
+        stdout = io.StringIO()
+        call_command('export_sales_history', '--store', str(self.other_store.pk), '--format', 'ndjson', stdout=stdout)
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([record['quantity'] for record in records], [9])
+
+        stdout = io.StringIO()
+        call_command('export_sales_history', '--after', str(self.lines[3].pk), '--chunk-size', '1', stdout=stdout)
+        rows = list(csv.reader(io.StringIO(stdout.getvalue())))
+        self.assertEqual([row[6] for row in rows[1:]], ['5', '9'])
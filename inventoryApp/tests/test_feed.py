@@ -0,0 +1,155 @@
+import asyncio
+import json
+from django.db import transaction
+from django.test import AsyncClient
+from django.urls import reverse
+from inventoryApp import factories, feed
+from inventoryApp.models import User
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+class StockFeedTestCase(APITestCase):
+
+    def setUp(self):
+        feed._broker = feed.InProcessBroker()
+        self.addCleanup(setattr, feed, '_broker', None)
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        self.flour = factories.MaterialStockFactory(store=self.store, current_capacity=5, max_capacity=10)
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def test_stock_changes_are_published_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flour.current_capacity = 8
+            self.flour.save()
+            self.assertEqual(feed.get_broker().events_after(self.store.pk, 0), [])
+        [event] = feed.get_broker().events_after(self.store.pk, 0)
+        self.assertEqual(event.id, 1)
+        self.assertEqual(event.data, {
+            'store': self.store.pk,
+            'materials': [{'material': self.flour.material_id, 'current_capacity': 8, 'max_capacity': 10}],
+        })
+
+    def test_rolled_back_changes_are_not_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.flour.current_capacity = 8
+                self.flour.save()
+                raise RuntimeError()
+        self.assertEqual(feed.get_broker().events_after(self.store.pk, 0), [])
+
+    def test_sales_publish_the_used_stocks(self):
+        product = factories.ProductFactory(material_quantity=None)
+        product.material_quantity.set([factories.MaterialQuantityFactory(ingredient=self.flour.material, quantity=2)])
+        self.store.products.add(product)
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('sales'), {'sales': [{'product_id': product.pk, 'quantity': 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        events = feed.get_broker().events_after(self.store.pk, 0)
+        self.assertEqual(events[-1].data['materials'], [
+            {'material': self.flour.material_id, 'current_capacity': 3, 'max_capacity': 10},
+        ])
+
+    def test_deleted_stocks_are_published(self):
+        material_id = self.flour.material_id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flour.delete()
+        [event] = feed.get_broker().events_after(self.store.pk, 0)
+        self.assertEqual(event.data['materials'], [{'material': material_id, 'deleted': True}])
+
+    def test_broker_keeps_limited_history_per_store(self):
+        broker = feed.InProcessBroker(history=2)
+        for number in range(3):
+            broker.publish(1, {'number': number})
+        broker.publish(2, {'number': 0})
+        self.assertEqual([event.id for event in broker.events_after(1, 0)], [2, 3])
+        self.assertEqual([event.id for event in broker.events_after(1, 2)], [3])
+        self.assertEqual([event.id for event in broker.events_after(2, 0)], [1])
+        # Ids from before a restart start the feed over
+        self.assertEqual([event.id for event in broker.events_after(2, 50)], [1])
+
+    def test_incomplete_broker_cannot_be_created(self):
+        class PublishOnlyBroker(feed.StockFeedBroker):
+            def publish(self, store_id, data):
+                pass
+        with self.assertRaises(TypeError):
+            PublishOnlyBroker()
+
+    async def test_long_poll_waits_for_next_event(self):
+        token = await Token.objects.acreate(user_id=1)
+        broker = feed.get_broker()
+        broker.publish(self.store.pk, {'store': self.store.pk, 'materials': []})
+        poll = asyncio.ensure_future(AsyncClient().get(
+            reverse('stock_feed_poll'), {'last_event_id': 1, 'timeout': 5}, AUTHORIZATION='Token ' + token.key))
+        await asyncio.sleep(0.05)
+        self.assertFalse(poll.done())
+        broker.publish(self.store.pk, {'store': self.store.pk, 'materials': [{'material': 1, 'current_capacity': 0, 'max_capacity': 1}]})
+        response = await asyncio.wait_for(poll, 5)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {
+            'last_event_id': 2,
+            'events': [{'id': 2, 'store': self.store.pk, 'materials': [{'material': 1, 'current_capacity': 0, 'max_capacity': 1}]}],
+        })
+
+    async def test_long_poll_times_out_empty(self):
+        token = await Token.objects.acreate(user_id=1)
+        response = await AsyncClient().get(
+            reverse('stock_feed_poll'), {'last_event_id': 0, 'timeout': 0}, AUTHORIZATION='Token ' + token.key)
+        self.assertEqual(json.loads(response.content), {'last_event_id': 0, 'events': []})
+
+    def test_long_poll_rejects_bad_parameters(self):
+        self.authenticate()
+        response = self.client.get(reverse('stock_feed_poll'), {'timeout': 'soon'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_long_poll_requires_authentication(self):
+        response = self.client.get(reverse('stock_feed_poll'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def sse_messages(self, headers, wanted_events):
+        """Open the SSE stream and disconnect once wanted_events events came through."""
+        messages = []
+        done = asyncio.Event()
+
+        async def receive():
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if sum(b'\nevent: stocks\n' in message.get('body', b'') for message in messages) >= wanted_events:
+                done.set()
+
+        app = feed.StockFeedApp(app=None, keepalive=5)
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/inventoryapp/stock-feed/', 'query_string': b'',
+            'headers': headers, 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+        }
+        await asyncio.wait_for(app(scope, receive, send), 5)
+        return messages
+
+    async def test_sse_replays_missed_events_and_streams_new_ones(self):
+        token = await Token.objects.acreate(user_id=1)
+        broker = feed.get_broker()
+        for number in range(3):
+            broker.publish(self.store.pk, {'number': number})
+        asyncio.get_running_loop().call_later(0.05, broker.publish, self.store.pk, {'number': 3})
+        messages = await self.sse_messages(
+            [(b'authorization', b'Token ' + token.key.encode()), (b'last-event-id', b'1')], wanted_events=3)
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), messages[0]['headers'])
+        self.assertEqual([message['body'] for message in messages[1:]], [
+            b'id: 2\nevent: stocks\ndata: {"number": 1}\n\n',
+            b'id: 3\nevent: stocks\ndata: {"number": 2}\n\n',
+            b'id: 4\nevent: stocks\ndata: {"number": 3}\n\n',
+        ])
+
+    async def test_sse_requires_authentication(self):
+        messages = await self.sse_messages([], wanted_events=0)
+        self.assertEqual(messages[0]['status'], 403)
+
@@ -0,0 +1,64 @@
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+from inventoryApp import factories, models
+
+class QueryPlanTestCase(TestCase):
+    """The hot filters are answered from an index instead of a full table scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = factories.StoreFactory()
+        cls.material = factories.MaterialFactory()
+        factories.MaterialStockFactory(store=cls.store, material=cls.material)
+        sale = models.SalesHistory.objects.create(store=cls.store)
+        models.SalesHistoryProduct.objects.create(sales_history=sale, product=factories.ProductFactory(), quantity=1)
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be read sequentially
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, table):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            self.assertIn('Index', plan)
+            self.assertNotIn(f'Seq Scan on "{table}"', plan)
+        else:
+            self.assertIn('USING', plan)
+            self.assertNotIn(f'SCAN {table}\n', plan + '\n')
+
+    def test_material_stock_by_store_and_material(self):
+        queryset = models.MaterialStock.objects.filter(store=self.store, material=self.material).values('current_capacity', 'max_capacity')
+        self.assertUsesIndex(queryset, models.MaterialStock._meta.db_table)
+
+    def test_sales_history_by_store_and_date(self):
+        queryset = models.SalesHistory.objects.filter(store=self.store).order_by('date', 'id')
+        plan = queryset.explain()
+        self.assertUsesIndex(queryset, models.SalesHistory._meta.db_table)
+        if connection.vendor == 'sqlite':
+            self.assertIn('saleshistory_store_date_idx', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_sales_history_products_by_sale(self):
+        queryset = models.SalesHistoryProduct.objects.filter(sales_history__in=[1, 2]).values('product_id', 'quantity')
+        self.assertUsesIndex(queryset, models.SalesHistoryProduct._meta.db_table)
+
+    def test_store_by_user(self):
+        queryset = models.Store.objects.filter(user_id=self.store.user_id)
+        self.assertUsesIndex(queryset, models.Store._meta.db_table)
+
+class ConstraintTestCase(TestCase):
+
+    def test_stock_capacity_bounds(self):
+        stock = factories.MaterialStockFactory(current_capacity=5, max_capacity=10)
+        for current_capacity in (-1, 11):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                models.MaterialStock.objects.filter(pk=stock.pk).update(current_capacity=current_capacity)
+
+    def test_quantities_are_positive(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            factories.MaterialQuantityFactory(quantity=0)
+        sale = models.SalesHistory.objects.create(store=factories.StoreFactory())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            models.SalesHistoryProduct.objects.create(sales_history=sale, product=factories.ProductFactory(), quantity=-2)
@@ -0,0 +1,94 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from inventoryApp import factories, instrumentation, serializers
+from inventoryApp.models import SalesHistory, SalesHistoryProduct, User
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+@override_settings(REQUEST_METRICS=True)
+class RequestMetricsTestCase(APITestCase):
+
+    def setUp(self):
+        instrumentation.registry.reset()
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        factories.MaterialStockFactory(store=self.store)
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_header(self):
+        self.authenticate()
+        response = self.client.get(reverse('inventory'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timings = dict(entry.strip().split(';', 1) for entry in response['Server-Timing'].split(','))
+        self.assertEqual(set(timings), {'db', 'serializer', 'view', 'total'})
+        self.assertRegex(timings['db'], r'^dur=[\d.]+;desc="[1-9]\d* queries"$')
+
+    def test_metrics_endpoint_aggregates_per_route(self):
+        self.authenticate()
+        for _ in range(3):
+            self.client.get(reverse('inventory'))
+        self.client.get(reverse('restock'))
+        with override_settings(METRICS_TOKEN='scraper-secret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scraper-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE inventory_request_duration_seconds histogram', body)
+        self.assertIn('inventory_request_duration_seconds_count{method="GET",route="inventoryapp/inventory/"} 3', body)
+        self.assertIn('inventory_request_db_queries_count{method="GET",route="inventoryapp/restock/"} 1', body)
+        self.assertIn('inventory_request_serializer_duration_seconds_bucket{method="GET",route="inventoryapp/inventory/",le="+Inf"} 3', body)
+
+    @override_settings(METRICS_TOKEN='scraper-secret')
+    def test_metrics_endpoint_is_not_public(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_login(User.objects.get(user_id=1))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_login(User.objects.create(username='operator', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_nested_serializer_timing_is_counted_once(self):
+        metrics = instrumentation.RequestMetrics()
+        token = instrumentation._current.set(metrics)
+        try:
+            with instrumentation.serializer_timing():
+                with instrumentation.serializer_timing():
+                    serializers.InventorySerializer(None, context={'store': self.store}).data
+                inner = metrics.serializer
+        finally:
+            instrumentation._current.reset(token)
+        self.assertEqual(metrics.serializer_depth, 0)
+        self.assertEqual(inner, 0)
+        self.assertGreater(metrics.serializer, 0)
+
+    def test_streaming_response_is_observed_once_its_body_is_consumed(self):
+        self.authenticate()
+        product = factories.ProductFactory()
+        sale = SalesHistory.objects.create(store=self.store, date=timezone.now())
+        SalesHistoryProduct.objects.create(sales_history=sale, product=product, quantity=1)
+        series = 'inventory_request_db_queries_sum{method="GET",route="inventoryapp/sales-history/export/"}'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('sales_history_export'))
+            self.assertNotIn('Server-Timing', response)
+            self.assertNotIn(series, instrumentation.registry.render())
+            body = b''.join(response.streaming_content)
+        self.assertIn(b',1\r\n', body)
+        self.assertIn(f'{series} {len(queries)}\n', instrumentation.registry.render())
+
+@override_settings(REQUEST_METRICS=False)
+class RequestMetricsDisabledTestCase(APITestCase):
+
+    def test_no_headers_and_no_endpoint(self):
+        user = User.objects.create(user_id=1)
+        factories.StoreFactory(user=user)
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('inventory'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,154 @@
+import io
+import threading
+import time
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from inventoryApp import factories, ledger, stock
+from inventoryApp.models import MaterialStock, StockMovement, StockSnapshot, User
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+class StockLedgerTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        self.flour = factories.MaterialFactory()
+        self.sugar = factories.MaterialFactory()
+        self.cake = factories.ProductFactory(material_quantity=None)
+        self.cake.material_quantity.set([
+            factories.MaterialQuantityFactory(ingredient=self.flour, quantity=5),
+            factories.MaterialQuantityFactory(ingredient=self.sugar, quantity=2),
+        ])
+        self.store.products.add(self.cake)
+        self.flour_stock = factories.MaterialStockFactory(store=self.store, material=self.flour, current_capacity=50, max_capacity=100)
+        self.sugar_stock = factories.MaterialStockFactory(store=self.store, material=self.sugar, current_capacity=20, max_capacity=40)
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def movements(self):
+        return list(StockMovement.objects.filter(store=self.store).order_by('pk')
+                    .values_list('material_id', 'kind', 'delta', 'reference'))
+
+    def sell(self, quantity):
+        self.authenticate()
+        response = self.client.post(reverse('sales'), {'sales': [{'product_id': self.cake.pk, 'quantity': quantity}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def current_capacities(self):
+        return dict(MaterialStock.objects.filter(store=self.store).values_list('material_id', 'current_capacity'))
+
+    def test_creating_stocks_is_recorded(self):
+        self.assertEqual(self.movements(), [
+            (self.flour.pk, StockMovement.ADJUST, 50, f'material_stock:{self.flour_stock.pk}'),
+            (self.sugar.pk, StockMovement.ADJUST, 20, f'material_stock:{self.sugar_stock.pk}'),
+        ])
+
+    def test_sales_and_restocks_are_recorded(self):
+        StockMovement.objects.all().delete()
+        self.sell(2)
+        sale = self.store.saleshistory_set.get()
+        self.client.post(reverse('restock'), {'materials': [{'material': self.sugar.pk, 'quantity': 3}]}, format='json')
+        self.client.post(reverse('restock'), {}, format='json')
+        self.assertEqual(self.movements(), [
+            (self.flour.pk, StockMovement.SALE, -10, f'sales_history:{sale.pk}'),
+            (self.sugar.pk, StockMovement.SALE, -4, f'sales_history:{sale.pk}'),
+            (self.sugar.pk, StockMovement.RESTOCK, 3, 'restock'),
+            (self.flour.pk, StockMovement.RESTOCK, 60, 'restock'),
+            (self.sugar.pk, StockMovement.RESTOCK, 21, 'restock'),
+        ])
+
+    def test_failed_sales_record_nothing(self):
+        StockMovement.objects.all().delete()
+        with self.assertRaises(stock.StockConflict):
+            stock.SalesPlan(self.store, [self.cake.pk]).apply([{'product_id': self.cake.pk, 'quantity': 11}])
+        self.assertEqual(self.movements(), [])
+
+    def test_manual_edits_are_recorded(self):
+        StockMovement.objects.all().delete()
+        self.flour_stock.current_capacity = 45
+        self.flour_stock.save()
+        self.authenticate()
+        self.client.delete(reverse('material_stocks_detail', kwargs={'pk': self.flour_stock.pk}))
+        self.assertEqual(self.movements(), [
+            (self.flour.pk, StockMovement.ADJUST, -5, f'material_stock:{self.flour_stock.pk}'),
+            (self.flour.pk, StockMovement.ADJUST, -45, f'material_stock:{self.flour_stock.pk}'),
+        ])
+
+    def test_stock_at_replays_movements_since_the_latest_snapshot(self):
+        created = timezone.now()
+        self.sell(1)
+        after_first_sale = timezone.now()
+        ledger.take_snapshot(self.store.pk)
+        self.sell(2)
+        after_second_sale = timezone.now()
+        ledger.take_snapshot(self.store.pk)
+        self.sell(1)
+
+        self.assertEqual(ledger.stock_at(self.store.pk, created), {self.flour.pk: 50, self.sugar.pk: 20})
+        self.assertEqual(ledger.stock_at(self.store.pk, after_first_sale), {self.flour.pk: 45, self.sugar.pk: 18})
+        self.assertEqual(ledger.stock_at(self.store.pk, after_second_sale), {self.flour.pk: 35, self.sugar.pk: 14})
+        self.assertEqual(ledger.stock_at(self.store.pk, timezone.now()), self.current_capacities())
+
+        # Only movements after the snapshot are read
+        StockMovement.objects.filter(created_at__lte=after_second_sale).delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(ledger.stock_at(self.store.pk, timezone.now()), {self.flour.pk: 30, self.sugar.pk: 12})
+        self.assertEqual(len(queries), 2)
+
+    def test_snapshot_command(self):
+        call_command('snapshot_stocks', stdout=io.StringIO())
+        self.assertEqual(
+            set(StockSnapshot.objects.values_list('store_id', 'material_id', 'current_capacity')),
+            {(self.store.pk, self.flour.pk, 50), (self.store.pk, self.sugar.pk, 20)},
+        )
+
+    def test_material_stocks_at_endpoint(self):
+        before = timezone.now()
+        self.sell(1)
+        self.authenticate()
+        response = self.client.get(reverse('material_stocks_at'), {'time': before.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['materials'], sorted([
+            {'material': self.flour.pk, 'current_capacity': 50},
+            {'material': self.sugar.pk, 'current_capacity': 20},
+        ], key=lambda row: row['material']))
+        response = self.client.get(reverse('material_stocks_at'), {'time': 'now'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentAdjustmentTestCase(TransactionTestCase):
+
+    def test_adjustment_is_computed_against_the_committed_capacity(self):
+        material_stock = factories.MaterialStockFactory(current_capacity=10, max_capacity=100)
+        sale_applied = threading.Event()
+
+        def sale():
+            try:
+                with transaction.atomic():
+                    [locked] = stock.lock_stocks(MaterialStock.objects.filter(pk=material_stock.pk))
+                    stock.apply_deltas({locked: -3}, StockMovement.SALE)
+                    sale_applied.set()
+                    # Commits while the edit below waits for the row
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        seller = threading.Thread(target=sale)
+        seller.start()
+        sale_applied.wait(5)
+        # An edit of the stock as it was read before the sale
+        material_stock.current_capacity = 15
+        with transaction.atomic():
+            material_stock.save()
+        seller.join()
+
+        total = sum(StockMovement.objects.filter(store=material_stock.store).values_list('delta', flat=True))
+        self.assertEqual(total, 15)
@@ -0,0 +1,82 @@
+from unittest import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from inventoryApp import cache, factories, renderers, stock, views
+from inventoryApp.models import MaterialStock, User
+from inventoryApp.serializers import InventoryMaterialStockSerializer
+from inventoryApp.testing import allow_repeated_queries
+from rest_framework import mixins, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+class FastListingsTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreWithProductsFactory(user=self.user, products=[])
+        names = ['Flour', 'Sucre glacé', 'Line\u2028separator', 'Quote "and" \\ slash', 'Tab\there']
+        self.materials = [factories.MaterialFactory(name=names[index % len(names)]) for index in range(12)]
+        for index, material in enumerate(self.materials):
+            factories.MaterialStockFactory(store=self.store, material=material, current_capacity=index * 7, max_capacity=97)
+        for index in range(12):
+            product = factories.ProductFactory(material_quantity=None, name=f'Gâteau {index}')
+            product.material_quantity.set([
+                factories.MaterialQuantityFactory(ingredient=material, quantity=index % 3 + 1)
+                for material in self.materials[index:index + 3]
+            ])
+            self.store.products.add(product)
+        for index in range(3):
+            stock.SalesPlan(self.store, [product.pk]).apply([{'product_id': product.pk, 'quantity': index + 1}])
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def serializer_content(self, view, url):
+        # The generic serializer-based list, rendered by JSONRenderer
+        with mock.patch.object(view, 'list', mixins.ListModelMixin.list), mock.patch.object(renderers, 'orjson', None):
+            return self.client.get(url).content
+
+    @allow_repeated_queries(40)
+    def test_lists_match_their_serializers_byte_for_byte(self):
+        cases = [
+            (views.MaterialStockListAPIView, reverse('material_stocks')),
+            (views.MaterialStockListAPIView, reverse('material_stocks') + '?page=2'),
+            (views.ProductListAPIView, reverse('products')),
+            (views.ProductListAPIView, reverse('products') + '?page=2'),
+            (views.SalesHistoryListAPIView, reverse('sales_history')),
+            (views.SalesHistoryListAPIView, reverse('sales_history') + '?page_size=2'),
+        ]
+        for view, url in cases:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.content, self.serializer_content(view, url))
+
+    def test_inventory_matches_its_serializer_byte_for_byte(self):
+        response = self.client.get(reverse('inventory'))
+        material_stocks = MaterialStock.objects.filter(store=self.store)
+        expected = {'materials': InventoryMaterialStockSerializer(material_stocks, many=True).data}
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+        cache.get_cache().clear()
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(self.client.get(reverse('inventory')).content, response.content)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self.client.get(reverse('inventory'))  # warm up the cached store lookup
+        for short_page, full_page in [
+            ((reverse('products'), {'page': 2}), (reverse('products'), {})),
+            ((reverse('sales_history'), {'page_size': 1}), (reverse('sales_history'), {})),
+        ]:
+            with self.subTest(url=full_page[0]):
+                with CaptureQueriesContext(connection) as short_queries:
+                    self.client.get(*short_page)
+                with CaptureQueriesContext(connection) as full_queries:
+                    self.client.get(*full_page)
+                self.assertEqual(len(short_queries), len(full_queries))
+
+    def test_renderer_falls_back_for_what_orjson_cannot_encode(self):
+        renderer = renderers.FastJSONRenderer()
+        for data in [{'big': 2 ** 70}, {1: 'integer key'}, {'indented': True}]:
+            context = {'indent': 2} if 'indented' in data else None
+            self.assertEqual(renderer.render(data, renderer_context=context),
+                             JSONRenderer().render(data, renderer_context=context))
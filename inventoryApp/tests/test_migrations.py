@@ -0,0 +1,49 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+class InternMaterialQuantitiesMigrationTestCase(TransactionTestCase):
+    before = [('inventoryApp', '0007_stock_ledger')]
+    after = [('inventoryApp', '0008_intern_material_quantities')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_duplicate_recipe_lines_are_merged(self):
+        apps = self.migrate(self.before)
+        Material = apps.get_model('inventoryApp', 'Material')
+        MaterialQuantity = apps.get_model('inventoryApp', 'MaterialQuantity')
+        Product = apps.get_model('inventoryApp', 'Product')
+        flour = Material.objects.create(name='Flour', price=1)
+        sugar = Material.objects.create(name='Sugar', price=2)
+        flour_2, flour_2_copy, flour_3, sugar_2, sugar_2_copy = (
+            MaterialQuantity.objects.create(ingredient=material, quantity=quantity)
+            for material, quantity in [(flour, 2), (flour, 2), (flour, 3), (sugar, 2), (sugar, 2)]
+        )
+        cake = Product.objects.create(name='Cake')
+        cake.material_quantity.set([flour_2, sugar_2_copy])
+        bread = Product.objects.create(name='Bread')
+        bread.material_quantity.set([flour_2_copy, flour_3])
+        # Both copies of the same line
+        soup = Product.objects.create(name='Soup')
+        soup.material_quantity.set([sugar_2, sugar_2_copy])
+
+        apps = self.migrate(self.after)
+        MaterialQuantity = apps.get_model('inventoryApp', 'MaterialQuantity')
+        Product = apps.get_model('inventoryApp', 'Product')
+        self.assertEqual(set(MaterialQuantity.objects.values_list('pk', flat=True)), {flour_2.pk, flour_3.pk, sugar_2.pk})
+        recipes = {
+            product.name: sorted(product.material_quantity.values_list('pk', 'ingredient__name', 'quantity'))
+            for product in Product.objects.all()
+        }
+        self.assertEqual(recipes, {
+            'Cake': [(flour_2.pk, 'Flour', 2), (sugar_2.pk, 'Sugar', 2)],
+            'Bread': [(flour_2.pk, 'Flour', 2), (flour_3.pk, 'Flour', 3)],
+            'Soup': [(sugar_2.pk, 'Sugar', 2)],
+        })
@@ -1,9 +1,15 @@
+from io import StringIO
+from unittest import mock, skipIf
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from inventoryApp.models import User
+from inventoryApp.models import ProductCapacity, User
 from inventoryApp.serializers import ProductCapacitySerializer
-from inventoryApp import factories
+from inventoryApp import capacity, factories
 class ProductCapacitySerializerTestCase(APITestCase):
 
     def setUp(self):
@@ -123,3 +129,123 @@ class ProductCapacityViewTestCase(APITestCase):
         self.assertEqual(response.data['remaining_capacities'][0]['product_material_with_lowest_stock']['stock_capacity'], self.material_stock.current_capacity)
         self.assertEqual(response.data['remaining_capacities'][0]['product_material_with_lowest_stock']['material_quantity_each'], self.material_quantity1.quantity)
         self.assertEqual(response.data['remaining_capacities'][0]['product_material_with_lowest_stock']['product_quantity'], int(self.material_stock.current_capacity / self.material_quantity1.quantity))
+
+class ProductCapacityEngineTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        self.flour = factories.MaterialFactory()
+        self.sugar = factories.MaterialFactory()
+        self.eggs = factories.MaterialFactory()
+        factories.MaterialStockFactory(store=self.store, material=self.flour, current_capacity=100, max_capacity=100)
+        factories.MaterialStockFactory(store=self.store, material=self.sugar, current_capacity=30, max_capacity=100)
+
+        self.cake = factories.ProductFactory()
+        self.cake.material_quantity.add(
+            factories.MaterialQuantityFactory(ingredient=self.flour, quantity=10),
+            factories.MaterialQuantityFactory(ingredient=self.sugar, quantity=3),
+        )
+        self.omelette = factories.ProductFactory()
+        self.omelette.material_quantity.add(factories.MaterialQuantityFactory(ingredient=self.eggs, quantity=2))
+        self.water = factories.ProductFactory()
+        self.store.products.add(self.cake, self.omelette, self.water)
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def test_product_capacities(self):
+        capacities = capacity.product_capacities(self.store)
+        # Ties go to the first ingredient of the recipe
+        self.assertEqual(capacities[self.cake.id], capacity.Capacity(self.flour.pk, self.flour.name, 100, 10, 10))
+        # Materials the store does not stock count as empty
+        self.assertEqual(capacities[self.omelette.id], capacity.Capacity(self.eggs.pk, self.eggs.name, 0, 2, 0))
+        self.assertIsNone(capacities[self.water.id])
+
+    @skipIf(capacity.numpy is None, 'NumPy is not installed')
+    def test_numpy_and_python_paths_agree(self):
+        with_numpy = capacity.product_capacities(self.store)
+        with mock.patch.object(capacity, 'numpy', None):
+            without_numpy = capacity.product_capacities(self.store)
+        self.assertEqual(with_numpy, without_numpy)
+
+    def test_query_count_does_not_grow_with_products(self):
+        self.authenticate()
+        url = reverse('product_capacity')
+        self.client.get(reverse('inventory'))  # warm up the cached store lookup
+        with CaptureQueriesContext(connection) as small_store:
+            self.client.get(url)
+        for _ in range(20):
+            product = factories.ProductFactory()
+            product.material_quantity.add(
+                factories.MaterialQuantityFactory(ingredient=self.sugar, quantity=1),
+                factories.MaterialQuantityFactory(ingredient=self.flour, quantity=2),
+            )
+            self.store.products.add(product)
+        with CaptureQueriesContext(connection) as big_store:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['remaining_capacities']), 23)
+        self.assertEqual(len(small_store), len(big_store))
+
+class ProductCapacityTableTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        self.flour = factories.MaterialFactory()
+        self.sugar = factories.MaterialFactory()
+        self.flour_stock = factories.MaterialStockFactory(store=self.store, material=self.flour, current_capacity=100, max_capacity=200)
+        self.sugar_stock = factories.MaterialStockFactory(store=self.store, material=self.sugar, current_capacity=60, max_capacity=200)
+
+        self.cake = factories.ProductFactory()
+        self.cake.material_quantity.add(
+            factories.MaterialQuantityFactory(ingredient=self.flour, quantity=10),
+            factories.MaterialQuantityFactory(ingredient=self.sugar, quantity=3),
+        )
+        self.store.products.add(self.cake)
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def assertTableUpToDate(self):
+        rows = {row.product_id: (row.material_id, row.product_quantity) for row in ProductCapacity.objects.filter(store=self.store)}
+        expected = {
+            product_id: product_capacity and (product_capacity.material_id, product_capacity.product_quantity)
+            for product_id, product_capacity in capacity.product_capacities(self.store).items()
+        }
+        self.assertEqual(rows, {product_id: value or (None, None) for product_id, value in expected.items()})
+
+    def test_table_follows_sales_and_restocks(self):
+        self.authenticate()
+        self.assertEqual(ProductCapacity.objects.get(store=self.store, product=self.cake).product_quantity, 10)
+        self.client.post(reverse('sales'), {'sales': [{'product_id': self.cake.id, 'quantity': 5}]}, format='json')
+        self.assertEqual(ProductCapacity.objects.get(store=self.store, product=self.cake).product_quantity, 5)
+        self.client.post(reverse('restock'), {}, format='json')
+        self.assertEqual(ProductCapacity.objects.get(store=self.store, product=self.cake).product_quantity, 20)
+        self.assertTableUpToDate()
+
+    def test_table_follows_stock_and_recipe_changes(self):
+        self.authenticate()
+        self.sugar_stock.current_capacity = 9
+        self.sugar_stock.save()
+        row = ProductCapacity.objects.get(store=self.store, product=self.cake)
+        self.assertEqual((row.material_id, row.product_quantity), (self.sugar.pk, 3))
+
+        self.client.delete(reverse('material_stocks_detail', kwargs={'pk': self.flour_stock.pk}))
+        self.assertEqual(ProductCapacity.objects.get(store=self.store, product=self.cake).product_quantity, 0)
+
+        self.cake.material_quantity.clear()
+        self.assertIsNone(ProductCapacity.objects.get(store=self.store, product=self.cake).product_quantity)
+
+        self.store.products.remove(self.cake)
+        self.assertFalse(ProductCapacity.objects.filter(store=self.store).exists())
+
+    def test_rebuild_command(self):
+        ProductCapacity.objects.filter(store=self.store).update(product_quantity=999)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_product_capacity', '--verify-only', stdout=StringIO(), stderr=StringIO())
+        call_command('rebuild_product_capacity', stdout=StringIO(), stderr=StringIO())
+        self.assertTableUpToDate()
@@ -0,0 +1,67 @@
+import io
+import json
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from inventoryApp import factories
+from inventoryApp.models import User
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+class OperatorRestockTestCase(APITestCase):
+    url = reverse('operator_restock')
+
+    def setUp(self):
+        self.operator = User.objects.create(username='operator', is_staff=True)
+        self.flour = factories.MaterialFactory(name='Flour', price=2)
+        self.sugar = factories.MaterialFactory(name='Sugar', price=3)
+        self.stores = [factories.StoreFactory() for _ in range(3)]
+        for index, store in enumerate(self.stores):
+            factories.MaterialStockFactory(store=store, material=self.flour, current_capacity=index * 10, max_capacity=50)
+            factories.MaterialStockFactory(store=store, material=self.sugar, current_capacity=20, max_capacity=20)
+        salt = factories.MaterialFactory(name='Salt', price=1)
+        factories.MaterialStockFactory(store=self.stores[0], material=salt, current_capacity=0, max_capacity=5)
+
+    def test_quotes_and_purchase_orders_for_all_stores(self):
+        self.client.force_authenticate(self.operator)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+
+        stores = response.data['stores']
+        self.assertEqual([store['store'] for store in stores], [store.pk for store in self.stores])
+        self.assertEqual(stores[0]['materials'][0], {'material': self.flour.pk, 'material_name': 'Flour', 'quantity': 50, 'total_price': 100})
+        self.assertEqual(stores[0]['overall_price'], 105)
+        # Full stocks are left out
+        self.assertEqual(len(stores[1]['materials']), 1)
+
+        flour_order = response.data['purchase_orders'][0]
+        self.assertEqual(flour_order['material'], self.flour.pk)
+        self.assertEqual(flour_order['quantity'], 50 + 40 + 30)
+        self.assertEqual(flour_order['total_price'], 240)
+        self.assertEqual(flour_order['deliveries'], [{'store': store.pk, 'quantity': 50 - index * 10} for index, store in enumerate(self.stores)])
+        self.assertEqual(response.data['overall_price'], 245)
+
+    def test_store_filter(self):
+        self.client.force_authenticate(self.operator)
+        response = self.client.get(self.url, {'store': [self.stores[1].pk, self.stores[2].pk]})
+        self.assertEqual([store['store'] for store in response.data['stores']], [self.stores[1].pk, self.stores[2].pk])
+        self.assertEqual(response.data['overall_price'], 140)
+        response = self.client.get(self.url, {'store': 'all'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_store_users_are_not_operators(self):
+        self.client.force_authenticate(self.stores[0].user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_restock_quotes_command(self):
+        stdout = io.StringIO()
+        call_command('restock_quotes', '--store', str(self.stores[0].pk), '--purchase-orders-only', stdout=stdout)
+        report = json.loads(stdout.getvalue())
+        self.assertNotIn('stores', report)
+        self.assertEqual([order['quantity'] for order in report['purchase_orders']], [50, 5])
+        self.assertEqual(Decimal(report['overall_price']), 105)
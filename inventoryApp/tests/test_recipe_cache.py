@@ -0,0 +1,67 @@
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from inventoryApp import cache, factories, recipe_cache, stock
+from inventoryApp.models import User
+
+# Recipes read inside a transaction are not cached, so the tests run outside of one
+class RecipeCacheTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        self.flour = factories.MaterialFactory()
+        self.sugar = factories.MaterialFactory()
+        self.cake = factories.ProductFactory(material_quantity=None)
+        self.cake.material_quantity.set([
+            factories.MaterialQuantityFactory(ingredient=self.flour, quantity=5),
+            factories.MaterialQuantityFactory(ingredient=self.sugar, quantity=2),
+        ])
+        self.water = factories.ProductFactory(material_quantity=None)
+
+    def recipes(self, *products):
+        return {product_id: list(recipe) for product_id, recipe in recipe_cache.get([p.pk for p in products]).items()}
+
+    def test_recipes_are_loaded_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.recipes(self.cake, self.water), {
+                self.cake.pk: [(self.flour.pk, 5), (self.sugar.pk, 2)],
+                self.water.pk: [],
+            })
+        self.assertEqual(len(queries), 1)
+        with CaptureQueriesContext(connection) as queries:
+            plan = stock.SalesPlan(self.store, [self.cake.pk])
+        self.assertEqual(list(plan.recipes[self.cake.pk]), [(self.flour.pk, 5), (self.sugar.pk, 2)])
+        # Only the products and the stocks are read
+        self.assertEqual(len(queries), 2)
+
+    def test_recipe_changes_invalidate_the_cache(self):
+        self.recipes(self.cake, self.water)
+        salt = factories.MaterialQuantityFactory(quantity=1)
+        self.water.material_quantity.add(salt)
+        self.assertEqual(self.recipes(self.water), {self.water.pk: [(salt.ingredient_id, 1)]})
+
+        flour = self.cake.material_quantity.get(ingredient=self.flour)
+        flour.quantity = 7
+        flour.save()
+        self.assertEqual(self.recipes(self.cake)[self.cake.pk], [(self.flour.pk, 7), (self.sugar.pk, 2)])
+
+        self.cake.material_quantity.remove(flour)
+        self.assertEqual(self.recipes(self.cake)[self.cake.pk], [(self.sugar.pk, 2)])
+
+    def test_other_processes_invalidating_drop_loaded_recipes(self):
+        self.recipes(self.cake)
+        # Another worker sharing the cache backend changed a recipe
+        cache.bump_version(recipe_cache.VERSION_KEY)
+        with CaptureQueriesContext(connection) as queries:
+            self.recipes(self.cake)
+        self.assertEqual(len(queries), 1)
+
+    def test_rolled_back_recipe_changes_are_not_kept(self):
+        self.store.products.add(self.water)
+        salt = factories.MaterialQuantityFactory(quantity=1)
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.water.material_quantity.add(salt)
+            self.assertEqual(self.recipes(self.water), {self.water.pk: [(salt.ingredient_id, 1)]})
+            raise ValueError('rolled back')
+        self.assertEqual(self.recipes(self.water), {self.water.pk: []})
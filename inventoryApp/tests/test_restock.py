@@ -1,5 +1,9 @@
+import io
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from inventoryApp import factories, models, serializers
+from inventoryApp import factories, models, serializers, stock
 from rest_framework import status
 from rest_framework.test import APITestCase
 
@@ -130,4 +134,81 @@ class GetRestockSerializerTestCase(APITestCase):
         self.assertEqual(response.data['materials'][0]['material_name'], self.material.name)
         self.assertEqual(response.data['materials'][0]['quantity'], 5)
         self.assertEqual(response.data['materials'][0]['capacity'], '5/10')
-        self.assertEqual(response.data['materials'][0]['total_price'], 50.00)
\ No newline at end of file
+        self.assertEqual(response.data['materials'][0]['total_price'], 50.00)
+
+
+class RestockQueryCountTestCase(APITestCase):
+    def setUp(self):
+        self.user = models.User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        self.url = reverse('restock')
+
+    def authenticate(self):
+        self.user = models.User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def add_stocks(self, count):
+        return [
+            factories.MaterialStockFactory(store=self.store, material=factories.MaterialFactory(price=2), current_capacity=10, max_capacity=50)
+            for _ in range(count)
+        ]
+
+    def count_queries(self, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response.data
+
+    def test_full_refill_query_count_does_not_grow_with_stocks(self):
+        self.authenticate()
+        self.add_stocks(2)
+        self.client.get(self.url)  # warm up the cached store lookup
+        small, _ = self.count_queries({})
+        stocks = self.add_stocks(2) + self.add_stocks(10)
+        models.MaterialStock.objects.update(current_capacity=10)
+        large, data = self.count_queries({})
+        self.assertEqual(small, large)
+        self.assertEqual(len(data['materials']), 14)
+        self.assertEqual(data['materials'][-1]['material'], stocks[-1].material_id)
+        self.assertEqual(data['materials'][-1]['total_price'], 80)
+        self.assertEqual(data['overall_price'], 14 * 80)
+        self.assertFalse(models.MaterialStock.objects.exclude(current_capacity=50).exists())
+
+    def test_partial_restock_query_count_does_not_grow_with_items(self):
+        self.authenticate()
+        stocks = self.add_stocks(12)
+        self.client.get(self.url)
+        small, _ = self.count_queries({'materials': [{'material': stocks[0].material_id, 'quantity': 1}]})
+        large, data = self.count_queries({'materials': [{'material': ms.material_id, 'quantity': 5} for ms in stocks]})
+        self.assertEqual(small, large)
+        self.assertEqual(data['overall_price'], 12 * 10)
+        self.assertEqual(data['materials'][0]['capacity'], '16/50')
+        self.assertEqual(models.MaterialStock.objects.get(pk=stocks[-1].pk).current_capacity, 15)
+
+    def test_refill_command(self):
+        self.add_stocks(3)
+        other_stock = factories.MaterialStockFactory(current_capacity=0, max_capacity=5)
+        stdout = io.StringIO()
+        call_command('refill_stocks', '--store', str(self.store.pk), stdout=stdout)
+        self.assertIn(f"Store {self.store.pk}: 240", stdout.getvalue())
+        self.assertFalse(models.MaterialStock.objects.filter(store=self.store).exclude(current_capacity=50).exists())
+        other_stock.refresh_from_db()
+        self.assertEqual(other_stock.current_capacity, 0)
+
+    def test_refill_leaves_rows_it_did_not_read(self):
+        low, full = self.add_stocks(2)
+        models.MaterialStock.objects.filter(pk=full.pk).update(current_capacity=50)
+        sold = []
+
+        def sale_commits_before_the_update(execute, sql, params, many, context):
+            if not sold and sql.startswith('UPDATE'):
+                # A sale draws from the full stock between the SELECT and the UPDATE
+                sold.append(True)
+                models.MaterialStock.objects.filter(pk=full.pk).update(current_capacity=45)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(sale_commits_before_the_update):
+            refills = stock.refill(models.MaterialStock.objects.filter(store=self.store))
+        self.assertEqual([row['pk'] for row in refills], [low.pk])
+        self.assertEqual(models.MaterialStock.objects.get(pk=low.pk).current_capacity, 50)
+        self.assertEqual(models.MaterialStock.objects.get(pk=full.pk).current_capacity, 45)
@@ -1,6 +1,8 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from inventoryApp import factories, serializers
-from inventoryApp.models import User
+from inventoryApp.models import MaterialStock, SalesHistoryProduct, User
 from rest_framework import status
 from rest_framework.test import APITestCase
 
@@ -99,6 +101,42 @@ class SalesViewTestCase(APITestCase):
                          'Sales request failed due to invalid data. Please review the following list of invalid sales')
         self.assertIn(response.data['sales'][0]['non_field_errors'][0], 'Insufficient material stock')
 
+    def test_sales_exceeding_stock_across_lines(self):
+        # Each line fits on its own but the basket as a whole does not
+        self.authenticate()
+        data = {
+            'sales': [
+                {'product_id': self.product1.id, 'quantity': 60},
+                {'product_id': self.product1.id, 'quantity': 60}
+            ]
+        }
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.material_stock1.refresh_from_db()
+        self.assertEqual(self.material_stock1.current_capacity, 500)
+        self.assertFalse(SalesHistoryProduct.objects.exists())
+
+    def test_sales_query_count_does_not_grow_with_basket(self):
+        self.authenticate()
+        def post_basket(size):
+            products = []
+            for _ in range(size):
+                material = factories.MaterialFactory()
+                product = factories.ProductFactory()
+                product.material_quantity.add(factories.MaterialQuantityFactory(ingredient=material, quantity=1))
+                factories.MaterialStockFactory(store=self.store, material=material, current_capacity=100, max_capacity=100)
+                products.append(product)
+            data = {'sales': [{'product_id': product.id, 'quantity': 1} for product in products]}
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        post_basket(1)  # warm up the cached store lookup
+        self.assertEqual(post_basket(2), post_basket(40))
+        self.assertEqual(SalesHistoryProduct.objects.count(), 43)
+        self.assertFalse(MaterialStock.objects.filter(store=self.store, current_capacity=100, max_capacity=100).exists())
+
 class SalesSerializerTestCase(APITestCase):
     
     def setUp(self):
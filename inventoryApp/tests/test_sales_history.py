@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from inventoryApp import factories
+from inventoryApp.models import SalesHistory, SalesHistoryProduct, User
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+class SalesHistoryListAPIViewTestCase(APITestCase):
+    url = reverse('sales_history')
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        self.other_store = factories.StoreFactory()
+        self.product = factories.ProductFactory()
+        self.start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        self.sales = []
+        for day in range(25):
+            # Two sales share every timestamp, so pages have to break ties on id
+            for _ in range(2):
+                sale = SalesHistory.objects.create(store=self.store, date=self.start + timedelta(days=day))
+                SalesHistoryProduct.objects.create(sales_history=sale, product=self.product, quantity=day + 1)
+                self.sales.append(sale)
+        SalesHistory.objects.create(store=self.other_store, date=self.start)
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def collect(self, url):
+        dates, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            dates.extend(sale['date'] for sale in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return dates, pages
+
+    def test_cursor_pages_cover_every_sale_once(self):
+        self.authenticate()
+        dates, pages = self.collect(self.url)
+        self.assertEqual(pages, 5)
+        self.assertEqual(len(dates), 50)
+        self.assertEqual(dates, sorted(dates))
+        response = self.client.get(self.url)
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+
+    def test_previous_link_returns_the_previous_page(self):
+        self.authenticate()
+        first = self.client.get(self.url).data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        self.authenticate()
+        url = self.url
+        query_counts = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            query_counts.append([query['sql'] for query in queries if 'OFFSET' in query['sql'] or 'COUNT' in query['sql']])
+            url = response.data['next']
+        self.assertEqual(query_counts, [[]] * len(query_counts))
+
+    def test_since_and_until_filters(self):
+        self.authenticate()
+        dates, _ = self.collect(self.url + '?since=2023-01-10&until=2023-01-12T00:00:00Z')
+        self.assertEqual(len(dates), 4)
+        self.assertTrue(all(date.startswith(('2023-01-10', '2023-01-11')) for date in dates))
+
+    def test_invalid_filter_and_cursor(self):
+        self.authenticate()
+        response = self.client.get(self.url + '?since=yesterday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url + '?cursor=bogus')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class SalesHistoryQueryCountTestCase(APITestCase):
+    url = reverse('sales_history')
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1)
+        self.store = factories.StoreFactory(user=self.user)
+        self.products = [factories.ProductFactory() for _ in range(5)]
+
+    def authenticate(self):
+        self.user = User.objects.get(user_id=1)
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, page_size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'page_size': page_size})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response.data['results']
+
+    def add_sales(self, count, basket_size):
+        for _ in range(count):
+            sale = SalesHistory.objects.create(store=self.store)
+            for product in self.products[:basket_size]:
+                SalesHistoryProduct.objects.create(sales_history=sale, product=product, quantity=2)
+
+    def test_query_count_does_not_grow_with_page_or_basket_size(self):
+        self.authenticate()
+        self.add_sales(2, basket_size=1)
+        self.count_queries(2)  # warm up the cached store lookup
+        small, results = self.count_queries(2)
+        self.assertEqual(len(results[0]['products_sold']), 1)
+
+        self.add_sales(20, basket_size=5)
+        large, results = self.count_queries(20)
+        self.assertEqual(len(results), 20)
+        self.assertEqual(results[-1]['products_sold'][-1], {
+            'product': self.products[4].id,
+            'product_name': self.products[4].name,
+            'quantity': 2,
+        })
+        self.assertEqual(small, large)
@@ -0,0 +1,44 @@
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from inventoryApp import factories, stores
+from inventoryApp.models import User
+from rest_framework.test import APITestCase
+
+class CurrentStoreTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(user_id=1, username='store_user')
+        self.store = factories.StoreFactory(user=self.user, store_name='Old name')
+
+    def make_request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    @override_settings(STORE_CACHE_TIMEOUT=0)
+    def test_store_is_resolved_once_per_request(self):
+        request = self.make_request(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(stores.current_store(request), self.store)
+            self.assertEqual(stores.current_store(request), self.store)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(request.store, self.store)
+
+    def test_store_is_cached_across_requests(self):
+        stores.current_store(self.make_request(self.user))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(stores.current_store(self.make_request(self.user)), self.store)
+        self.assertEqual(len(queries), 0)
+
+    def test_cached_store_follows_changes(self):
+        stores.current_store(self.make_request(self.user))
+        self.store.store_name = 'New name'
+        self.store.save()
+        self.assertEqual(stores.current_store(self.make_request(self.user)).store_name, 'New name')
+
+        other_user = User.objects.create(user_id=2, username='other_user')
+        self.store.user = other_user
+        self.store.save()
+        self.assertIsNone(stores.current_store(self.make_request(self.user)))
+        self.assertEqual(stores.current_store(self.make_request(other_user)), self.store)
@@ -0,0 +1,50 @@
+import io
+import unittest
+from django.core.signals import request_finished, request_started
+from django.test import TestCase
+from inventoryApp import factories, models
+from inventoryApp.testing import QueryPatternTextTestResult, allow_repeated_queries, normalize
+
+class QueryPatternDetectorTestCase(TestCase):
+
+    def run_inner(self, test_method, threshold=3):
+        inner = type('InnerTest', (unittest.TestCase,), {'runTest': test_method})()
+        resultclass = type('Result', (QueryPatternTextTestResult,), {'threshold': threshold, 'slow_query_ms': 0})
+        result = resultclass(unittest.runner._WritelnDecorator(io.StringIO()), True, 0)
+        inner.run(result)
+        return result
+
+    @allow_repeated_queries(10)
+    def test_repeated_statement_in_one_request_fails_the_test(self):
+        store = factories.StoreFactory()
+        stocks = [factories.MaterialStockFactory(store=store) for _ in range(5)]
+
+        def per_row_lookups(inner):
+            request_started.send(sender=None)
+            for stock in stocks:
+                models.MaterialStock.objects.get(pk=stock.pk)
+            request_finished.send(sender=None)
+
+        result = self.run_inner(per_row_lookups)
+        self.assertEqual(len(result.failures), 1)
+        self.assertIn('5x SELECT', result.failures[0][1])
+        self.assertEqual(self.run_inner(per_row_lookups, threshold=5).failures, [])
+
+    @allow_repeated_queries(10)
+    def test_only_statements_of_a_single_request_count(self):
+        stock = factories.MaterialStockFactory()
+
+        def one_lookup_per_request(inner):
+            for _ in range(5):
+                request_started.send(sender=None)
+                models.MaterialStock.objects.get(pk=stock.pk)
+                request_finished.send(sender=None)
+            # Lookups outside of a request are not checked
+            for _ in range(5):
+                models.MaterialStock.objects.get(pk=stock.pk)
+
+        self.assertEqual(self.run_inner(one_lookup_per_request).failures, [])
+
+    def test_normalize(self):
+        self.assertEqual(normalize('SELECT 1 FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+                         'SELECT N FROM t WHERE id IN (%s) LIMIT N')
@@ -1,5 +1,5 @@
 from django.urls import include, path
-from inventoryApp import views
+from inventoryApp import async_views, views
 from rest_framework import routers
 
 router = routers.DefaultRouter()
@@ -11,15 +11,28 @@ urlpatterns = [
     path('api-token-auth/', views.CustomAuthToken.as_view()),
     path('api/login/', views.login_view, name='login'),
     path('restock/', views.restock, name='restock'),
+    path('operator/restock/', views.operator_restock, name='operator_restock'),
+    path('catalog/import/', views.catalog_import, name='catalog_import'),
     path('inventory/', views.inventory, name='inventory'),
     path('product-capacity/', views.product_capacity, name='product_capacity'),
     path('sales/', views.sales, name='sales'),
 
     path('material-stocks/', views.MaterialStockListAPIView.as_view(), name='material_stocks'),
     path('material-stocks/<int:pk>', views.MaterialStockDetailAPIView.as_view(), name='material_stocks_detail'),
+    path('material-stocks/at/', views.material_stocks_at, name='material_stocks_at'),
     path('products/', views.ProductListAPIView.as_view(), name='products'),
     path('products/<int:pk>', views.ProductDeleteAPIView.as_view(), name='products_delete'),
     path('sales-history/', views.SalesHistoryListAPIView.as_view(), name='sales_history'),
+    path('sales-history/export/', views.sales_history_export, name='sales_history_export'),
+    path('analytics/sales/', views.analytics_sales, name='analytics_sales'),
+
+    # Async read endpoints for ASGI deployments
+    path('async/inventory/', async_views.inventory, name='async_inventory'),
+    path('async/product-capacity/', async_views.product_capacity, name='async_product_capacity'),
+    path('async/restock/', async_views.restock, name='async_restock'),
+    path('async/sales-history/', async_views.sales_history, name='async_sales_history'),
+    # Stock change feed; the SSE stream at stock-feed/ is served by the ASGI app
+    path('stock-feed/poll/', async_views.stock_feed_poll, name='stock_feed_poll'),
 
     #--------------------- HTML start -------------------------#
     path('login/', views.login_html_view, name='html_login'),
@@ -1,24 +1,28 @@
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import F
-from django.http import JsonResponse
+from django.db import transaction
+from django.db.models import F, prefetch_related_objects
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.views import generic
 from django.views.decorators.csrf import csrf_exempt
-from inventoryApp import forms, models
+from inventoryApp import analytics, cache, catalog, conditional, export, forms, instrumentation, ledger, listings, models, purchasing, stock, stores
 from inventoryApp import serializers as serializersapp
 from rest_framework import generics, serializers, status
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
-from datetime import datetime
+import io
+from datetime import date
 
 from .authentication import expires_in, token_expire_handler
 from .models import MaterialStock, Product, Store
+from .pagination import SalesHistoryCursorPagination
+from .renderers import FAST_RENDERER_CLASSES
 
 #===============================================================
 #                   login, logout and token
@@ -103,39 +107,64 @@ class CustomAuthToken(ObtainAuthToken):
 
 #----------------------- inventory view -------------------------------
 @api_view(['GET',])
+@renderer_classes(FAST_RENDERER_CLASSES)
+@conditional.conditional_on_store('inventory')
 def inventory(request):
     """
     List all material stocks and % of capacity for a specific store, based on auth'ed user
     """
     if request.method == 'GET':
-        materialstock = MaterialStock.objects.all()
-        serializer = serializersapp.InventorySerializer(materialstock, context={'request':request.user})
-        return Response(serializer.data)
+        current_store = stores.current_store(request)
+        @instrumentation.serializer_timing()
+        def build():
+            # Same data as InventorySerializer, see listings.py
+            if current_store is not None:
+                material_stocks = MaterialStock.objects.filter(store=current_store)
+            else:
+                material_stocks = MaterialStock.objects.filter(store__user__username=request.user)
+            return {'materials': listings.inventory_materials(material_stocks)}
+        return Response(cache.cached_store_data(current_store, 'inventory', build))
     
 #----------------------- product_capacity view -------------------------------
 @api_view(['GET',])
+@conditional.conditional_on_store('product-capacity')
 def product_capacity(request):
     """
     List the products in the store and quantity of product available to
     be produced based on available stocks
     """
     if request.method == 'GET':
-        current_store = Store.objects.filter(user__username=request.user).first()
-        materialstock = Product.objects.all()
-        serializer = serializersapp.ProductCapacitySerializer(current_store)
-        return Response(serializer.data)
+        current_store = stores.current_store(request)
+        @instrumentation.serializer_timing()
+        def build():
+            if current_store is not None:
+                prefetch_related_objects([current_store], 'products__material_quantity__ingredient')
+            serializer = serializersapp.ProductCapacitySerializer(current_store)
+            return serializer.data
+        return Response(cache.cached_store_data(current_store, 'product-capacity', build))
 
 #----------------------- MaterialStockListAPIView view -------------------------------
 class MaterialStockListAPIView(generics.ListCreateAPIView):
+    renderer_classes = FAST_RENDERER_CLASSES
 
     def get_queryset(self):
-        current_store = Store.objects.filter(user__username=self.request.user).first()
-        queryset = MaterialStock.objects.filter(store=current_store).order_by('pk')
+        current_store = stores.current_store(self.request)
+        queryset = MaterialStock.objects.filter(store=current_store).select_related('material').order_by('pk')
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        # Read-only fast path of the serializer's output, see listings.py
+        rows = listings.material_stock_rows(self.get_queryset())
+        page = self.paginate_queryset(rows)
+        with instrumentation.serializer_timing():
+            data = listings.material_stocks(rows if page is None else page)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
     def get_serializer_class(self):
         # enable adding current_capacity value when creating new MaterialStock
-        current_store = Store.objects.filter(user__username=self.request.user).first()
+        current_store = stores.current_store(self.request)
         class NewMaterialStockSerializer(serializersapp.MaterialStockSerializer):
             store = serializers.HiddenField(
                 default=current_store
@@ -147,7 +176,7 @@ class MaterialStockListAPIView(generics.ListCreateAPIView):
         return NewMaterialStockSerializer
 
     def create(self, request, *args, **kwargs):
-        current_store = Store.objects.filter(user__username= request.user).first()
+        current_store = stores.current_store(request)
         required_fields = ['material', 'current_capacity', 'max_capacity']
         for field in required_fields:
             if not request.data.get(field):
@@ -175,7 +204,7 @@ class MaterialStockDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = serializersapp.MaterialStockSerializer
 
     def get_queryset(self):
-        current_store = Store.objects.filter(user__username=self.request.user).first()
+        current_store = stores.current_store(self.request)
         queryset = MaterialStock.objects.filter(store=current_store)
         return queryset
     
@@ -188,19 +217,40 @@ class MaterialStockDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        return Response(serializer.data)
+        with instrumentation.serializer_timing():
+            data = serializer.data
+        return Response(data)
+
+    def perform_update(self, serializer):
+        # The ledger adjusts against the row locked by the save (see signals.remember_stock_material)
+        with transaction.atomic():
+            serializer.save()
 
 #----------------------- ProductListAPIView view -------------------------------
 class ProductListAPIView(generics.ListAPIView):
     serializer_class = serializersapp.ProductSerializer
+    renderer_classes = FAST_RENDERER_CLASSES
 
     def get_queryset(self):
-        current_store = Store.objects.filter(user__username=self.request.user).first()
+        current_store = stores.current_store(self.request)
         queryset = Product.objects.filter(product_stores=current_store).order_by('pk')
         return queryset
+
+    def get(self, request, *args, **kwargs):
+        return conditional.conditional_response(request, 'products', lambda: super(ProductListAPIView, self).get(request, *args, **kwargs))
+
+    def list(self, request, *args, **kwargs):
+        # Read-only fast path of the serializer's output, see listings.py
+        rows = listings.product_rows(self.get_queryset())
+        page = self.paginate_queryset(rows)
+        with instrumentation.serializer_timing():
+            data = listings.products(list(rows) if page is None else page)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
         
     def post(self, request):
-        current_store = Store.objects.filter(user__username=self.request.user).first()
+        current_store = stores.current_store(self.request)
         product_id = request.data.get('product_id')
         if not product_id:
             return Response({'error': " 'product_id' value is not given."}, status=status.HTTP_400_BAD_REQUEST)
@@ -213,8 +263,9 @@ class ProductListAPIView(generics.ListAPIView):
             return Response({"error": "Product already assigned to this store"}, status=status.HTTP_400_BAD_REQUEST) 
         except Store.DoesNotExist:
             current_store.products.add(product)
-            serializer = serializersapp.ProductSerializer(product)
-            return Response({"success": "Product has been assigned to this store", "product":serializer.data},status=status.HTTP_200_OK)
+            with instrumentation.serializer_timing():
+                data = serializersapp.ProductSerializer(product).data
+            return Response({"success": "Product has been assigned to this store", "product":data},status=status.HTTP_200_OK)
         
 #----------------------- ProductDeleteAPIView view -------------------------------
 class ProductDeleteAPIView(generics.RetrieveDestroyAPIView):
@@ -224,13 +275,13 @@ class ProductDeleteAPIView(generics.RetrieveDestroyAPIView):
         return Response({'error':'Update product is not allowed'},status=status.HTTP_405_METHOD_NOT_ALLOWED)
     
     def get_queryset(self):
-        current_store = Store.objects.filter(user__username=self.request.user).first()
+        current_store = stores.current_store(self.request)
         queryset = Product.objects.filter(product_stores=current_store).order_by('pk')
         return queryset
     
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
-        current_store = Store.objects.filter(user__username=self.request.user).first()
+        current_store = stores.current_store(self.request)
         if instance.product_stores.filter(pk=current_store.pk).exists():
             instance.product_stores.remove(current_store)
             return Response(status=status.HTTP_204_NO_CONTENT)
@@ -241,21 +292,44 @@ class ProductDeleteAPIView(generics.RetrieveDestroyAPIView):
         instance.delete()
 
 
+#----------------------- material_stocks_at view -------------------------------
+@api_view(['GET',])
+def material_stocks_at(request):
+    """Current capacities of the store's stocks at ?time= (ISO 8601), rebuilt from the stock ledger."""
+    current_store = stores.current_store(request)
+    try:
+        when = export.parse_timestamp(request.query_params.get('time', ''))
+    except ValueError:
+        return Response({'time': 'Enter a valid ISO 8601 date or datetime.'}, status=status.HTTP_400_BAD_REQUEST)
+    capacities = ledger.stock_at(current_store.pk, when) if current_store else {}
+    return Response({
+        'time': when,
+        'materials': [
+            {'material': material_id, 'current_capacity': current_capacity}
+            for material_id, current_capacity in sorted(capacities.items())
+        ],
+    }, status=status.HTTP_200_OK)
+
+
 #----------------------- restock view -------------------------------
 # Allow multiple material restocking in a single JSON POST request using dict list
 @api_view(['GET', 'POST'])
+@conditional.conditional_on_store('restock')
 def restock(request):
     """
     List all material stocks, price for restocking, and amount of restock.
     """
-    current_store = Store.objects.filter(user__username=request.user).first()
+    current_store = stores.current_store(request)
     if request.method == 'GET':
-        material_stocks = MaterialStock.objects.filter(store=current_store)
-        serializer = serializersapp.GetRestockSerializer(material_stocks, many=True)
-        response_data = {
-            'materials': serializer.data,
-            'overall_price': sum([m['total_price'] for m in serializer.data])
-        }
+        @instrumentation.serializer_timing()
+        def build():
+            material_stocks = MaterialStock.objects.filter(store=current_store).select_related('material')
+            serializer = serializersapp.GetRestockSerializer(material_stocks, many=True)
+            return {
+                'materials': serializer.data,
+                'overall_price': sum([m['total_price'] for m in serializer.data])
+            }
+        response_data = cache.cached_store_data(current_store, 'restock', build)
 
         if response_data.get('overall_price') == 0:
             return Response("All material stocks for this store are already full.", status=status.HTTP_204_NO_CONTENT)
@@ -263,32 +337,24 @@ def restock(request):
         return Response(response_data, status=status.HTTP_200_OK)
 
     elif request.method == 'POST':
-        material_stocks = MaterialStock.objects.filter(store=current_store)
-        if all(ms.current_capacity == ms.max_capacity for ms in material_stocks):
+        if not MaterialStock.objects.filter(store=current_store).exclude(current_capacity=F('max_capacity')).exists():
             return Response({"error": "Restocks failed. All material stocks for this store are already full."}, status=status.HTTP_204_NO_CONTENT)
         
         if not request.data.get('materials'):
             # If user doesn't specify which materials to update, update current_capacity of all MaterialStock objects to their max_capacity
-            response_data = {'materials': []}
-            overall_price = 0
-            for material_stock in material_stocks:
-                added_quantity = material_stock.max_capacity - material_stock.current_capacity
-                if added_quantity == 0:
-                    continue
-                material_stock.current_capacity = material_stock.max_capacity
-                material = material_stock.material
-                material_name = material_stock.material.name
-                material_stock.save(update_fields=['current_capacity'])
-                total_price = added_quantity * material.price
-                overall_price += total_price
-                response_data['materials'].append({
-                    'material': material.pk,
-                    'material_name': material_name,
-                    'quantity': added_quantity,
-                    'capacity': f"{material_stock.current_capacity}/{material_stock.max_capacity}",
-                    'total_price': total_price,
-                })
-                response_data['overall_price'] = overall_price
+            with transaction.atomic():
+                refills = stock.refill(MaterialStock.objects.filter(store=current_store), 'restock')
+            response_data = {'materials': [
+                {
+                    'material': refill['material_id'],
+                    'material_name': refill['material__name'],
+                    'quantity': refill['quantity'],
+                    'capacity': f"{refill['max_capacity']}/{refill['max_capacity']}",
+                    'total_price': refill['total_price'],
+                }
+                for refill in refills
+            ]}
+            response_data['overall_price'] = sum(refill['total_price'] for refill in refills)
         
         else:
             # if user specify which material stocks to update, update current_capacity of specified stocks based on given material and quantity.
@@ -298,51 +364,92 @@ def restock(request):
                 error_data = {'error': 'Restocks request failed due to invalid data. Please review the following list of invalid restock',
                               'materials': serializer.errors}
                 return Response(error_data, status=status.HTTP_400_BAD_REQUEST)
-                        
-            overall_price = 0
-            response_data = {'materials': []}
-            for material_data in serializer.validated_data:
-                material_id = material_data['material']
-                added_quantity = material_data['quantity']
 
-                material_stock = MaterialStock.objects.filter(store=current_store, material=material_id).first()
-
-                if material_stock is None:
-                    return Response({'error': 'Material stock not found.'}, status=status.HTTP_404_NOT_FOUND)
-                
-                new_capacity = material_stock.current_capacity + added_quantity
-
-                if new_capacity > material_stock.max_capacity:
-                    return Response({'error': 'The quantity to be restocked is more than the maximum capacity of the material stock.'}, status=status.HTTP_400_BAD_REQUEST)
-
-                material = material_stock.material
-                material_name = material.name
-                total_price = added_quantity * material.price
-                overall_price += total_price
-                
-                material_stock.current_capacity = new_capacity
-                material_stock.save(update_fields=['current_capacity'])
-
-                response_data['materials'].append({
-                    'material': material_id,
-                    'material_name': material_name,
-                    'quantity': added_quantity,
-                    'capacity': f"{material_stock.current_capacity}/{material_stock.max_capacity}",
-                    'total_price': total_price,
-                })
+            try:
+                with transaction.atomic():
+                    material_ids = {material_data['material'] for material_data in serializer.validated_data}
+                    material_stocks = {
+                        ms.material_id: ms
+                        for ms in stock.lock_stocks(MaterialStock.objects.filter(store=current_store, material_id__in=material_ids).select_related('material'))
+                    }
+                    overall_price = 0
+                    response_data = {'materials': []}
+                    deltas = {}
+                    for material_data in serializer.validated_data:
+                        material_id = material_data['material']
+                        added_quantity = material_data['quantity']
+
+                        material_stock = material_stocks.get(material_id)
+                        if material_stock is None:
+                            return Response({'error': 'Material stock not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+                        deltas[material_stock] = deltas.get(material_stock, 0) + added_quantity
+                        current_capacity = material_stock.current_capacity + deltas[material_stock]
+
+                        material = material_stock.material
+                        total_price = added_quantity * material.price
+                        overall_price += total_price
+
+                        response_data['materials'].append({
+                            'material': material_id,
+                            'material_name': material.name,
+                            'quantity': added_quantity,
+                            'capacity': f"{current_capacity}/{material_stock.max_capacity}",
+                            'total_price': total_price,
+                        })
+                    stock.apply_deltas(deltas, models.StockMovement.RESTOCK, 'restock')
+            except stock.StockConflict:
+                return Response({'error': 'The quantity to be restocked is more than the maximum capacity of the material stock.'}, status=status.HTTP_400_BAD_REQUEST)
             response_data['overall_price'] = overall_price
         return Response(response_data, status=status.HTTP_200_OK)
 
+#----------------------- operator_restock view -------------------------------
+@api_view(['GET',])
+@permission_classes((IsAdminUser,))
+def operator_restock(request):
+    """
+    Restock quotes of many stores at once (?store=<id>, repeatable; all stores
+    by default) and the purchase orders consolidating them per material.
+    """
+    store_ids = request.query_params.getlist('store')
+    try:
+        store_ids = [int(store_id) for store_id in store_ids] or None
+    except ValueError:
+        return Response({'store': 'A valid integer is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(purchasing.restock_report(store_ids), status=status.HTTP_200_OK)
+
+#----------------------- catalog_import view -------------------------------
+@api_view(['POST',])
+@permission_classes((IsAdminUser,))
+def catalog_import(request):
+    """
+    Import the CSV or NDJSON catalog uploaded as `file` (see catalog.py).
+    The format follows the file name unless given as ?input=csv|ndjson.
+    Answers with the import report, listing the rows that were skipped.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+    catalog_format = request.query_params.get('input') or catalog.format_of(upload.name)
+    if catalog_format not in catalog.CATALOG_FORMATS:
+        return Response({'input': f"Choose one of: {', '.join(catalog.CATALOG_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        report = catalog.import_catalog(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''), catalog_format)
+    except UnicodeDecodeError:
+        return Response({'file': ['The file is not UTF-8 encoded text.']}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(report, status=status.HTTP_200_OK)
+
 #----------------------- sales view -------------------------------
 # Allow multiple product sales in a single JSON POST request using dict list
 @api_view(['GET', 'POST'])
 def sales(request):
-    current_store = Store.objects.filter(user__username=request.user).first()
+    current_store = stores.current_store(request)
 
     if request.method == 'GET':
         queryset = Product.objects.filter(product_stores=current_store).order_by('pk')
-        serializer = serializersapp.ProductSerializer(queryset, many=True)
-        response_data = {'Products available in this store:':[serializer.data]}
+        with instrumentation.serializer_timing():
+            data = serializersapp.ProductSerializer(queryset, many=True).data
+        response_data = {'Products available in this store:':[data]}
         return Response(response_data, status=status.HTTP_200_OK)
 
 
@@ -354,65 +461,134 @@ def sales(request):
                         'sales': serializer.errors}
             return Response(error_data, status=status.HTTP_400_BAD_REQUEST)
 
+        plan = serializer.context['plan']
+        try:
+            # Subtract the whole basket from the stocks and record it in the sales history
+            sales_history, updated_stocks = plan.apply(serializer.validated_data)
+        except stock.StockConflict:
+            return Response({'error': 'Sales request failed due to insufficient material stock for the whole list of sales'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
         response_data = {
             'success': True,
             'message': 'Material stocks subtracted successfully',
-            'updated material stocks': []
-            } 
-        
-        date_now=datetime.now()
-        products = []
-        # Loop through each product and subtract the required material from the stock
-        for sale_index, sale in enumerate(serializer.validated_data):
-            total_subtracted_capacity = 0
-            product = get_object_or_404(Product, id=sale['product_id'])
-            products.append(product)
-
-            for material_quantity in product.material_quantity.all():
-                material = material_quantity.ingredient
-                stock = get_object_or_404(MaterialStock, store=current_store, material=material)
-                subtracted_capacity = material_quantity.quantity * sale['quantity']
-                stock.current_capacity -= subtracted_capacity
-                stock.save()
-
-                total_subtracted_capacity += subtracted_capacity  # Increment total_subtracted_capacity for each material
-
-                new_response_data = {
-                    'id': stock.pk,
-                    'material': material.name,
-                    'total_subtracted_capacity': total_subtracted_capacity, 
-                    'remaining capacity': f'{stock.current_capacity}/{stock.max_capacity}'
-                    } 
-                for item in response_data['updated material stocks']:
-                    if item['id'] == new_response_data['id']:
-                        item.update(new_response_data)
-                        break
-                else:
-                    response_data['updated material stocks'].append(new_response_data)
-
-            # Update total_subtracted_capacity to response_data after each sale
-            response_data['updated material stocks'][sale_index]['total_subtracted_capacity'] = total_subtracted_capacity
-
-            # Create new sales history data after each sale
-        sales_history = models.SalesHistory.objects.create(store=current_store, date=date_now)
-        quantities = [sale['quantity'] for sale in serializer.validated_data]
-
-        for i, product in enumerate(products):
-            models.SalesHistoryProduct.objects.create(sales_history=sales_history, product=product, quantity=quantities[i])
-
+            'updated material stocks': [
+                {
+                    'id': material_stock.pk,
+                    'material': material_stock.material.name,
+                    'total_subtracted_capacity': subtracted_capacity,
+                    'remaining capacity': f'{material_stock.current_capacity}/{material_stock.max_capacity}'
+                }
+                for material_stock, subtracted_capacity in updated_stocks
+            ]
+            }
         return Response(response_data, status=status.HTTP_200_OK)
 
 #----------------------- SalesHistoryView view -------------------------------
-# Get all sales history for the current store
+# Get all sales history for the current store, optionally within ?since=...&until=...
 class SalesHistoryListAPIView(generics.ListAPIView):
     serializer_class = serializersapp.SalesHistorySerializer
+    pagination_class = SalesHistoryCursorPagination
+    renderer_classes = FAST_RENDERER_CLASSES
+
+    def get_time_filter(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return export.parse_timestamp(value)
+        except ValueError:
+            raise serializers.ValidationError({name: 'Enter a valid ISO 8601 date or datetime.'})
 
     def get_queryset(self):
-        current_store = Store.objects.filter(user__username=self.request.user).first()
-        return models.SalesHistory.objects.filter(store_id=current_store).order_by('date')
+        current_store = stores.current_store(self.request)
+        queryset = models.SalesHistory.objects.filter(store_id=current_store).only('id', 'date').order_by('date', 'id')
+        since = self.get_time_filter('since')
+        until = self.get_time_filter('until')
+        if since:
+            queryset = queryset.filter(date__gte=since)
+        if until:
+            queryset = queryset.filter(date__lt=until)
+        return queryset
 
-    
-    
+    def list(self, request, *args, **kwargs):
+        # Read-only fast path of the serializer's output, see listings.py
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
+        with instrumentation.serializer_timing():
+            data = listings.sales_history(list(queryset) if page is None else page)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+#----------------------- sales_history_export view -------------------------------
+@api_view(['GET',])
+def sales_history_export(request):
+    """
+    Stream the store's sold product lines as CSV or NDJSON (?output=csv|ndjson),
+    optionally limited by since/until and resumed after a line id (?after=).
+    """
+    current_store = stores.current_store(request)
+    export_format = request.query_params.get('output', 'csv')
+    if export_format not in export.EXPORT_FORMATS:
+        return Response({'output': f"Choose one of: {', '.join(export.EXPORT_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+    filters = {}
+    for name in ('since', 'until'):
+        value = request.query_params.get(name)
+        if value:
+            try:
+                filters[name] = export.parse_timestamp(value)
+            except ValueError:
+                return Response({name: 'Enter a valid ISO 8601 date or datetime.'}, status=status.HTTP_400_BAD_REQUEST)
+    after = request.query_params.get('after')
+    if after:
+        try:
+            filters['after'] = int(after)
+        except ValueError:
+            return Response({'after': 'A valid integer is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = export.export_rows(store_ids=[current_store.pk] if current_store else [], **filters)
+    response = StreamingHttpResponse(export.export_lines(rows, export_format),
+                                     content_type=export.CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="sales-history.{export_format}"'
+    return response
+
+#----------------------- analytics_sales view -------------------------------
+@api_view(['GET',])
+def analytics_sales(request):
+    """
+    Units sold and their material cost from the daily sales rollups, between
+    the days ?since= (inclusive) and ?until= (exclusive), grouped by
+    ?group_by=day|week|month|product (comma separated, default day) and
+    optionally limited to ?product= ids (can be repeated).
+    """
+    current_store = stores.current_store(request)
+    filters = {}
+    for name in ('since', 'until'):
+        value = request.query_params.get(name)
+        if value:
+            try:
+                filters[name] = date.fromisoformat(value)
+            except ValueError:
+                return Response({name: 'Enter a valid ISO 8601 date.'}, status=status.HTTP_400_BAD_REQUEST)
+    group_by = [key for key in request.query_params.get('group_by', 'day').split(',') if key]
+    if not group_by or any(key not in analytics.GROUP_BY for key in group_by) or len(set(group_by)) != len(group_by):
+        return Response({'group_by': f"Choose one or more of: {', '.join(analytics.GROUP_BY)}."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        product_ids = [int(product_id) for product_id in request.query_params.getlist('product')]
+    except ValueError:
+        return Response({'product': 'A valid integer is required.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = analytics.sales_summary(current_store, group_by=group_by, product_ids=product_ids, **filters)
+    return Response({
+        'since': filters.get('since'),
+        'until': filters.get('until'),
+        'group_by': group_by,
+        'quantity': sum(row['quantity'] for row in rows),
+        'material_cost': sum(row['material_cost'] for row in rows),
+        'results': rows,
+    }, status=status.HTTP_200_OK)
 
 #===============================================================
 #                   HTML Template Views
@@ -421,7 +597,7 @@ class SalesHistoryListAPIView(generics.ListAPIView):
 #----------------------- store_products view -------------------------------
 @login_required(login_url='html_login')
 def store_products(request):
-    current_store = Store.objects.filter(user__username=request.user).first()
+    current_store = stores.current_store(request)
     products = current_store.products.all()
     available_products = Product.objects.exclude(product_stores=current_store)
     return render(request, 'store_products.html', {
@@ -432,7 +608,7 @@ def store_products(request):
 
 #----------------------- add_product view -------------------------------
 def add_product(request):
-    current_store = Store.objects.filter(user__username=request.user).first()
+    current_store = stores.current_store(request)
     if request.method == 'POST':
         form = forms.AddProductForm(request.POST)
         if form.is_valid():
@@ -445,7 +621,7 @@ def add_product(request):
 
 #----------------------- delete_product view -------------------------------
 def delete_product(request, product_id):
-    current_store = Store.objects.filter(user__username=request.user).first()
+    current_store = stores.current_store(request)
     product = get_object_or_404(Product, pk=product_id, product_stores=current_store)
     if request.method == 'POST':
         form = forms.DeleteProductForm(request.POST)
@@ -462,7 +638,7 @@ class MaterialStockView(LoginRequiredMixin, generic.TemplateView):
     login_url = 'html_login'
 
     def get_context_data(self, **kwargs):
-        current_store = Store.objects.filter(user__username=self.request.user).first()
+        current_store = stores.current_store(self.request)
         context = super().get_context_data(**kwargs)
         material_stocks = MaterialStock.objects.filter(store=current_store)
         context['store'] = current_store
@@ -500,8 +676,10 @@ class MaterialStockUpdateView(generic.UpdateView):
     form_class = forms.MaterialStockUpdateForm
     template_name = 'material_stock_form.html'
     def form_valid(self, form):
-        form.save()
-        return super().form_valid(form)
+        # The ledger adjusts against the row locked by the save (see signals.remember_stock_material)
+        with transaction.atomic():
+            form.save()
+            return super().form_valid(form)
 
     def get_success_url(self):
         return reverse_lazy('store_stocks')
@@ -13,4 +13,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myApp.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from inventoryApp.feed import StockFeedApp  # noqa: E402 (needs the app registry)
+
+# Streams the stock feed as Server-Sent Events and hands everything else to Django
+application = StockFeedApp(django_application)
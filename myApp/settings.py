@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventoryApp.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,6 +54,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'inventoryApp.instrumentation.ViewMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'myApp.urls'
@@ -96,6 +98,31 @@ DATABASES = {
 
 AUTH_USER_MODEL = 'inventoryApp.User'
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# LocMemCache evicts least recently used entries once MAX_ENTRIES is reached.
+# Point INVENTORY_CACHE_BACKEND at e.g. django.core.cache.backends.redis.RedisCache
+# to share the cache between workers.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "inventory": {
+        "BACKEND": os.environ.get("INVENTORY_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("INVENTORY_CACHE_LOCATION", "inventory"),
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
+    },
+}
+
+INVENTORY_CACHE = "inventory"
+
+# Seconds a user's store stays cached between requests (0 disables it)
+STORE_CACHE_TIMEOUT = 300
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -137,6 +164,34 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 TOKEN_EXPIRED_AFTER_SECONDS = 86400
+# Authenticated tokens are cached in process; set TOKEN_CACHE to a cache alias
+# (e.g. "inventory") to share them between workers
+TOKEN_CACHE = os.environ.get("TOKEN_CACHE") or None
+TOKEN_CACHE_MAX_ENTRIES = 1024
+# Deleting a token, logging out or deactivating a user only clears the
+# in-process cache of the worker that handled it. Other workers keep accepting
+# the token for up to TOKEN_CACHE_LOCAL_TTL seconds. Set TOKEN_CACHE when
+# running several workers to revoke tokens everywhere at once.
+TOKEN_CACHE_LOCAL_TTL = 30
+
+# Server-Timing headers and per-route histograms at /metrics/ (REQUEST_METRICS=1).
+# When off the middleware unloads itself at startup.
+REQUEST_METRICS = os.environ.get("REQUEST_METRICS") == "1"
+# /metrics/ is served to staff users and to requests carrying
+# "Authorization: Bearer <METRICS_TOKEN>", e.g. a Prometheus scraper
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+
+# The test runner fails tests running the same SELECT more than
+# QUERY_PATTERN_THRESHOLD times and lists queries slower than SLOW_QUERY_MS
+TEST_RUNNER = "inventoryApp.testing.QueryCheckingDiscoverRunner"
+QUERY_PATTERN_THRESHOLD = 3
+SLOW_QUERY_MS = 100
+
+# Stock changes are published per store to the SSE feed at /inventoryapp/stock-feed/
+# and to long-polls. The in-process broker only reaches clients of the same
+# process; point STOCK_FEED_BROKER at a shared StockFeedBroker when running several.
+STOCK_FEED_BROKER = os.environ.get("STOCK_FEED_BROKER", "inventoryApp.feed.InProcessBroker")
+STOCK_FEED_HISTORY = 100
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -15,10 +15,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import include, path
+from inventoryApp import instrumentation
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('inventoryapp/', include('inventoryApp.urls')),
     path('api-auth/', include('rest_framework.urls')),
+    path('metrics/', instrumentation.metrics_view, name='metrics'),
 
 ]